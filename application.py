@@ -3,16 +3,25 @@ Main application module for Tallis Ledger.
 Contains the main Application class that coordinates all components.
 """
 
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
-from database import DatabaseManager
-from ui_components import AccountSelector, FundSelector, EditModeManager
+from backup import BackupScheduler
+from database import DatabaseManager, TransactionConflict
+from dates import parse_date, normalize_date
+from ui_components import AccountSelector, FundSelector, GoToBar, EditModeManager
 from ledger_sheet import LedgerSheet
+from batch_entry import BatchEntryWindow
+from recategorize import RecategorizeWindow
+from command_journal import CommandJournal, FunctionCommand, TransactionCommand
+from recurring import post_due
 
 
 _DEBUG = False  # Set to True for debugging output
 
+# How often to check whether a background backup has finished
+BACKUP_POLL_MS = 1000
+
 
 class Application:
     """Main controller that coordinates all components."""
@@ -65,11 +74,20 @@ class Application:
         self.mode = "initial"  # "initial", "edit", or "add"
         self.selected_row = None
         self.selected_tran_id = None
+        self.selected_version = None
         self.selected_user_date = None
         self.selected_description = None
         self.current_filter_type = "account"  # 'account' or 'fund'
         self.start_idx = None
         self.end_idx = None
+        # Set when another window posts while a transaction is being edited;
+        # the ledger is then reloaded when edit or add mode ends
+        self.refresh_pending = False
+        
+        # Undo history: saved changes for the session, and split edits for the
+        # transaction currently being edited
+        self.command_journal = CommandJournal()
+        self.edit_journal = CommandJournal()
         
         # Create main layout frames using ttk
         self.main_container = ttk.Frame(root, style='Main.TFrame')
@@ -99,6 +117,7 @@ class Application:
         
         # Initialize components
         self.db_manager = self._initialize_database()
+        self._post_due_recurring()
         
         # Create a centered container for the selectors
         selector_container = ttk.Frame(self.selector_frame)
@@ -116,6 +135,11 @@ class Application:
         self.account_selector = AccountSelector(
             selector_container, self.db_manager, self.update_table_with_account
         )
+        
+        go_to_label = ttk.Label(selector_container, text="Go to:", style='SelectorLabel.TLabel')
+        go_to_label.pack(side="left", padx=(20, 5))
+        
+        self.go_to_bar = GoToBar(selector_container, self.go_to)
         self.edit_mode_manager = EditModeManager(
             self.button_frame, self.cancel_edit_mode, self.save_edit_mode, self
         )
@@ -128,6 +152,20 @@ class Application:
         
         # Show Add Transaction button on startup
         self.edit_mode_manager.show_add_transaction_button()
+        
+        # Undo and redo
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Control-g>", lambda _event: self.go_to_bar.focus())
+        
+        # Scheduled backups into a backups folder beside the ledger
+        self.backup_requested = False
+        self.backup_scheduler = None
+        if self.db_manager:
+            backup_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_manager.db_path)), "backups")
+            self.backup_scheduler = BackupScheduler(self.db_manager.db_path, backup_dir)
+            self.backup_scheduler.start()
+            self.root.after(BACKUP_POLL_MS, self._poll_backups)
     
     def _configure_styles(self):
         """Configure custom ttk styles for professional appearance."""
@@ -212,7 +250,7 @@ class Application:
         
         try:
             from database import DatabaseManager
-            return DatabaseManager(db_path)
+            return DatabaseManager(db_path, profile='interactive')
         except Exception as e:
             # If database connection fails, show error and exit gracefully
             messagebox.showerror(
@@ -222,6 +260,44 @@ class Application:
             self.root.quit()
             return None
     
+    def _post_due_recurring(self):
+        """Post any recurring transactions that have fallen due, before the first ledger is shown."""
+        if not self.db_manager or self.db_manager.read_only:
+            return
+        try:
+            result = post_due(self.db_manager)
+        except ValueError as e:
+            result = None
+            if _DEBUG:
+                print(f"Error working out recurring transactions: {e}")
+        if result is None:
+            messagebox.showerror(
+                "Recurring Transactions",
+                "The recurring transactions that are due could not be posted.\n"
+                "Run 'tallis recurring post --dry-run' to see them."
+            )
+            return
+        
+        posted, skipped = result['posted'], result['skipped']
+        if skipped:
+            lines = [
+                f"Template {occ['template_id']} on {occ['occurrence_date']}: {occ['error']}"
+                for occ in skipped[:10]
+            ]
+            if len(skipped) > 10:
+                lines.append(f"...and {len(skipped) - 10} more")
+            messagebox.showwarning(
+                "Recurring Transactions",
+                f"Posted {len(posted)} recurring transaction{'s' if len(posted) != 1 else ''}. "
+                "These could not be posted:\n\n" + "\n".join(lines)
+            )
+        elif posted:
+            messagebox.showinfo(
+                "Recurring Transactions",
+                f"Posted {len(posted)} recurring transaction{'s' if len(posted) != 1 else ''} "
+                f"due up to today."
+            )
+    
     def update_table_with_account(self, _selected_option=None):
         """Update the ledger display when a different account is selected."""
         self.current_filter_type = "account"
@@ -234,6 +310,40 @@ class Application:
         fund_id = self.fund_selector.get_selected_fund_id()
         self.ledger_sheet.update_data(fund_id, filter_type="fund")
 
+    def go_to(self, target):
+        """
+        Scroll the ledger to a date or a transaction.
+        
+        Args:
+            target: A date in any accepted format, or a transaction id
+                (digits, optionally preceded by #)
+        """
+        if self.mode != "initial" or not target:
+            return
+        # Rows are located by their position in ledger order
+        self.ledger_sheet.clear_view()
+        if target.lstrip("#").isdigit():
+            tran_id = int(target.lstrip("#"))
+            # One primary key lookup gives the date to bisect on
+            user_date = self.db_manager.fetch_transaction_date(tran_id)
+            row = None
+            if user_date is not None:
+                row = self.ledger_sheet.row_for_transaction(tran_id, user_date)
+            if row is None:
+                messagebox.showinfo("Go To", f"Transaction {tran_id} is not in this ledger.")
+                return
+        else:
+            iso_date = normalize_date(target)
+            if iso_date is None:
+                messagebox.showwarning("Go To", f"'{target}' is not a date or a transaction id.")
+                return
+            row = self.ledger_sheet.row_for_date(iso_date)
+            if row is None:
+                return
+        self.ledger_sheet.show_row(row)
+        if _DEBUG:
+            print(f"Went to {target}: row {row}")
+    
     def enter_edit_mode(self, _event=None):
         """Enter edit mode for the selected transaction."""
         if self.mode == "initial":
@@ -245,8 +355,11 @@ class Application:
                     print("No row selected, cannot enter edit mode")
                 return
             
-            # Get current data to extract transaction details
-            current_data = self.ledger_sheet.get_current_data()
+            # Transactions are edited in place in ledger order
+            self.selected_row = self.ledger_sheet.clear_view(self.selected_row)
+            
+            # Keep the ledger to put back afterwards; the edit view is built from it
+            current_data = self.ledger_sheet.hold_rows()
             if self.selected_row < len(current_data):
                 # Store transaction details from the selected row
                 selected_row_data = current_data[self.selected_row]
@@ -254,21 +367,24 @@ class Application:
                 self.selected_user_date = selected_row_data[2]    # UserDate at index 2
                 self.selected_description = selected_row_data[3]  # Description at index 3
                 
-                # Get data without balance column for edit mode
-                if self.current_filter_type == "account":
-                    filter_id = self.account_selector.get_selected_account_id()
-                else:
-                    filter_id = self.fund_selector.get_selected_fund_id()
-                ledger_df = self.db_manager.fetch_ledger_data(
-                    filter_id, self.current_filter_type
+                # The displayed rows without their Balance column, the last one
+                current_data_no_balance = [row[:-1] for row in current_data]
+
+                # Read the version before the splits, so any change made
+                # after this point is caught when saving
+                self.selected_version = self.db_manager.fetch_transaction_version(
+                    self.selected_tran_id
                 )
+                if self.selected_version is None:
+                    # Rows from archived years are shown but live in read-only archive files
+                    messagebox.showinfo(
+                        "Edit Transaction",
+                        f"Transaction {self.selected_tran_id} is in an archived year "
+                        f"or no longer exists, so it cannot be edited."
+                    )
+                    self.selected_tran_id = None
+                    return
                 
-                # Format the ledger data (without balance column)
-                formatted_ledger_df = self.ledger_sheet.format_decimal_columns(
-                    ledger_df, include_balance=False
-                )
-                current_data_no_balance = formatted_ledger_df.values.tolist()
-
                 # Fetch all splits for this transaction
                 transaction_df = self.db_manager.fetch_transaction_data(
                     self.selected_tran_id
@@ -315,8 +431,10 @@ class Application:
                     self.ledger_sheet.highlight_row(i, bg="white", fg="black")
                 
                 self.mode = "edit"
+                self.edit_journal.clear()
                 self.account_selector.set_enabled(False)
                 self.fund_selector.set_enabled(False)
+                self.go_to_bar.set_enabled(False)
                 self.ledger_sheet.set_all_readonly(True)
                 
                 # Make the highlighted red rows editable
@@ -352,20 +470,11 @@ class Application:
             self.selected_user_date = date.today().strftime("%Y-%m-%d")
             self.selected_description = ""
             
-            # Get data without balance column for add mode
-            if self.current_filter_type == "account":
-                filter_id = self.account_selector.get_selected_account_id()
-            else:
-                filter_id = self.fund_selector.get_selected_fund_id()
-            ledger_df = self.db_manager.fetch_ledger_data(
-                filter_id, self.current_filter_type
-            )
-            
-            # Format the ledger data (without balance column)
-            formatted_ledger_df = self.ledger_sheet.format_decimal_columns(
-                ledger_df, include_balance=False
-            )
-            current_data_no_balance = formatted_ledger_df.values.tolist()
+            # Keep the ledger to put back afterwards, and show it without its
+            # Balance column, the last one
+            ledger_rows = self.ledger_sheet.hold_rows()
+            headers = self.ledger_sheet.sheet.headers()[:-1]
+            current_data_no_balance = [row[:-1] for row in ledger_rows]
             
             # Create two empty rows for the new transaction
             new_row_1 = [
@@ -392,7 +501,7 @@ class Application:
             new_data = current_data_no_balance + [new_row_1, new_row_2]
             
             # Update headers without balance column
-            self.ledger_sheet.sheet.headers(list(formatted_ledger_df.columns))
+            self.ledger_sheet.sheet.headers(headers)
             self.ledger_sheet.sheet.set_sheet_data(new_data)
             self.ledger_sheet.set_column_widths()
             
@@ -410,8 +519,10 @@ class Application:
                 self.ledger_sheet.highlight_row(i, bg="red", fg="white")
             
             self.mode = "add"
+            self.edit_journal.clear()
             self.account_selector.set_enabled(False)
             self.fund_selector.set_enabled(False)
+            self.go_to_bar.set_enabled(False)
             self.ledger_sheet.set_all_readonly(True)
             
             # Make the highlighted red rows editable
@@ -440,15 +551,63 @@ class Application:
             if _DEBUG:
                 print(f"Entered add mode: start_idx={self.start_idx}, end_idx={self.end_idx}")
     
+    def open_batch_entry(self):
+        """Open the batch entry window for staging many transactions at once."""
+        if self.mode == "initial":
+            BatchEntryWindow(
+                self.root, self.db_manager, self._is_valid_date, self.refresh_ledger
+            )
+    
+    def open_recategorize(self):
+        """Open the window for moving many splits to a new account or fund."""
+        if self.mode == "initial":
+            RecategorizeWindow(self.root, self.db_manager, self.refresh_ledger)
+    
+    def backup_now(self):
+        """Take a backup on the background thread; the result is reported when it finishes."""
+        if self.backup_scheduler:
+            self.backup_requested = True
+            self.backup_scheduler.backup_now()
+    
+    def _poll_backups(self):
+        """Report finished background backups. Scheduled backups only report failures."""
+        while not self.backup_scheduler.results.empty():
+            path, error = self.backup_scheduler.results.get()
+            if error:
+                messagebox.showerror("Backup Failed", error)
+            elif self.backup_requested:
+                messagebox.showinfo("Backup Complete", f"Ledger backed up to:\n{path}")
+            if _DEBUG:
+                print(f"Backup finished: {path or error}")
+            self.backup_requested = False
+        self.root.after(BACKUP_POLL_MS, self._poll_backups)
+    
+    def refresh_ledger(self):
+        """
+        Reload the ledger for the current account or fund selection.
+        
+        The batch entry and recategorize windows are not modal, so they can
+        post while a transaction is being edited. The reload then waits
+        until edit or add mode ends (see cancel_edit_mode).
+        """
+        if self.mode == "initial":
+            self.refresh_pending = False
+            if self.current_filter_type == "account":
+                self.update_table_with_account()
+            else:
+                self.update_table_with_fund()
+        else:
+            self.refresh_pending = True
+    
     def after_cell_edit(self, event):
         """Handle cell edit events with validation and sync across editable rows."""
         if self.mode in ["edit", "add"] and self.start_idx <= event.row < self.end_idx:
             # Get the edited value from the event
             edited_value = event.value
             
-            # Get current data to access old value if needed
-            current_data = self.ledger_sheet.get_current_data()
-            old_value = current_data[event.row][event.column]
+            # Old value to restore if the edit is rejected; reading one cell
+            # avoids copying the whole sheet on every edit
+            old_value = self.ledger_sheet.sheet.get_cell_data(event.row, event.column)
 
             # Check if user_date (column 2) was edited
             if event.column == 2:  # UserDate column
@@ -457,21 +616,20 @@ class Application:
                     if _DEBUG:
                         print(f"Invalid date format: {edited_value}, keeping old value: {old_value}")
                     return old_value
+                # Show the date in the ISO form it will be stored in
+                edited_value = normalize_date(edited_value)
                 
-                # Update user_date in all editable rows
-                for i in range(self.start_idx, self.end_idx):
-                    if i != event.row:  # Don't overwrite the cell being edited
-                        self.ledger_sheet.sheet.set_cell_data(i, 2, edited_value)
+                # Update user_date in all editable rows; the cell being edited is set by tksheet
+                self.ledger_sheet.fill_column(2, self.start_idx, self.end_idx, edited_value, event.row)
                 # Update stored user_date
                 self.selected_user_date = edited_value
                 if _DEBUG:
                     print(f"Updated user_date in all editable rows to: {edited_value}")
+                return edited_value
 
             elif event.column == 3:  # Description column
-                # Update description in all editable rows
-                for i in range(self.start_idx, self.end_idx):
-                    if i != event.row:  # Don't overwrite the cell being edited
-                        self.ledger_sheet.sheet.set_cell_data(i, 3, edited_value)
+                # Update description in all editable rows; the cell being edited is set by tksheet
+                self.ledger_sheet.fill_column(3, self.start_idx, self.end_idx, edited_value, event.row)
                 # Update stored description
                 self.selected_description = edited_value
                 if _DEBUG:
@@ -489,27 +647,7 @@ class Application:
     
     def _is_valid_date(self, date_string):
         """Validate that the date string is in a valid format."""
-        if not date_string or not isinstance(date_string, str):
-            return False
-        
-        # Common date formats to try
-        date_formats = [
-            "%Y-%m-%d",      # 2025-07-20
-            "%Y/%m/%d",      # 2025/07/20
-            "%m/%d/%Y",      # 07/20/2025
-            "%m-%d-%Y",      # 07-20-2025
-            "%d/%m/%Y",      # 20/07/2025
-            "%d-%m-%Y",      # 20-07-2025
-        ]
-        
-        for date_format in date_formats:
-            try:
-                datetime.strptime(date_string.strip(), date_format)
-                return True
-            except ValueError:
-                continue
-        
-        return False
+        return parse_date(date_string) is not None
     
     def _is_valid_amount(self, amount_string):
         """Validate that the amount string is a valid number."""
@@ -546,23 +684,47 @@ class Application:
             
             # Save to database - different logic for edit vs add mode
             if self.mode == "edit":
-                # Edit mode: update existing transaction (soft delete old, insert new)
-                success = self.db_manager.save_transaction(
-                    self.selected_tran_id, 
-                    user_date, 
-                    description, 
-                    splits_data
-                )
+                # Edit mode: update existing transaction in place, touching only changed splits
+                before = self.db_manager.fetch_transaction_image(self.selected_tran_id)
+                try:
+                    success = self.db_manager.update_transaction(
+                        self.selected_tran_id, 
+                        user_date, 
+                        description, 
+                        splits_data,
+                        self.selected_version
+                    )
+                except TransactionConflict as conflict:
+                    if not self._confirm_overwrite(conflict, "save your changes over theirs"):
+                        return
+                    # Save again against the version just shown
+                    self.selected_version = conflict.current_version
+                    self.save_edit_mode()
+                    return
+                if success:
+                    saved_tran_id = self.selected_tran_id
+                    self._record_transaction_change(
+                        f"Save transaction {self.selected_tran_id}", before
+                    )
             else:  # add mode
                 # Add mode: insert new transaction without deleting anything
-                success = self.db_manager.add_new_transaction(
+                new_tran_id = self.db_manager.add_new_transaction(
                     user_date, 
                     description, 
                     splits_data
                 )
+                success = bool(new_tran_id)
+                if success:
+                    saved_tran_id = new_tran_id
+                    after = self.db_manager.fetch_transaction_image(new_tran_id)
+                    # Undoing an add soft-deletes the new transaction
+                    self._record_transaction_change(
+                        f"Add transaction {new_tran_id}", dict(after, deleted=True), after
+                    )
             
             if success:
-                self.cancel_edit_mode()  # This will also handle add mode cleanup
+                # Also handles add mode cleanup, and patches in the saved rows
+                self.cancel_edit_mode(saved_tran_id)
             else:
                 mode_name = "save" if self.mode == "edit" else "create"
                 if _DEBUG:
@@ -597,6 +759,7 @@ class Application:
         splits_data = []
         for i in range(self.start_idx, self.end_idx):
             row = current_data[i]
+            split_id = int(row[0]) if row[0] else 0  # SplitId column - 0 for new splits
             amount = float(row[6])  # Amount column - convert formatted string to float
             fund_choice = row[4]  # FundChoice column
             account_choice = row[5]  # AccountChoice column
@@ -606,14 +769,22 @@ class Application:
             account_id = int(account_choice.split(':')[0]) if account_choice else 0
             
             splits_data.append({
+                'split_id': split_id,
                 'amount': amount,
                 'fund_id': fund_id,
                 'account_id': account_id
             })
         return splits_data
     
-    def cancel_edit_mode(self):
-        """Cancel edit/add mode and restore the normal ledger view."""
+    def cancel_edit_mode(self, changed_tran_id=None):
+        """
+        Cancel edit/add mode and restore the normal ledger view.
+        
+        The ledger shown before editing is put back and, if changed_tran_id
+        is given, that one transaction's rows are patched in, so only the
+        balances after it are recomputed. If another window posted while
+        editing, the whole ledger is reloaded instead.
+        """
         if _DEBUG:
             print(f"[DEBUG] cancel_edit_mode called, current mode: {self.mode}")
         if self.mode in ["edit", "add"]:
@@ -622,7 +793,15 @@ class Application:
                 filter_id = self.account_selector.get_selected_account_id()
             else:
                 filter_id = self.fund_selector.get_selected_fund_id()
-            self.ledger_sheet.update_data(filter_id, filter_type=self.current_filter_type, include_balance=True)
+            if self.refresh_pending:
+                # Another window has posted since editing began, so the held
+                # rows are out of date; the reload includes changed_tran_id
+                self.refresh_pending = False
+                self.ledger_sheet.update_data(filter_id, filter_type=self.current_filter_type, include_balance=True)
+            elif not self.ledger_sheet.restore_rows():
+                self.ledger_sheet.update_data(filter_id, filter_type=self.current_filter_type, include_balance=True)
+            elif changed_tran_id is not None:
+                self.ledger_sheet.refresh_transaction(changed_tran_id, filter_id, self.current_filter_type)
             
             # Reset all rows to white background and black foreground
             current_data = self.ledger_sheet.get_current_data()
@@ -630,10 +809,13 @@ class Application:
                 self.ledger_sheet.highlight_row(i, bg="white", fg="black")
             
             self.mode = "initial"
+            self.edit_journal.clear()
             self.account_selector.set_enabled(True)
             self.fund_selector.set_enabled(True)
+            self.go_to_bar.set_enabled(True)
             self.selected_row = None
             self.selected_tran_id = None
+            self.selected_version = None
             self.selected_user_date = None
             self.selected_description = None
             # Clear edit validation
@@ -660,9 +842,6 @@ class Application:
     def add_split_row(self):
         """Add a new split row to the current transaction in edit/add mode after the last selected row."""
         if self.mode in ["edit", "add"]:
-            # Get current data
-            current_data = self.ledger_sheet.get_current_data()
-            
             # Get the currently selected row from the sheet
             selected_cells = self.ledger_sheet.sheet.get_currently_selected()
             if selected_cells:
@@ -683,7 +862,7 @@ class Application:
                 insert_position = last_selected_row + 1
             
             # Create a new empty row with the same structure as transaction rows
-            if self.start_idx < len(current_data):
+            if self.start_idx < self.ledger_sheet.sheet.get_total_rows():
                 # Get current selections from dropdowns
                 current_fund_selection = self.fund_selector.selected_fund.get()
                 current_account_selection = self.account_selector.selected_account.get()
@@ -698,41 +877,33 @@ class Application:
                     "0.00"  # Amount (empty)
                 ]
                 
-                # Insert the new row at the determined position
-                new_data = current_data[:insert_position] + [new_row] + current_data[insert_position:]
-                
-                # Update the sheet with new data
-                self.ledger_sheet.sheet.set_sheet_data(new_data)
-                
-                # Update end_idx to include the new row
-                self.end_idx += 1
-                
-                # Re-setup dropdowns for all editable rows
-                self.ledger_sheet.setup_dropdowns(self.start_idx, self.end_idx)
-                
-                # Re-highlight all rows to include the new row
-                for i in range(0, self.start_idx):
-                    self.ledger_sheet.highlight_row(i, bg="white", fg="black")
-                for i in range(self.start_idx, self.end_idx):
-                    self.ledger_sheet.highlight_row(i, bg="red", fg="white")
-                for i in range(self.end_idx, len(new_data)):
-                    self.ledger_sheet.highlight_row(i, bg="white", fg="black")
-                
-                # Make all transaction rows editable (including the new one)
-                self.ledger_sheet.set_all_readonly(True)
-                self.ledger_sheet.set_row_readonly(self.start_idx, self.end_idx, False)
-                
-                # Make ID columns readonly in all editable rows (including new one)
-                for row in range(self.start_idx, self.end_idx):
-                    self.ledger_sheet.sheet.readonly(row, 0, readonly=True)  # SplitId column
-                    self.ledger_sheet.sheet.readonly(row, 1, readonly=True)  # TransactionsId column
-                
-                # Set focus to FundChoice column (column 4) of the new row
-                self.ledger_sheet.sheet.set_currently_selected(insert_position, 4)
+                self._insert_split_row(insert_position, new_row)
+                self.edit_journal.record(FunctionCommand(
+                    "Add split",
+                    lambda: self._remove_split_row(insert_position),
+                    lambda: self._insert_split_row(insert_position, new_row)
+                ))
                 
                 if _DEBUG:
                     print(f"Added new split row at index {insert_position}, new end_idx: {self.end_idx}, last_selected_row: {last_selected_row}")
     
+    def _insert_split_row(self, position, row):
+        """Insert a split row into the editable range and make it editable."""
+        # tksheet shifts the highlights, dropdowns and readonly flags of the
+        # rows below, so only the new row needs setting up
+        self.ledger_sheet.sheet.insert_rows(
+            rows=[row], idx=position, undo=False, create_selections=False, redraw=False
+        )
+        
+        # Update end_idx to include the new row
+        self.end_idx += 1
+        
+        self._setup_editable_rows(position, position + 1)
+        
+        # Set focus to FundChoice column (column 4) of the new row
+        self.ledger_sheet.sheet.set_currently_selected(position, 4)
+        self.ledger_sheet.sheet.refresh()
+    
     def delete_split_row(self):
         """Delete the currently selected split row in edit/add mode."""
         if self.mode in ["edit", "add"]:
@@ -757,36 +928,41 @@ class Application:
                     print("Cannot delete the last remaining split in a transaction")
                 return
             
-            # Get current data
-            current_data = self.ledger_sheet.get_current_data()
-            
-            # Remove the selected row
-            new_data = current_data[:selected_row] + current_data[selected_row + 1:]
-            
-            # Update the sheet with new data
-            self.ledger_sheet.sheet.set_sheet_data(new_data)
-            
-            # Update end_idx (one less row now)
-            self.end_idx -= 1
-            
-            # Re-setup dropdowns for all remaining editable rows
-            self.ledger_sheet.setup_dropdowns(self.start_idx, self.end_idx)
-            
-            # Re-highlight all rows
-            for i in range(0, self.start_idx):
-                self.ledger_sheet.highlight_row(i, bg="white", fg="black")
-            for i in range(self.start_idx, self.end_idx):
-                self.ledger_sheet.highlight_row(i, bg="red", fg="white")
-            for i in range(self.end_idx, len(new_data)):
-                self.ledger_sheet.highlight_row(i, bg="white", fg="black")
-            
-            # Make all transaction rows editable (excluding the deleted one)
-            self.ledger_sheet.set_all_readonly(True)
-            self.ledger_sheet.set_row_readonly(self.start_idx, self.end_idx, False)
+            deleted_row = self._remove_split_row(selected_row)
+            self.edit_journal.record(FunctionCommand(
+                "Delete split",
+                lambda: self._insert_split_row(selected_row, deleted_row),
+                lambda: self._remove_split_row(selected_row)
+            ))
             
             if _DEBUG:
                 print(f"Deleted split row at index {selected_row}, "
                       f"new end_idx: {self.end_idx}")
+    
+    def _remove_split_row(self, position):
+        """Remove a split row from the editable range and return its values."""
+        removed_row = self.ledger_sheet.sheet.get_row_data(position)
+        
+        # The rows below keep their own options as tksheet shifts them up
+        self.ledger_sheet.sheet.del_rows(position, undo=False, redraw=False)
+        
+        # Update end_idx (one less row now)
+        self.end_idx -= 1
+        
+        self.ledger_sheet.sheet.refresh()
+        return removed_row
+    
+    def _setup_editable_rows(self, start_row, end_row):
+        """Apply the dropdowns, highlight and readonly flags of editable split rows to a range."""
+        self.ledger_sheet.setup_dropdowns(start_row, end_row)
+        for i in range(start_row, end_row):
+            self.ledger_sheet.highlight_row(i, bg="red", fg="white")
+        self.ledger_sheet.set_row_readonly(start_row, end_row, False)
+        
+        # Make ID columns readonly
+        for row in range(start_row, end_row):
+            self.ledger_sheet.sheet.readonly(row, 0, readonly=True)  # SplitId column
+            self.ledger_sheet.sheet.readonly(row, 1, readonly=True)  # TransactionsId column
 
     def balance_split_row(self):
         """Balance the currently selected split to make transaction sum to zero."""
@@ -828,12 +1004,81 @@ class Application:
 
             # Set the balancing amount in the selected row
             formatted_amount = f"{balancing_amount:.2f}"
+            old_amount = current_data[selected_row][6]
             self.ledger_sheet.sheet.set_cell_data(selected_row, 6, formatted_amount)
+            self.edit_journal.record(FunctionCommand(
+                "Balance split",
+                lambda: self.ledger_sheet.sheet.set_cell_data(selected_row, 6, old_amount),
+                lambda: self.ledger_sheet.sheet.set_cell_data(selected_row, 6, formatted_amount)
+            ))
 
             if _DEBUG:
                 print(f"Balanced row {selected_row}: set amount to {formatted_amount} "
                       f"(sum of others: {total_other_amounts:.2f})")
 
+    # ========== UNDO AND REDO ==========
+    
+    def _record_transaction_change(self, description, before, after=None):
+        """Record a saved change to a transaction in the session's undo history."""
+        if before is None:
+            return
+        tran_id = before['tran_id']
+        if after is None:
+            after = self.db_manager.fetch_transaction_image(tran_id)
+        version = self.db_manager.fetch_transaction_version(tran_id, include_deleted=True)
+        self.command_journal.record(TransactionCommand(
+            description, self.db_manager, before, after, self._refresh_transaction_rows, version
+        ))
+    
+    def _refresh_transaction_rows(self, tran_id):
+        """Patch one transaction's rows in the ledger display after an undo or redo."""
+        if self.current_filter_type == "account":
+            filter_id = self.account_selector.get_selected_account_id()
+        else:
+            filter_id = self.fund_selector.get_selected_fund_id()
+        self.ledger_sheet.refresh_transaction(tran_id, filter_id, self.current_filter_type)
+    
+    def undo(self, _event=None):
+        """Undo the last split edit while editing, otherwise the last saved change."""
+        if self.mode in ["edit", "add"]:
+            command = self.edit_journal.undo()
+        else:
+            command = self._step_history(self.command_journal.undo, self.command_journal.peek_undo, "undo")
+        if _DEBUG:
+            print(f"Undo: {command.description if command else 'nothing to undo'}")
+        return "break"
+    
+    def redo(self, _event=None):
+        """Redo the last undone split edit while editing, otherwise the last undone change."""
+        if self.mode in ["edit", "add"]:
+            command = self.edit_journal.redo()
+        else:
+            command = self._step_history(self.command_journal.redo, self.command_journal.peek_redo, "redo")
+        if _DEBUG:
+            print(f"Redo: {command.description if command else 'nothing to redo'}")
+        return "break"
+
+    def _step_history(self, step, peek, action):
+        """
+        Undo or redo a saved change, asking before overwriting a later change by someone else.
+        
+        Args:
+            step: command_journal.undo or command_journal.redo
+            peek: The matching command_journal.peek_undo or peek_redo
+            action: "undo" or "redo", for the question shown
+            
+        Returns:
+            The command performed, or None
+        """
+        try:
+            return step()
+        except TransactionConflict as conflict:
+            if not self._confirm_history_overwrite(conflict, action):
+                return None
+            # Go again against the version just shown
+            peek().version = conflict.current_version
+            return self._step_history(step, peek, action)
+    
     def delete_transaction(self):
         """Soft delete the current transaction being edited."""
         if self.mode == "edit" and self.selected_tran_id:
@@ -843,29 +1088,38 @@ class Application:
                 f"Are you sure you want to delete transaction {self.selected_tran_id}?\n\n"
                 f"Date: {self.selected_user_date}\n"
                 f"Description: {self.selected_description}\n\n"
-                f"This action cannot be undone."
+                f"You can undo this with Ctrl+Z."
             )
             
             if result:
                 # Perform soft delete in database
-                success = self.db_manager.soft_delete_transaction(self.selected_tran_id)
+                before = self.db_manager.fetch_transaction_image(self.selected_tran_id)
+                try:
+                    success = self.db_manager.soft_delete_transaction(
+                        self.selected_tran_id, self.selected_version
+                    )
+                except TransactionConflict as conflict:
+                    if not self._confirm_overwrite(conflict, "delete it anyway"):
+                        return
+                    self.selected_version = conflict.current_version
+                    before = conflict.current
+                    success = self.db_manager.soft_delete_transaction(
+                        self.selected_tran_id, self.selected_version
+                    )
                 
                 if success:
+                    self._record_transaction_change(
+                        f"Delete transaction {self.selected_tran_id}", before
+                    )
                     if _DEBUG:
                         print(f"Successfully soft deleted transaction {self.selected_tran_id}")
                     
                     # Store the transaction ID before cancel_edit_mode resets it
                     deleted_tran_id = self.selected_tran_id
                     
-                    # Exit edit mode and refresh the view
-                    self.cancel_edit_mode()
+                    # Exit edit mode, removing the deleted transaction's rows
+                    self.cancel_edit_mode(deleted_tran_id)
                     
-                    # Refresh the current view to hide the deleted transaction
-                    if self.current_filter_type == "account":
-                        self.update_table_with_account()
-                    else:
-                        self.update_table_with_fund()
-                        
                     # Show success message
                     messagebox.showinfo(
                         "Transaction Deleted",
@@ -882,20 +1136,82 @@ class Application:
                 if _DEBUG:
                     print("Transaction deletion cancelled by user")
     
+    def _confirm_overwrite(self, conflict, action):
+        """
+        Show the other user's version of a transaction that changed while it was being edited.
+        
+        If it was deleted there is nothing to overwrite, so edit mode is left.
+        Otherwise the user chooses between action and discarding their edits
+        to see the other version in the ledger.
+        
+        Returns:
+            bool: True to go ahead with action against the version shown
+        """
+        current = conflict.current
+        if current is None or current['deleted']:
+            messagebox.showerror(
+                "Transaction Deleted",
+                f"{conflict}. Your changes have not been saved."
+            )
+            self.cancel_edit_mode(conflict.tran_id)
+            return False
+        
+        overwrite = messagebox.askyesno(
+            "Transaction Changed",
+            f"{conflict} while you were editing it. Their version is:\n\n"
+            f"{self._describe_transaction(current)}\n\n"
+            f"Yes to {action}, No to discard your changes and see theirs."
+        )
+        if not overwrite:
+            self.cancel_edit_mode(conflict.tran_id)
+        return overwrite
+    
+    def _confirm_history_overwrite(self, conflict, action):
+        """
+        Show a change someone else made after the change being undone or redone.
+        
+        Whatever the user decides, the ledger is patched to show the
+        transaction as it is now stored.
+        
+        Returns:
+            bool: True to go ahead with action over their change
+        """
+        current = conflict.current
+        self._refresh_transaction_rows(conflict.tran_id)
+        if current is None:
+            messagebox.showerror(
+                "Transaction Removed",
+                f"Transaction {conflict.tran_id} is no longer in the ledger, so there is nothing to {action}."
+            )
+            return False
+        
+        if current['deleted']:
+            question = (f"{conflict} since your change.\n\n"
+                        f"Yes to {action} your change anyway, No to leave it deleted.")
+        else:
+            question = (f"{conflict} since your change. Their version is:\n\n"
+                        f"{self._describe_transaction(current)}\n\n"
+                        f"Yes to {action} your change over theirs, No to keep theirs.")
+        return messagebox.askyesno("Transaction Changed", question)
+    
+    def _describe_transaction(self, image):
+        """Describe a transaction image for a message box: date, description and one line per split."""
+        labels = self.db_manager.fetch_choice_labels()
+        split_lines = "\n".join(
+            f"    {labels['fund'].get(split['fund_id'], split['fund_id'])}  "
+            f"{labels['account'].get(split['account_id'], split['account_id'])}  "
+            f"{split['amount']:.2f}"
+            for split in image['splits']
+        )
+        return (f"Date: {image['user_date']}\n"
+                f"Description: {image['description']}\n"
+                f"{split_lines}")
+    
     def _get_row_from_coordinates(self, y_coordinate):
-        """Estimate row index from y coordinate."""
-        try:
-            # Try using tksheet's internal methods if available
-            sheet = self.ledger_sheet.sheet
-            # Approximate row height (this is a rough estimate)
-            header_height = 25  # Approximate header height
-            row_height = 20     # Approximate row height
-            
-            if y_coordinate > header_height:
-                estimated_row = int((y_coordinate - header_height) / row_height)
-                current_data = self.ledger_sheet.get_current_data()
-                if 0 <= estimated_row < len(current_data):
-                    return estimated_row
-            return None
-        except:
-            return None
+        """
+        Return the row at a y coordinate in the table area, or None below the last row.
+        
+        tksheet keeps the position of every row, so this is exact however the
+        rows are sized or scrolled.
+        """
+        return self.ledger_sheet.sheet.MT.identify_row(y=y_coordinate, allow_end=False)
@@ -0,0 +1,202 @@
+"""
+Archive module for Tallis Ledger.
+Moves closed financial years out of the ledger file into per-year archive files.
+
+Each archived year is a separate SQLite file next to the ledger, named
+<ledger>-archive-<year>.db, holding that year's Transactions and Split rows
+(deleted transactions included) and a copy of the Fund and Account tables,
+so it can also be opened on its own. Once written it never changes.
+
+The ledger file records every archive in its Archive table, with the file's
+SHA-256 and the year's totals per fund and account in ArchiveTotal.
+DatabaseManager's ledger and report queries read the archives transparently:
+a query attaches, read-only, only the archives its date range reaches, and
+years it covers completely are taken from ArchiveTotal wherever only totals
+are needed, so summaries and opening balances never open an archive at all.
+
+Years are archived oldest first and must have ended. Once a year is archived
+nothing may be dated on or before its last day. Each moved transaction gets
+an 'archive' entry in the audit log. verify_archives checks every archive
+file against its recorded hash and against the transactions' last audited
+images.
+"""
+
+import hashlib
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import audit
+from recurring import add_months
+
+# urllib.request.pathname2url, without loading urllib.request (and http.client) at startup
+if os.name == 'nt':
+    from nturl2path import pathname2url
+else:
+    from urllib.parse import quote as pathname2url
+
+_DEBUG = False  # Set to True for debugging output
+
+# Tables copied into an archive file; Fund and Account in full
+ARCHIVE_TABLES = ("Fund", "Account", "Transactions", "Split")
+
+
+def year_range(year, year_start="01-01"):
+    """
+    Return the first and last day of a financial year as ISO dates.
+
+    Args:
+        year: Calendar year the financial year starts in
+        year_start: Month and day the financial year starts on, as MM-DD
+
+    Raises:
+        ValueError: If year_start is not a valid MM-DD
+    """
+    try:
+        month, day = (int(part) for part in year_start.split("-"))
+        first = date(int(year), month, day)
+    except (TypeError, ValueError):
+        raise ValueError(f"year_start must be MM-DD, not {year_start}")
+    last = add_months(first, 12) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+
+def archive_file_name(db_path, year):
+    """File name of a ledger's archive for one year."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{stem}-archive-{year}.db"
+
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stored_columns(conn, table):
+    """Column names of a table without its generated columns, which cannot be inserted."""
+    # table_xinfo marks generated columns as hidden 2 (virtual) or 3 (stored)
+    return [row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})") if row[6] == 0]
+
+
+def write_archive_file(conn, path, first_day, last_day):
+    """
+    Write a new archive file holding the transactions dated between two UserDay numbers.
+
+    Tables and indexes are created from the ledger's own schema, so the
+    archive always matches the ledger it came from. Runs inside the caller's
+    write transaction on conn, so the copy is consistent with what is then
+    removed from the ledger.
+
+    Args:
+        conn: The ledger's sqlite3 connection
+        path: File to create; an existing file is replaced
+        first_day: First UserDay to copy
+        last_day: Last UserDay to copy
+
+    Returns:
+        str: SHA-256 of the written file
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    schema = conn.execute(f"""
+        SELECT type, sql FROM sqlite_master
+        WHERE tbl_name IN ({", ".join("?" * len(ARCHIVE_TABLES))}) AND sql IS NOT NULL
+    """, ARCHIVE_TABLES).fetchall()
+    copies = {
+        "Fund": ("", ()),
+        "Account": ("", ()),
+        "Transactions": ("WHERE UserDay BETWEEN ? AND ?", (first_day, last_day)),
+        "Split": ("WHERE Tran_id IN (SELECT Id FROM Transactions WHERE UserDay BETWEEN ? AND ?)",
+                  (first_day, last_day)),
+    }
+
+    archive_conn = sqlite3.connect(path)
+    try:
+        for sql in (sql for kind, sql in schema if kind == 'table'):
+            archive_conn.execute(sql)
+        for table in ARCHIVE_TABLES:
+            columns = _stored_columns(conn, table)
+            where, params = copies[table]
+            archive_conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                conn.execute(f"SELECT {', '.join(columns)} FROM {table} {where}", params)
+            )
+        # Indexes are cheaper to build once the rows are in
+        for sql in (sql for kind, sql in schema if kind == 'index'):
+            archive_conn.execute(sql)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        archive_conn.execute(f"PRAGMA user_version = {version}")
+        archive_conn.commit()
+    finally:
+        archive_conn.close()
+    if _DEBUG:
+        print(f"Wrote archive {path}")
+    return file_sha256(path)
+
+
+def archive_year(db_manager, year, year_start="01-01", today=None):
+    """
+    Move one closed financial year into its archive file.
+
+    Args:
+        db_manager: DatabaseManager for the ledger
+        year: Calendar year the financial year starts in
+        year_start: Month and day the financial year starts on, as MM-DD
+        today: Date to judge whether the year has ended; defaults to today
+
+    Returns:
+        dict: As DatabaseManager.archive_transactions, or None if the
+            database rejected the change
+
+    Raises:
+        ValueError: If the year has not ended or cannot be archived yet
+    """
+    date_from, date_to = year_range(year, year_start)
+    if date_to >= (today or date.today()).isoformat():
+        raise ValueError(f"The year {date_from} to {date_to} has not ended yet")
+    return db_manager.archive_transactions(year, date_from, date_to, archive_file_name(db_manager.db_path, year))
+
+
+def verify_archives(db_manager):
+    """
+    Check every archive file is present, unchanged and matches the audit log.
+
+    Each archived transaction is compared with the after image of its last
+    audit entry before it was archived, so an archive rewritten together
+    with its recorded hash is still caught.
+
+    Returns:
+        list: Problem dicts with keys year, tran_id and detail
+    """
+    problems = []
+    for archive in db_manager.fetch_archives():
+        year, path = archive['year'], archive['path']
+        if not os.path.exists(path):
+            problems.append({'year': year, 'tran_id': None, 'detail': f"archive file {path} is missing"})
+            continue
+        if file_sha256(path) != archive['sha256']:
+            problems.append({'year': year, 'tran_id': None, 'detail': "archive file has been changed"})
+
+        archive_conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+        try:
+            transactions = 0
+            for image in audit.read_transaction_images(archive_conn):
+                transactions += 1
+                logged = db_manager.conn.execute("""
+                    SELECT After FROM AuditLog
+                    WHERE Tran_id = ? AND Action != 'archive'
+                    ORDER BY Id DESC LIMIT 1
+                """, (image['tran_id'],)).fetchone()
+                if logged is None or logged[0] != audit.encode_image(image):
+                    problems.append({'year': year, 'tran_id': image['tran_id'],
+                                     'detail': "differs from its last audited state"})
+        finally:
+            archive_conn.close()
+        if transactions != archive['transactions']:
+            problems.append({'year': year, 'tran_id': None,
+                             'detail': f"holds {transactions} transactions, {archive['transactions']} were archived"})
+    return problems
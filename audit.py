@@ -0,0 +1,293 @@
+"""
+Audit log module for Tallis Ledger.
+Keeps a tamper-evident, hash-chained record of every change DatabaseManager makes.
+
+Each AuditLog entry holds the before and after images of one transaction
+(its Transactions row, including Created_at and Deleted_at, and all its
+Split rows) as canonical JSON. Its Hash covers those images, the entry's
+id, time and action and the previous entry's Hash, so changing, removing
+or reordering any entry breaks the chain from that point on. Triggers
+refuse UPDATE and DELETE on the log, and every verification reports a
+missing or altered trigger.
+
+Verification is incremental: each successful run records the last entry it
+checked in AuditCheckpoint, and the next run only re-hashes newer entries.
+While the triggers are in place older entries cannot change, but if one has
+gone the whole log is re-hashed, as it is with full=True.
+The state check compares every transaction with its last logged after image,
+which shows up edits made outside Tallis Ledger (for example in DB Browser).
+Give the head hash printed by a full verification to the auditors; if a
+later full verification passes and the hash still appears in the log,
+nothing before it has been rewritten. An incremental run only vouches for
+the entries added since the last checkpoint.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from itertools import groupby
+
+_DEBUG = False  # Set to True for debugging output
+
+# PrevHash of the first entry
+GENESIS_HASH = "0" * 64
+
+# Entries re-hashed per query when verifying
+VERIFY_BATCH_SIZE = 10000
+
+# Triggers that keep the log and its checkpoints append-only
+APPEND_ONLY_TRIGGERS = {
+    f"{table.lower()}_no_{statement.lower()}": (table, statement)
+    for table in ("AuditLog", "AuditCheckpoint")
+    for statement in ("UPDATE", "DELETE")
+}
+
+
+# ========== IMAGES ==========
+
+def read_transaction_images(conn, tran_ids=None):
+    """
+    Read transactions and their splits as images.
+
+    Args:
+        conn: sqlite3 connection
+        tran_ids: Ids to read; None reads every transaction
+
+    Yields:
+        dict: Keys tran_id, user_date, description, deleted, created_at,
+            deleted_at and splits (a list of dicts with keys split_id,
+            amount, fund_id, account_id, cleared, cleared_at), ordered by id
+    """
+    query = """
+        SELECT
+            Transactions.Id, Transactions.UserDate, Transactions.Description,
+            Transactions.Deleted, Transactions.Created_at, Transactions.Deleted_at,
+            Split.Id, Split.Amount, Split.FundId, Split.AccountId, Split.Cleared, Split.Cleared_at
+        FROM Transactions
+        LEFT JOIN Split ON Split.Tran_id = Transactions.Id
+        {where}
+        ORDER BY Transactions.Id, Split.Id
+    """
+    if tran_ids is None:
+        batches = [conn.execute(query.format(where=""))]
+    else:
+        tran_ids = sorted(set(tran_ids))
+        # Stay well under SQLite's limit on bound parameters
+        batches = (
+            conn.execute(query.format(where=f"WHERE Transactions.Id IN ({', '.join('?' * len(batch))})"), batch)
+            for batch in (tran_ids[start:start + 500] for start in range(0, len(tran_ids), 500))
+        )
+    for rows in batches:
+        for tran_id, tran_rows in groupby(rows, key=lambda row: row[0]):
+            tran_rows = list(tran_rows)
+            first = tran_rows[0]
+            yield {
+                'tran_id': tran_id,
+                'user_date': first[1],
+                'description': first[2],
+                'deleted': bool(first[3]),
+                'created_at': first[4],
+                'deleted_at': first[5],
+                'splits': [
+                    {
+                        'split_id': row[6],
+                        'amount': row[7],
+                        'fund_id': row[8],
+                        'account_id': row[9],
+                        'cleared': row[10],
+                        'cleared_at': row[11]
+                    }
+                    for row in tran_rows if row[6] is not None
+                ]
+            }
+
+
+def encode_image(image):
+    """Canonical JSON for an image, or None for no image."""
+    if image is None:
+        return None
+    return json.dumps(image, sort_keys=True, separators=(",", ":"))
+
+
+# ========== WRITING ==========
+
+def entry_hash(prev_hash, entry_id, logged_at, action, tran_id, before, after):
+    """Hash of one log entry; before and after are the stored JSON text."""
+    # JSON text never contains a raw newline, so newline-separated fields are unambiguous
+    payload = "\n".join([prev_hash, str(entry_id), logged_at, action, str(tran_id),
+                         "null" if before is None else before, "null" if after is None else after])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def append_entries(conn, entries):
+    """
+    Append entries to the audit log inside the caller's database transaction.
+
+    Args:
+        conn: sqlite3 connection with a write transaction open
+        entries: (action, tran_id, before image, after image) tuples
+    """
+    last = conn.execute("SELECT Id, Hash FROM AuditLog ORDER BY Id DESC LIMIT 1").fetchone()
+    entry_id, prev_hash = last if last else (0, GENESIS_HASH)
+    # Same format as SQLite's CURRENT_TIMESTAMP
+    logged_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    rows = []
+    for action, tran_id, before, after in entries:
+        entry_id += 1
+        before_json, after_json = encode_image(before), encode_image(after)
+        prev_hash = entry_hash(prev_hash, entry_id, logged_at, action, tran_id, before_json, after_json)
+        rows.append((entry_id, logged_at, action, tran_id, before_json, after_json, prev_hash))
+    conn.executemany("""
+        INSERT INTO AuditLog (Id, Logged_at, Action, Tran_id, Before, After, Hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def append_baseline(conn):
+    """
+    Log a 'baseline' entry for every transaction inside the caller's database transaction.
+
+    Used when a log starts on a file that already has transactions, so the
+    state check can vouch for history that predates the log.
+    """
+    baseline = []
+    for image in read_transaction_images(conn):
+        baseline.append(('baseline', image['tran_id'], None, image))
+        if len(baseline) == 10000:
+            append_entries(conn, baseline)
+            baseline = []
+    append_entries(conn, baseline)
+
+
+# ========== VERIFICATION ==========
+
+def _problem(check, entry_id=None, tran_id=None, detail=""):
+    """Build one problem record."""
+    return {'check': check, 'entry_id': entry_id, 'tran_id': tran_id, 'detail': detail}
+
+
+def verify_chain(conn, full=False):
+    """
+    Re-hash the audit log from the last checkpoint (or the start if full).
+
+    Returns:
+        dict: Keys problems (list of problem dicts), checked (entries
+            re-hashed), head_id and head_hash (the last entry, or 0 and
+            GENESIS_HASH for an empty log)
+    """
+    problems = []
+    entry_id, prev_hash = 0, GENESIS_HASH
+    if not full:
+        checkpoint = conn.execute(
+            "SELECT LogId, Hash FROM AuditCheckpoint ORDER BY Id DESC LIMIT 1"
+        ).fetchone()
+        if checkpoint:
+            stored = conn.execute("SELECT Hash FROM AuditLog WHERE Id = ?", (checkpoint[0],)).fetchone()
+            if stored and stored[0] == checkpoint[1]:
+                entry_id, prev_hash = checkpoint
+            else:
+                problems.append(_problem('checkpoint', checkpoint[0], detail=(
+                    "entry verified at the last checkpoint is missing or has changed; "
+                    "checking the whole log")))
+
+    checked = 0
+    while True:
+        rows = conn.execute("""
+            SELECT Id, Logged_at, Action, Tran_id, Before, After, Hash FROM AuditLog
+            WHERE Id > ? ORDER BY Id LIMIT ?
+        """, (entry_id, VERIFY_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        for row_id, logged_at, action, tran_id, before, after, stored_hash in rows:
+            if row_id != entry_id + 1:
+                problems.append(_problem('missing_entry', row_id, tran_id,
+                                         f"entries {entry_id + 1} to {row_id - 1} are missing"))
+            expected = entry_hash(prev_hash, row_id, logged_at, action, tran_id, before, after)
+            if expected != stored_hash:
+                problems.append(_problem('bad_hash', row_id, tran_id,
+                                         "entry or an earlier one has been altered"))
+            # Carry on from the stored hash so one bad entry is reported once
+            entry_id, prev_hash = row_id, stored_hash
+            checked += 1
+
+    if _DEBUG:
+        print(f"Verified {checked} audit entries up to {entry_id}: {len(problems)} problems")
+    return {'problems': problems, 'checked': checked, 'head_id': entry_id, 'head_hash': prev_hash}
+
+
+def verify_triggers(conn):
+    """
+    Check that the triggers keeping the log append-only are still in place.
+
+    Returns:
+        list: Problem dicts for triggers that are missing or altered
+    """
+    stored = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+    problems = []
+    for name, (table, statement) in APPEND_ONLY_TRIGGERS.items():
+        sql = " ".join((stored.get(name) or "").upper().split())
+        if name not in stored:
+            problems.append(_problem('missing_trigger', detail=f"trigger {name} has been dropped; "
+                                     f"{statement} on {table} is no longer refused"))
+        elif f"BEFORE {statement} ON {table.upper()}" not in sql or "RAISE(ABORT" not in sql:
+            problems.append(_problem('altered_trigger', detail=f"trigger {name} has been altered; "
+                                     f"{statement} on {table} may no longer be refused"))
+    return problems
+
+
+def verify_state(conn):
+    """
+    Compare every transaction with the after image of its last log entry.
+
+    Returns:
+        list: Problem dicts for transactions changed outside the audited
+            write paths or never logged
+    """
+    logged = dict(conn.execute("""
+        SELECT Tran_id, After FROM AuditLog
+        WHERE Id IN (SELECT MAX(Id) FROM AuditLog GROUP BY Tran_id)
+    """))
+    problems = []
+    for image in read_transaction_images(conn):
+        tran_id = image['tran_id']
+        if tran_id not in logged:
+            problems.append(_problem('unlogged', tran_id=tran_id, detail="transaction has no audit entry"))
+        elif logged.pop(tran_id) != encode_image(image):
+            problems.append(_problem('unlogged_change', tran_id=tran_id,
+                                     detail="differs from its last audited state"))
+    for tran_id, after in logged.items():
+        if after is not None:
+            problems.append(_problem('unlogged_change', tran_id=tran_id,
+                                     detail="transaction has been removed from the file"))
+    return problems
+
+
+def verify_audit_log(db_manager, full=False, state=False):
+    """
+    Verify the audit log and record a checkpoint if it is sound.
+
+    The append-only triggers are always checked. If one is missing or
+    altered, entries before the last checkpoint could have been rewritten,
+    so the whole log is re-hashed.
+
+    Args:
+        db_manager: DatabaseManager for the ledger
+        full: Re-hash the whole log instead of starting from the last checkpoint
+        state: Also compare every transaction with its last logged image
+
+    Returns:
+        dict: As verify_chain, with any trigger and state problems added
+    """
+    trigger_problems = verify_triggers(db_manager.conn)
+    result = verify_chain(db_manager.conn, full or bool(trigger_problems))
+    result['problems'] = trigger_problems + result['problems']
+    if state:
+        result['problems'] += verify_state(db_manager.conn)
+    if not result['problems'] and result['checked'] and not db_manager.read_only:
+        db_manager.conn.execute("""
+            INSERT INTO AuditCheckpoint (LogId, Hash, Verified_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        """, (result['head_id'], result['head_hash']))
+        db_manager.conn.commit()
+    return result
@@ -0,0 +1,266 @@
+"""
+Backup module for Tallis Ledger.
+Takes consistent online backups with the SQLite backup API, then verifies, compresses and rotates them.
+
+Copying the .db file while the application is writing to it can produce a
+torn copy. The backup API copies the database a few pages at a time and
+only holds a read lock during each step, so the ledger stays usable while
+a backup runs on a background thread. If another connection writes to the
+ledger mid-backup SQLite restarts the copy, so every backup is a consistent
+snapshot. A ledger written to so often that the copy keeps restarting is
+copied in a single step instead; with WAL journalling (as the server uses)
+that still does not block writers.
+
+Backups are named <ledger>-YYYYMMDD-HHMMSS.db (or .db.gz when compressed)
+and only the newest few are kept. Restore one by decompressing it with
+gunzip and opening the resulting .db file.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from queue import Queue
+
+from database import DatabaseManager
+
+_DEBUG = False  # Set to True for debugging output
+
+# Pages copied per step; SQLite pages are usually 4 KiB so this is 4 MiB
+DEFAULT_PAGES_PER_STEP = 1024
+
+# Pause between steps so the application's writes are not held up
+DEFAULT_STEP_PAUSE = 0.005
+
+# Restarts caused by other writers before copying in a single step
+MAX_RESTARTS = 3
+
+DEFAULT_KEEP = 10
+DEFAULT_INTERVAL_HOURS = 24
+
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupError(Exception):
+    """Raised when a backup cannot be written or fails verification."""
+
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback to abandon a copy that keeps restarting."""
+
+
+# ========== SINGLE BACKUP ==========
+
+def _backup_pattern(stem):
+    """Regex matching the file names of backups of the ledger named stem."""
+    return re.compile(re.escape(stem) + r"-(\d{8}-\d{6})\.db(\.gz)?$")
+
+
+def list_backups(db_path, backup_dir):
+    """
+    List the existing backups of a ledger, oldest first.
+
+    Returns:
+        list: Full paths of the backup files
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    pattern = _backup_pattern(os.path.splitext(os.path.basename(db_path))[0])
+    names = [name for name in os.listdir(backup_dir) if pattern.match(name)]
+    # The timestamp sorts chronologically as text
+    names.sort(key=lambda name: pattern.match(name).group(1))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def verify_backup(path):
+    """
+    Run SQLite's integrity check on an uncompressed backup file.
+
+    Returns:
+        list: Problems reported by PRAGMA integrity_check; empty if the file is sound
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        results = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return [] if results == ["ok"] else results
+
+
+def _compress(path):
+    """Gzip path to path.gz, remove the original and return the new path."""
+    compressed_path = path + ".gz"
+    partial_path = compressed_path + ".partial"
+    with open(path, "rb") as source, gzip.open(partial_path, "wb", compresslevel=6) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    os.replace(partial_path, compressed_path)
+    os.remove(path)
+    return compressed_path
+
+
+def rotate_backups(db_path, backup_dir, keep=DEFAULT_KEEP):
+    """
+    Delete all but the newest keep backups, and any left half-written over an hour ago.
+
+    Returns:
+        list: Paths of the files deleted
+    """
+    backups = list_backups(db_path, backup_dir)
+    removed = backups[:-keep] if keep > 0 else backups
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    partials = [os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+                if name.startswith(stem + "-") and name.endswith(".partial")]
+    # Leave recent partial files alone in case another backup is still writing one
+    removed += [path for path in partials if os.path.getmtime(path) < time.time() - 3600]
+    for path in removed:
+        os.remove(path)
+    if _DEBUG and removed:
+        print(f"Removed {len(removed)} old backups")
+    return removed
+
+
+def create_backup(db_path, backup_dir, compress=True, keep=DEFAULT_KEEP,
+                  pages_per_step=DEFAULT_PAGES_PER_STEP, step_pause=DEFAULT_STEP_PAUSE,
+                  progress=None):
+    """
+    Take one verified backup of a ledger and rotate old ones.
+
+    Args:
+        db_path: Ledger file to back up
+        backup_dir: Directory for the backups; created if missing
+        compress: Gzip the backup once it has been verified
+        keep: Number of backups to keep, including this one
+        pages_per_step: Pages copied while the read lock is held
+        step_pause: Seconds to wait between steps
+        progress: Optional callable(copied_pages, total_pages)
+
+    Returns:
+        str: Path of the new backup file
+
+    Raises:
+        BackupError: If the copy fails or does not pass the integrity check
+    """
+    if pages_per_step < 1:
+        raise ValueError("pages_per_step must be at least 1")
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(backup_dir, f"{stem}-{datetime.now().strftime(TIMESTAMP_FORMAT)}.db")
+    partial_path = path + ".partial"
+
+    restarts = 0
+    last_remaining = None
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if progress:
+            progress(total - remaining, total)
+        # SQLite starts again from the first page after another connection writes
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts >= MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+        time.sleep(step_pause)
+
+    start = time.perf_counter()
+    try:
+        with DatabaseManager(db_path, read_only=True) as source:
+            target = sqlite3.connect(partial_path)
+            try:
+                try:
+                    source.conn.backup(target, pages=pages_per_step, progress=on_step)
+                except _BackupRestarted:
+                    if _DEBUG:
+                        print(f"Backup restarted {restarts} times; copying in one step")
+                    source.conn.backup(target, pages=-1)
+            finally:
+                target.close()
+    except sqlite3.Error as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise BackupError(f"Backup of {db_path} failed: {e}")
+
+    problems = verify_backup(partial_path)
+    if problems:
+        os.remove(partial_path)
+        raise BackupError(f"Backup of {db_path} failed the integrity check: {problems[0]}")
+
+    os.replace(partial_path, path)
+    if compress:
+        path = _compress(path)
+    rotate_backups(db_path, backup_dir, keep)
+    if _DEBUG:
+        print(f"Backed up {db_path} to {path} in {time.perf_counter() - start:.2f}s")
+    return path
+
+
+# ========== SCHEDULED BACKUPS ==========
+
+class BackupScheduler:
+    """
+    Takes backups on a background thread at a fixed interval, or on request.
+
+    The first backup is due interval_hours after the newest existing backup,
+    so a ledger that is only opened for short sessions is still backed up.
+    Each outcome is put on the results queue as (path, None) or
+    (None, error message) for the caller to collect from its own thread;
+    a Tk application should poll it with after() rather than touch widgets
+    from the backup thread.
+    """
+
+    def __init__(self, db_path, backup_dir, interval_hours=DEFAULT_INTERVAL_HOURS,
+                 keep=DEFAULT_KEEP, compress=True):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self.compress = compress
+        self.results = Queue()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def _seconds_until_due(self):
+        backups = list_backups(self.db_path, self.backup_dir)
+        if not backups:
+            return 0
+        return max(os.path.getmtime(backups[-1]) + self.interval - time.time(), 0)
+
+    def _run(self):
+        while not self._stopping:
+            # A request from backup_now() sets the event and ends the wait early
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+            if self._stopping:
+                break
+            try:
+                self.results.put((create_backup(self.db_path, self.backup_dir,
+                                                self.compress, self.keep), None))
+            except (BackupError, OSError) as e:
+                self.results.put((None, str(e)))
+                # Wait a full interval rather than retrying a failing backup at once
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def start(self):
+        """Start the background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-backup", daemon=True)
+            self._thread.start()
+
+    def backup_now(self):
+        """Ask the background thread to take a backup straight away."""
+        self.start()
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """Stop the background thread, letting a backup in progress finish."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
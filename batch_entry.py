@@ -0,0 +1,216 @@
+"""
+Batch entry module for Tallis Ledger.
+Provides a staging grid for entering many transactions and posting them together.
+"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+from tksheet import Sheet
+
+_DEBUG = False  # Set to True for debugging output
+
+
+BATCH_HEADERS = ['Ref', 'UserDate', 'Description', 'FundChoice', 'AccountChoice', 'Amount']
+
+
+class BatchEntryWindow:
+    """
+    Staging grid for month-end journals.
+
+    Rows sharing the same Ref form one transaction. Nothing is written until
+    Post Batch is pressed, at which point every transaction is validated and
+    the whole batch is posted in a single database transaction.
+    """
+
+    def __init__(self, root, db_manager, date_validator, on_posted_callback=None):
+        self.db_manager = db_manager
+        self.date_validator = date_validator
+        self.on_posted_callback = on_posted_callback
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Tallis Ledger - Batch Entry")
+        self.window.geometry("1200x600")
+
+        choice_labels = self.db_manager.fetch_choice_labels()
+        self.account_values = list(choice_labels['account'].values())
+        self.fund_values = list(choice_labels['fund'].values())
+        self.default_account = next(v for v in self.account_values if v.startswith("0:"))
+        self.default_fund = next(v for v in self.fund_values if v.startswith("0:"))
+
+        # Buttons
+        button_container = ttk.Frame(self.window)
+        button_container.pack(side="top", pady=5)
+
+        ttk.Button(button_container, text="Close", command=self.close).pack(side="left", padx=3, pady=8)
+        ttk.Button(button_container, text="Post Batch", command=self.post_batch,
+                   style="Accent.TButton").pack(side="left", padx=3, pady=8)
+        ttk.Button(button_container, text="Add Split", command=self.add_split_row).pack(side="left", padx=3, pady=8)
+        ttk.Button(button_container, text="New Transaction",
+                   command=self.add_transaction_rows).pack(side="left", padx=3, pady=8)
+        ttk.Button(button_container, text="Delete Row", command=self.delete_row).pack(side="left", padx=3, pady=8)
+
+        self.status_label = ttk.Label(button_container, text="")
+        self.status_label.pack(side="left", padx=(20, 0))
+
+        # Staging grid
+        sheet_frame = tk.Frame(self.window)
+        sheet_frame.pack(expand=True, fill="both", padx=2, pady=2)
+        self.sheet = Sheet(sheet_frame, data=[], headers=BATCH_HEADERS, editable=True)
+        self.sheet.enable_bindings(("single_select", "edit_cell", "arrowkeys"))
+        self.sheet.pack(expand=True, fill="both")
+        for i, width in enumerate([50, 100, 500, 200, 200, 100]):
+            self.sheet.column_width(column=i, width=width)
+
+        self.add_transaction_rows()
+
+    def _next_ref(self):
+        """Return a Ref one higher than any in the grid."""
+        refs = [self._parse_ref(row[0]) for row in self.sheet.get_sheet_data()]
+        refs = [ref for ref in refs if ref is not None]
+        return max(refs) + 1 if refs else 1
+
+    def _parse_ref(self, value):
+        """Parse a Ref cell into an int, or None if it is not a number."""
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+
+    def _insert_row(self, row, idx):
+        """Insert a staging row and attach the fund and account dropdowns."""
+        self.sheet.insert_row(row=row, idx=idx, redraw=False)
+        self.sheet[idx, 3].dropdown(values=self.fund_values, set_value=row[3])
+        self.sheet[idx, 4].dropdown(values=self.account_values, set_value=row[4])
+
+    def add_transaction_rows(self):
+        """Append two blank splits for a new transaction at the end of the grid."""
+        ref = self._next_ref()
+        data = self.sheet.get_sheet_data()
+        user_date = data[-1][1] if data else ""
+        for offset in range(2):
+            row = [ref, user_date, "", self.default_fund, self.default_account, "0.00"]
+            self._insert_row(row, len(data) + offset)
+        self.sheet.set_currently_selected(len(data), 2)
+        self.sheet.see(len(data), 2)
+        self.sheet.refresh()
+        self._update_status()
+
+    def add_split_row(self):
+        """Add a split to the transaction of the selected row, directly below it."""
+        selected = self.sheet.get_currently_selected()
+        data = self.sheet.get_sheet_data()
+        if not selected or not data:
+            self.add_transaction_rows()
+            return
+        source = data[selected[0]]
+        row = [source[0], source[1], source[2], self.default_fund, self.default_account, "0.00"]
+        self._insert_row(row, selected[0] + 1)
+        self.sheet.set_currently_selected(selected[0] + 1, 3)
+        self.sheet.refresh()
+        self._update_status()
+
+    def delete_row(self):
+        """Delete the selected staging row."""
+        selected = self.sheet.get_currently_selected()
+        if not selected:
+            return
+        self.sheet.del_row(selected[0])
+        self._update_status()
+
+    def collect_transactions(self):
+        """
+        Group the staging rows by Ref into transactions.
+
+        The date and description are taken from the first row of each group.
+
+        Returns:
+            tuple: (transactions, errors) where transactions is a list of dicts
+                for DatabaseManager.add_transactions_bulk and errors is a list
+                of (first_row_index, message) tuples
+        """
+        groups = {}
+        errors = []
+        for i, row in enumerate(self.sheet.get_sheet_data()):
+            ref = self._parse_ref(row[0])
+            if ref is None:
+                errors.append((i, f"Row {i + 1}: Ref must be a number"))
+                continue
+            groups.setdefault(ref, []).append((i, row))
+
+        transactions = []
+        for ref, rows in groups.items():
+            first_index, first_row = rows[0]
+            user_date = str(first_row[1]).strip()
+            description = str(first_row[2])
+            if not self.date_validator(user_date):
+                errors.append((first_index, f"Ref {ref}: invalid date '{user_date}'"))
+                continue
+
+            splits = []
+            for i, row in rows:
+                try:
+                    amount = float(row[5]) if row[5] not in ("", None) else 0.0
+                    fund_id = int(str(row[3]).split(':')[0]) if row[3] else 0
+                    account_id = int(str(row[4]).split(':')[0]) if row[4] else 0
+                except ValueError:
+                    errors.append((i, f"Ref {ref}: row {i + 1} has an invalid amount or choice"))
+                    splits = None
+                    break
+                splits.append({'amount': amount, 'fund_id': fund_id, 'account_id': account_id})
+            if splits is None:
+                continue
+
+            error = self.db_manager.validate_transaction(user_date, description, splits)
+            if error:
+                errors.append((first_index, f"Ref {ref}: {error}"))
+                continue
+            transactions.append({
+                'user_date': user_date,
+                'description': description,
+                'splits': splits
+            })
+        return transactions, errors
+
+    def post_batch(self):
+        """Validate every staged transaction and post them all in one commit."""
+        transactions, errors = self.collect_transactions()
+
+        self.sheet.dehighlight_rows("all", redraw=False)
+        if errors:
+            self.sheet.highlight_rows(rows=[i for i, _ in errors], bg="red", fg="white")
+            messagebox.showwarning(
+                "Batch Not Posted",
+                "Fix the following before posting:\n\n" + "\n".join(msg for _, msg in errors[:20]),
+                parent=self.window
+            )
+            return
+        if not transactions:
+            return
+
+        new_ids = self.db_manager.add_transactions_bulk(transactions)
+        if new_ids is None:
+            messagebox.showerror(
+                "Batch Not Posted",
+                "The database rejected the batch. Nothing was posted.",
+                parent=self.window
+            )
+            return
+
+        if _DEBUG:
+            print(f"Posted {len(new_ids)} transactions: {new_ids[0]}-{new_ids[-1]}")
+
+        self.sheet.set_sheet_data([])
+        self.add_transaction_rows()
+        self.status_label.config(text=f"Posted {len(new_ids)} transactions")
+        if self.on_posted_callback:
+            self.on_posted_callback()
+
+    def _update_status(self):
+        """Show the number of staged transactions and splits."""
+        data = self.sheet.get_sheet_data()
+        refs = {self._parse_ref(row[0]) for row in data}
+        self.status_label.config(text=f"{len(refs)} transactions, {len(data)} splits staged")
+
+    def close(self):
+        """Close the batch entry window, discarding anything not posted."""
+        self.window.destroy()
@@ -0,0 +1,123 @@
+"""
+Benchmark for the DatabaseManager tuning profiles.
+Times fetch_ledger_data and add_transactions_bulk under each profile on a synthetic ledger.
+
+Usage:
+    python benchmark_profiles.py [--transactions 100000] [--dir /path/on/the/disk/to/test]
+
+The synthetic ledger is written to --dir (the system temp directory by
+default), so point it at the disk the real ledger lives on. Each ledger read
+is timed with a freshly opened connection so the page cache starts cold
+from SQLite's point of view; the operating system's file cache still helps
+every profile equally after the first run.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from database import DatabaseManager, PROFILES
+
+_DEBUG = False  # Set to True for debugging output
+
+ACCOUNTS = [1001, 1002, 4001, 4002, 5001, 5002, 5003]
+FUNDS = [0, 1, 2, 3]
+
+
+def build_ledger(path, transaction_count, seed=1):
+    """Create a ledger file with transaction_count three-split transactions."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(script_dir, "createtables.sql"), encoding="utf-8") as f:
+        schema = f.read()
+
+    with DatabaseManager(path, profile='bulk-import') as db_manager:
+        db_manager.conn.executescript(schema)
+        db_manager.conn.executemany(
+            "INSERT OR IGNORE INTO Account (Id, Name, Type) VALUES (?, ?, 'Benchmark')",
+            [(account_id, f"Account {account_id}") for account_id in ACCOUNTS]
+        )
+        db_manager.conn.executemany(
+            "INSERT OR IGNORE INTO Fund (Id, Name, Type) VALUES (?, ?, 'Benchmark')",
+            [(fund_id, f"Fund {fund_id}") for fund_id in FUNDS]
+        )
+        db_manager.conn.commit()
+        db_manager.add_transactions_bulk(make_transactions(transaction_count, seed))
+
+
+def make_transactions(count, seed):
+    """Generate balanced three-split transactions spread over several years."""
+    rng = random.Random(seed)
+    transactions = []
+    for i in range(count):
+        amount = round(rng.uniform(1, 1000), 2)
+        fund_id = rng.choice(FUNDS)
+        transactions.append({
+            'user_date': f"{2015 + i % 10}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'description': f"Benchmark transaction {i}",
+            'splits': [
+                {'amount': amount, 'fund_id': fund_id, 'account_id': 1001},
+                {'amount': -round(amount / 2, 2), 'fund_id': fund_id, 'account_id': rng.choice(ACCOUNTS[2:])},
+                {'amount': -(amount - round(amount / 2, 2)), 'fund_id': fund_id, 'account_id': rng.choice(ACCOUNTS[2:])},
+            ]
+        })
+    return transactions
+
+
+def time_fetch(path, profile, repeats=3):
+    """Best time to fetch the busiest account's ledger."""
+    best = None
+    for _ in range(repeats):
+        with DatabaseManager(path, profile=profile) as db_manager:
+            start = time.perf_counter()
+            db_manager.fetch_ledger_data(1001, 'account')
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_bulk_insert(path, profile, count):
+    """Time posting count transactions in one bulk call on a copy of the ledger."""
+    copy_path = path + f".{profile}.db"
+    shutil.copyfile(path, copy_path)
+    try:
+        with DatabaseManager(copy_path, profile=profile) as db_manager:
+            transactions = make_transactions(count, seed=2)
+            start = time.perf_counter()
+            db_manager.add_transactions_bulk(transactions)
+            return time.perf_counter() - start
+    finally:
+        os.remove(copy_path)
+
+
+def main(argv=None):
+    """Run the benchmark and print one line per profile."""
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager tuning profiles")
+    parser.add_argument("--transactions", type=int, default=100000, help="transactions in the synthetic ledger")
+    parser.add_argument("--insert", type=int, default=20000, help="transactions posted by the bulk insert test")
+    parser.add_argument("--dir", default=None, help="directory to build the synthetic ledger in")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    path = os.path.join(work_dir, "benchmark_ledger.db")
+    try:
+        start = time.perf_counter()
+        build_ledger(path, args.transactions)
+        print(f"Built {args.transactions} transactions in {time.perf_counter() - start:.2f}s "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)")
+        print(f"{'profile':<18}{'fetch_ledger_data':>20}{'bulk insert':>16}")
+        for profile in PROFILES:
+            fetch_time = time_fetch(path, profile)
+            if PROFILES[profile]['read_only']:
+                insert_text = "n/a"
+            else:
+                insert_text = f"{time_bulk_insert(path, profile, args.insert):.3f}s"
+            print(f"{profile:<18}{fetch_time:>19.3f}s{insert_text:>16}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Command journal module for Tallis Ledger.
+Records editing operations so they can be undone and redone during a session.
+"""
+
+from collections import deque
+
+_DEBUG = False  # Set to True for debugging output
+
+DEFAULT_HISTORY_SIZE = 100
+
+
+class FunctionCommand:
+    """A reversible operation given as a pair of functions."""
+
+    def __init__(self, description, undo_func, redo_func):
+        self.description = description
+        self.undo_func = undo_func
+        self.redo_func = redo_func
+
+    def undo(self):
+        """Reverse the operation. Returns False if it could not be reversed."""
+        return self.undo_func() is not False
+
+    def redo(self):
+        """Perform the operation again. Returns False if it could not be redone."""
+        return self.redo_func() is not False
+
+
+class TransactionCommand:
+    """
+    A saved change to one transaction, held as before and after images.
+
+    Images come from DatabaseManager.fetch_transaction_image. Adding a
+    transaction is recorded with a soft-deleted before image and deleting
+    one with a soft-deleted after image, so every kind of change is undone
+    and redone the same way. on_applied is called with the transaction id
+    after each undo or redo so the caller can patch its display.
+
+    version is the row version the change left behind. Undo and redo only
+    overwrite that version, so a change someone else saved in the meantime
+    raises TransactionConflict instead of being lost; set version to the
+    conflict's current_version to overwrite it anyway.
+    """
+
+    def __init__(self, description, db_manager, before, after, on_applied=None, version=None):
+        self.description = description
+        self.db_manager = db_manager
+        self.before = before
+        self.after = after
+        self.on_applied = on_applied
+        self.version = version
+
+    def _apply(self, image):
+        tran_id = image['tran_id']
+        if not self.db_manager.apply_transaction_image(image, self.version):
+            return False
+        self.version = self.db_manager.fetch_transaction_version(tran_id, include_deleted=True)
+        if self.on_applied:
+            self.on_applied(tran_id)
+        return True
+
+    def undo(self):
+        return self._apply(self.before)
+
+    def redo(self):
+        return self._apply(self.after)
+
+
+class CommandJournal:
+    """
+    Bounded undo and redo history.
+
+    Only the most recent max_size commands are kept, so memory stays
+    predictable however long the session runs. Recording a new command
+    discards anything that could have been redone.
+    """
+
+    def __init__(self, max_size=DEFAULT_HISTORY_SIZE):
+        self.undo_stack = deque(maxlen=max_size)
+        self.redo_stack = deque(maxlen=max_size)
+
+    def record(self, command):
+        """Add a command that has just been performed."""
+        self.undo_stack.append(command)
+        self.redo_stack.clear()
+        if _DEBUG:
+            print(f"Recorded: {command.description} ({len(self.undo_stack)} in history)")
+
+    def undo(self):
+        """
+        Undo the most recent command.
+
+        The history is left as it was if the command fails or raises, so
+        the user can try again.
+
+        Returns:
+            The command undone, or None if there was nothing to undo or it failed
+        """
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack[-1]
+        if not command.undo():
+            return None
+        self.redo_stack.append(self.undo_stack.pop())
+        return command
+
+    def redo(self):
+        """
+        Redo the most recently undone command.
+
+        Returns:
+            The command redone, or None if there was nothing to redo or it failed
+        """
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack[-1]
+        if not command.redo():
+            return None
+        self.undo_stack.append(self.redo_stack.pop())
+        return command
+
+    def peek_undo(self):
+        """Return the command undo would reverse, or None."""
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def peek_redo(self):
+        """Return the command redo would perform again, or None."""
+        return self.redo_stack[-1] if self.redo_stack else None
+
+    def clear(self):
+        """Forget all history."""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
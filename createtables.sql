@@ -2,6 +2,13 @@
 PRAGMA foreign_keys = ON;
 
 -- Drop tables if they already exist
+DROP TABLE IF EXISTS ArchiveTotal;
+DROP TABLE IF EXISTS Archive;
+DROP TABLE IF EXISTS RecurringPosting;
+DROP TABLE IF EXISTS RecurringSplit;
+DROP TABLE IF EXISTS RecurringTemplate;
+DROP TABLE IF EXISTS AuditCheckpoint;
+DROP TABLE IF EXISTS AuditLog;
 DROP TABLE IF EXISTS Split;
 DROP TABLE IF EXISTS Transactions;
 DROP TABLE IF EXISTS Fund;
@@ -28,7 +35,11 @@ CREATE TABLE Transactions (
     Description TEXT CHECK(length(Description) <= 100),
     Created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     Deleted BOOLEAN DEFAULT 0,
-    Deleted_at DATETIME
+    Deleted_at DATETIME,
+    -- Row version, moved on by every change; saves and deletes check it (see database.py)
+    Version INTEGER NOT NULL DEFAULT 1,
+    -- Days since 1970-01-01, for indexed date range queries
+    UserDay INTEGER GENERATED ALWAYS AS (CAST(julianday(UserDate) - 2440587.5 AS INTEGER)) VIRTUAL
 );
 
 -- Create Split table
@@ -38,24 +49,122 @@ CREATE TABLE Split (
     Amount REAL,
     FundId INTEGER,
     AccountId INTEGER,
+    Cleared BOOLEAN DEFAULT 0,
+    Cleared_at DATETIME,
     FOREIGN KEY (Tran_id) REFERENCES Transactions(Id),
     FOREIGN KEY (FundId) REFERENCES Fund(Id),
     FOREIGN KEY (AccountId) REFERENCES Account(Id)
 );
 
+-- Create audit log table (see audit.py); append-only, each entry hash-chained to the last
+CREATE TABLE AuditLog (
+    Id INTEGER PRIMARY KEY,
+    Logged_at DATETIME,
+    Action TEXT,
+    Tran_id INTEGER,
+    Before TEXT,
+    After TEXT,
+    Hash TEXT
+);
+
+-- Create audit checkpoint table recording the last verified log entry
+CREATE TABLE AuditCheckpoint (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    LogId INTEGER,
+    Hash TEXT,
+    Verified_at DATETIME
+);
+
+-- Create recurring transaction template tables (see recurring.py)
+CREATE TABLE RecurringTemplate (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Description TEXT CHECK(length(Description) <= 100),
+    Frequency TEXT CHECK(Frequency IN ('weekly', 'monthly', 'quarterly', 'yearly')),
+    Interval INTEGER DEFAULT 1 CHECK(Interval >= 1),
+    StartDate DATE,
+    EndDate DATE,
+    Active BOOLEAN DEFAULT 1,
+    Created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE RecurringSplit (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    TemplateId INTEGER,
+    Amount REAL,
+    FundId INTEGER,
+    AccountId INTEGER,
+    FOREIGN KEY (TemplateId) REFERENCES RecurringTemplate(Id),
+    FOREIGN KEY (FundId) REFERENCES Fund(Id),
+    FOREIGN KEY (AccountId) REFERENCES Account(Id)
+);
+
+-- One row per posted occurrence; the primary key stops an occurrence being posted twice
+CREATE TABLE RecurringPosting (
+    TemplateId INTEGER,
+    OccurrenceDate DATE,
+    Tran_id INTEGER,
+    PRIMARY KEY (TemplateId, OccurrenceDate),
+    FOREIGN KEY (TemplateId) REFERENCES RecurringTemplate(Id),
+    FOREIGN KEY (Tran_id) REFERENCES Transactions(Id)
+);
+
+-- Create archive tables (see archive.py): one row per archived year and its
+-- live totals per fund and account when it was archived
+CREATE TABLE Archive (
+    Year INTEGER PRIMARY KEY,
+    FileName TEXT NOT NULL,
+    DateFrom DATE NOT NULL,
+    DateTo DATE NOT NULL,
+    Transactions INTEGER,
+    Splits INTEGER,
+    Sha256 TEXT,
+    Archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE ArchiveTotal (
+    Year INTEGER,
+    FundId INTEGER,
+    AccountId INTEGER,
+    Amount REAL,
+    ClearedAmount REAL,
+    PRIMARY KEY (Year, FundId, AccountId),
+    FOREIGN KEY (Year) REFERENCES Archive(Year)
+);
+
+CREATE TRIGGER auditlog_no_update BEFORE UPDATE ON AuditLog
+BEGIN SELECT RAISE(ABORT, 'AuditLog is append-only'); END;
+CREATE TRIGGER auditlog_no_delete BEFORE DELETE ON AuditLog
+BEGIN SELECT RAISE(ABORT, 'AuditLog is append-only'); END;
+CREATE TRIGGER auditcheckpoint_no_update BEFORE UPDATE ON AuditCheckpoint
+BEGIN SELECT RAISE(ABORT, 'AuditCheckpoint is append-only'); END;
+CREATE TRIGGER auditcheckpoint_no_delete BEFORE DELETE ON AuditCheckpoint
+BEGIN SELECT RAISE(ABORT, 'AuditCheckpoint is append-only'); END;
+
 -- Create indexes for performance
 -- Transactions table indexes (excluding primary key Id)
 CREATE INDEX idx_transactions_userdate ON Transactions(UserDate);
 CREATE INDEX idx_transactions_description ON Transactions(Description);
-CREATE INDEX idx_transactions_created_at ON Transactions(Created_at);
+CREATE INDEX idx_transactions_created_deleted ON Transactions(Created_at, Deleted_at);
 CREATE INDEX idx_transactions_deleted ON Transactions(Deleted);
 CREATE INDEX idx_transactions_deleted_at ON Transactions(Deleted_at);
+CREATE INDEX idx_transactions_userday ON Transactions(UserDay, Id);
 
 -- Split table indexes (excluding primary key Id)
 CREATE INDEX idx_split_tran_id ON Split(Tran_id);
 CREATE INDEX idx_split_amount ON Split(Amount);
 CREATE INDEX idx_split_fund_id ON Split(FundId);
 CREATE INDEX idx_split_account_id ON Split(AccountId);
+CREATE INDEX idx_split_account_cleared ON Split(AccountId, Cleared);
+
+-- AuditLog table indexes
+CREATE INDEX idx_auditlog_tran_id ON AuditLog(Tran_id);
+CREATE INDEX idx_auditlog_logged_at ON AuditLog(Logged_at);
+
+-- Recurring template indexes
+CREATE INDEX idx_recurringsplit_template_id ON RecurringSplit(TemplateId);
+
+-- Record the schema version (see migrations.py)
+PRAGMA user_version = 7;
 
 -- Insert default 'No Fund' entry
 INSERT INTO Fund (Id, Name, Type) VALUES
@@ -3,85 +3,667 @@ Database management module for Tallis Ledger.
 Handles all SQLite database operations and queries.
 """
 
+import os
 import sqlite3
-import pandas as pd
+import archive
+import audit
+import migrations
+from dates import normalize_date, normalize_timestamp, day_number
+
+# urllib.request.pathname2url, without loading urllib.request (and http.client) at startup
+if os.name == 'nt':
+    from nturl2path import pathname2url
+else:
+    from urllib.parse import quote as pathname2url
+
+# pandas and numpy are imported inside the methods that build DataFrames,
+# so the command-line tool and the server start without loading them
 
 _DEBUG = False  # Set to True for debugging output
 
 
+# Named connection tuning profiles. Each sets SQLite pragmas on open;
+# a value of None leaves that setting at SQLite's default.
+#
+#   interactive        the desktop application: larger page cache, memory-mapped
+#                      reads and in-memory temporary tables
+#   bulk-import        one-off imports and batch posting: a very large cache, a
+#                      truncated rather than deleted journal and no fsync. A power
+#                      cut mid-import can corrupt the file, so only use it on a
+#                      file you have a backup of
+#   read-only-viewer   trustees browsing a copy: the file is opened read-only and
+#                      immutable, so SQLite skips locking and change detection
+#                      entirely. Never use it on a file something else is writing
+PROFILES = {
+    'default': {
+        'read_only': False,
+        'immutable': False,
+        'pragmas': {},
+    },
+    'interactive': {
+        'read_only': False,
+        'immutable': False,
+        'pragmas': {
+            'cache_size': -65536,         # 64 MiB
+            'mmap_size': 268435456,       # 256 MiB
+            'temp_store': 'MEMORY',
+            'synchronous': None,
+            'journal_size_limit': 67108864,  # trim the journal back to 64 MiB
+        },
+    },
+    'bulk-import': {
+        'read_only': False,
+        'immutable': False,
+        'pragmas': {
+            'cache_size': -262144,        # 256 MiB
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+            'synchronous': 'OFF',
+            'journal_mode': 'TRUNCATE',
+        },
+    },
+    'read-only-viewer': {
+        'read_only': True,
+        'immutable': True,
+        'pragmas': {
+            'cache_size': -65536,
+            'mmap_size': 1073741824,      # 1 GiB
+            'temp_store': 'MEMORY',
+            'query_only': 'ON',
+        },
+    },
+}
+
+
+# Transactions whose audit entries recategorize_splits builds at a time
+RECATEGORIZE_AUDIT_CHUNK = 10000
+
+# SQLite's default limit on attached databases (SQLITE_MAX_ATTACHED); a
+# query reaching more archived years than this is run in date windows
+MAX_ATTACHED_ARCHIVES = 10
+
+
+# ========== QUERY FRAGMENTS ==========
+# Shared with workspace.py, whose queries alias each attached file's tables
+# to the same names.
+
+def ledger_filter_clause(filter_type):
+    """Return the WHERE clause fragment selecting one account or fund."""
+    if filter_type == 'account':
+        return "Account.Id = ?"
+    elif filter_type == 'fund':
+        return "Fund.Id = ?"
+    else:
+        raise ValueError("filter_type must be 'account' or 'fund'")
+
+
+def date_bounds(date_from=None, date_to=None):
+    """
+    Convert an inclusive date range to (first, last) UserDay numbers.
+    
+    Either end may be None for an open range.
+    """
+    bounds = []
+    for date_string in (date_from, date_to):
+        day = None if date_string is None else day_number(date_string)
+        if date_string is not None and day is None:
+            raise ValueError(f"Invalid date: {date_string}")
+        bounds.append(day)
+    return tuple(bounds)
+
+
+def day_range_clause(first_day=None, last_day=None):
+    """
+    Return a WHERE clause fragment and parameters limiting UserDay to a range of day numbers.
+    
+    Either end may be None for an open range. The fragment starts with
+    " AND " so it can be appended to an existing clause, and is empty
+    when there is no range.
+    """
+    clause = ""
+    params = []
+    for day, operator in ((first_day, ">="), (last_day, "<=")):
+        if day is not None:
+            clause += f" AND Transactions.UserDay {operator} ?"
+            params.append(day)
+    return clause, params
+
+
+def date_range_clause(date_from=None, date_to=None):
+    """As day_range_clause, for an inclusive range of dates in any accepted format."""
+    return day_range_clause(*date_bounds(date_from, date_to))
+
+
+def summary_grouping(group_by):
+    """
+    Return the SELECT columns and GROUP BY expression for a summary.
+    
+    Args:
+        group_by: 'account', 'fund' or 'type'
+    
+    Returns:
+        tuple: (select column list, group expression)
+    """
+    if group_by == 'account':
+        return ("Account.Id AS AccountId, Account.Name AS AccountName, Account.Type AS AccountType",
+                "Split.AccountId")
+    elif group_by == 'fund':
+        return "Fund.Id AS FundId, Fund.Name AS FundName, Fund.Type AS FundType", "Split.FundId"
+    elif group_by == 'type':
+        return "Account.Type AS AccountType", "Account.Type"
+    else:
+        raise ValueError("group_by must be 'account', 'fund' or 'type'")
+
+
+class TransactionConflict(Exception):
+    """
+    Raised when a transaction was changed or deleted after the caller read it.
+    
+    current_version is the version now stored and current the transaction's
+    image as fetch_transaction_image returns it (None if it no longer
+    exists), so the caller can show the other user's version.
+    """
+    
+    def __init__(self, tran_id, expected_version, current_version, current):
+        if current is None or current['deleted']:
+            message = f"Transaction {tran_id} has been deleted by someone else"
+        else:
+            message = (f"Transaction {tran_id} has been changed by someone else "
+                       f"(version {current_version}, expected {expected_version})")
+        super().__init__(message)
+        self.tran_id = tran_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+        self.current = current
+
+
 class DatabaseManager:
     """Handles all SQLite database operations and queries."""
     
-    def __init__(self, db_path="your_ledger.db"):
-        """Initialize database connection with foreign key support."""
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path="your_ledger.db", check_same_thread=True, read_only=False,
+                 profile='default'):
+        """
+        Initialize database connection with foreign key support.
+        
+        Pass check_same_thread=False when the manager is handed between threads
+        (for example from a connection pool); the caller must then ensure only
+        one thread uses it at a time. With read_only=True the file is opened
+        through a mode=ro URI so no write can ever reach it. profile names one
+        of the tuning profiles in PROFILES.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"profile must be one of: {', '.join(PROFILES)}")
+        settings = PROFILES[profile]
+        read_only = read_only or settings['read_only']
+        
+        self.db_path = db_path
+        self.read_only = read_only
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+            if settings['immutable']:
+                uri += "&immutable=1"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+        else:
+            # uri=True lets archives be attached through read-only URIs
+            self.conn = sqlite3.connect(db_path, uri=True, check_same_thread=check_same_thread)
         self.cursor = self.conn.cursor()
         self.cursor.execute("PRAGMA foreign_keys = ON")
+        self._choice_labels = None
+        self._archives = None
+        self._archives_version = None
+        self._attached_archives = {}
+        if not read_only:
+            migrations.upgrade(self.conn)
+        self.apply_profile(profile)
+    
+    def apply_profile(self, profile):
+        """
+        Apply a tuning profile's pragmas to the open connection.
+        
+        Lets a long-lived connection switch to 'bulk-import' for a large import
+        and back to 'interactive' afterwards. The read-only and immutable parts
+        of a profile only take effect when the file is opened.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"profile must be one of: {', '.join(PROFILES)}")
+        for name, value in PROFILES[profile]['pragmas'].items():
+            if value is None:
+                continue
+            if name == 'journal_mode':
+                # A WAL file is shared with other connections (see server.py);
+                # leave it in WAL rather than fight them for the lock
+                if self.read_only or self.cursor.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                    continue
+            # Pragma names and values come from PROFILES, never from user input
+            self.cursor.execute(f"PRAGMA {name} = {value}")
+            self.cursor.fetchall()
+        self.profile = profile
     
     # ========== LOOKUP QUERIES ==========
     
     def fetch_chart_options(self):
         """Fetch all account entries for dropdown selection."""
+        import pandas as pd
         query = "SELECT Id, Name FROM Account ORDER BY Id"
         return pd.read_sql_query(query, self.conn)
     
     def fetch_fund_options(self):
         """Fetch all fund entries for dropdown selection."""
+        import pandas as pd
         query = "SELECT Id, Name FROM Fund ORDER BY Id"
         return pd.read_sql_query(query, self.conn)
     
+    def fetch_choice_labels(self):
+        """
+        Return the 'Id:Name' label of every fund and account.
+        
+        Built once per connection and shared: every ledger row, dropdown and
+        sheet cell showing a fund or account refers to the one string here
+        rather than carrying its own copy. Funds and accounts are maintained
+        outside Tallis Ledger, so call clear_choice_labels after changing them.
+        
+        Returns:
+            dict: {'fund': {id: label}, 'account': {id: label}}, each ordered by id
+        """
+        if self._choice_labels is None:
+            self._choice_labels = {
+                kind: {row_id: f"{row_id}:{name}" for row_id, name in self.conn.execute(
+                    f"SELECT Id, Name FROM {table} ORDER BY Id"
+                )}
+                for kind, table in (('fund', "Fund"), ('account', "Account"))
+            }
+        return self._choice_labels
+    
+    def clear_choice_labels(self):
+        """Forget the cached fund and account labels so they are re-read on next use."""
+        self._choice_labels = None
+    
+    def _resolve_choices(self, df):
+        """
+        Replace a query's FundId and AccountId columns with FundChoice and AccountChoice labels.
+        
+        The ids are resolved with one vectorised lookup, and the new columns
+        hold references to the shared labels of fetch_choice_labels instead
+        of a string per row; on a 1M-split account ledger that saves about
+        90 MiB across the DataFrame, its formatted copy and the sheet rows.
+        Ids with no fund or account give None, as the SQL join gave NULL.
+        """
+        import numpy as np
+        import pandas as pd
+        for kind, id_column, choice_column in (('fund', 'FundId', 'FundChoice'),
+                                               ('account', 'AccountId', 'AccountChoice')):
+            labels = self.fetch_choice_labels()[kind]
+            # The extra None on the end is what get_indexer's -1 (not found) picks
+            choices = np.array(list(labels.values()) + [None], dtype=object)
+            codes = pd.Index(list(labels), dtype='float64').get_indexer(df[id_column].astype('float64'))
+            position = df.columns.get_loc(id_column)
+            df.insert(position, choice_column, choices[codes])
+            del df[id_column]
+        return df
+    
     # ========== TRANSACTION QUERIES ==========
     
-    def fetch_ledger_data(self, filter_id, filter_type='account'):
-        """Fetch ledger data filtered by account or fund with formatted choice fields."""
-        if filter_type == 'account':
-            filter_clause = "Account.Id = ?"
-        elif filter_type == 'fund':
-            filter_clause = "Fund.Id = ?"
-        else:
-            raise ValueError("filter_type must be 'account' or 'fund'")
-            
-        query = f"""
-            SELECT
+    def fetch_ledger_data(self, filter_id, filter_type='account', tran_id=None,
+                          date_from=None, date_to=None, as_of=None):
+        """
+        Fetch ledger data filtered by account or fund with formatted choice fields.
+        
+        The query returns fund and account ids only; FundChoice and
+        AccountChoice share the labels of fetch_choice_labels. Pass tran_id to fetch only that transaction's rows of the ledger, for
+        patching a displayed ledger without reloading it. date_from and
+        date_to limit the rows to an inclusive date range. as_of shows the
+        ledger as it stood at that time (see _live_rows). Rows from archived
+        years are included, read in date windows if the range reaches more
+        archives than can be attached at once.
+        """
+        import pandas as pd
+        filter_clause = " AND " + ledger_filter_clause(filter_type)
+        params = [filter_id]
+        if tran_id is not None:
+            filter_clause += " AND Transactions.Id = ?"
+            params.append(tran_id)
+        days = date_bounds(date_from, date_to)
+        
+        # Archived transactions can no longer change, so patching only reads the ledger file
+        windows = [days] if tran_id is not None else self._archive_windows(*days)
+        frames = []
+        for window in windows:
+            rows, query_params = self._live_rows("""
                 Split.Id AS SplitId,
                 Transactions.Id AS TransactionsId,
-                Transactions.UserDate,
-                Transactions.Description,
-                Fund.Id || ':' || Fund.Name AS FundChoice,
-                Account.Id || ':' || Account.Name AS AccountChoice,
-                Split.Amount
-            FROM Split
-            JOIN Transactions ON Split.Tran_id = Transactions.Id
-            LEFT JOIN Fund ON Split.FundId = Fund.Id
-            LEFT JOIN Account ON Split.AccountId = Account.Id
-            WHERE Transactions.Deleted = 0 AND {filter_clause}
-            ORDER BY Transactions.UserDate, Transactions.Id, Split.Id
-        """
-        return pd.read_sql_query(query, self.conn, params=[filter_id])
+                Transactions.UserDate AS UserDate,
+                Transactions.Description AS Description,
+                Split.FundId AS FundId,
+                Split.AccountId AS AccountId,
+                Split.Amount AS Amount
+            """, filter_clause, params, as_of, days=window, archives=tran_id is None)
+            query = f"{rows} ORDER BY UserDate, TransactionsId, SplitId"
+            frames.append(pd.read_sql_query(query, self.conn, params=query_params))
+        # Windows are consecutive date ranges, so their rows are already in order
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        return self._resolve_choices(df)
     
     def fetch_transaction_data(self, tran_id):
         """Fetch all splits for a specific transaction with formatted choice fields."""
+        import pandas as pd
         query = """
             SELECT
                 Split.Id AS SplitId,
                 Transactions.Id AS TransactionsId,
                 Transactions.UserDate,
                 Transactions.Description,
-                Fund.Id || ':' || Fund.Name AS FundChoice,
-                Account.Id || ':' || Account.Name AS AccountChoice,
+                Split.FundId,
+                Split.AccountId,
                 Split.Amount
             FROM Split
             JOIN Transactions ON Split.Tran_id = Transactions.Id
-            LEFT JOIN Fund ON Split.FundId = Fund.Id
-            LEFT JOIN Account ON Split.AccountId = Account.Id
             WHERE Transactions.Deleted = 0 AND Split.Tran_id = ?
             ORDER BY Transactions.UserDate, Transactions.Id, Split.Id
         """
-        return pd.read_sql_query(query, self.conn, params=[tran_id])
+        return self._resolve_choices(pd.read_sql_query(query, self.conn, params=[tran_id]))
+    
+    def fetch_transaction_date(self, tran_id):
+        """Return the UserDate of a live transaction, or None if there is no such transaction."""
+        row = self.conn.execute(
+            "SELECT UserDate FROM Transactions WHERE Id = ? AND Deleted = 0", (tran_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def fetch_transaction_version(self, tran_id, include_deleted=False):
+        """
+        Return a live transaction's row version, or None if there is no such transaction.
+        
+        Read it before the transaction's splits and pass it back as
+        expected_version when saving or deleting, so a change made by
+        someone else in the meantime is refused rather than overwritten.
+        With include_deleted a soft-deleted transaction's version is
+        returned too, for undoing a delete.
+        """
+        row = self.conn.execute(
+            "SELECT Version FROM Transactions WHERE Id = ? AND (? OR Deleted = 0)",
+            (tran_id, bool(include_deleted))
+        ).fetchone()
+        return row[0] if row else None
+    
+    # ========== AS-OF QUERIES ==========
+    
+    def _live_rows(self, select, where="", params=(), as_of=None, group="", days=(None, None),
+                   totals=False, archives=True):
+        """
+        Build a query over the live splits, now or as they stood at as_of.
+        
+        The splits are read as Split and Transactions, joined to Fund and
+        Account, so select, where and group are written as for the current
+        tables. where must start with " AND ". The date range is given as
+        days rather than in where, because it decides which archives the
+        query reads.
+        
+        Archived years reached by days are read from their archive files,
+        attached read-only for the query, with the same conditions; archives
+        outside days are left out. With totals the caller only sums
+        Split.Amount by fund and account columns, so archived years lying
+        wholly inside days are read from ArchiveTotal and their archives are
+        not opened at all.
+        
+        At as_of a transaction was live if it had been created and not yet
+        deleted. Transactions changed since as_of by an audited write are
+        instead rebuilt from the before image of their first later audit
+        entry (if that image had been created by then), which catches edits
+        made in place and deletions that were later undone. Everything else is read straight from the tables, so
+        an as-of query only does extra work for what has changed since.
+        Being archived is not a change: the archived rows are read as they
+        stood in the ledger file.
+        
+        Args:
+            select: SELECT column list
+            where: Extra WHERE conditions, without the date range
+            params: Parameters for where
+            as_of: None for the current state, or a timestamp (UTC) or date
+                in any format normalize_timestamp accepts
+            group: Optional GROUP BY expression, applied to each part
+            days: (first, last) UserDay range; either end None for open
+            totals: The caller only needs Split.Amount summed (see above)
+            archives: False to read the ledger file only
+        
+        Returns:
+            tuple: (SQL text, parameters); the SQL may be a UNION ALL of
+                several SELECTs, so ORDER BY must use the selected column names
+        
+        Raises:
+            ValueError: If as_of is not a valid timestamp, or more than
+                MAX_ATTACHED_ARCHIVES archives would have to be read
+        """
+        timestamp = None
+        if as_of is not None:
+            timestamp = normalize_timestamp(as_of)
+            if timestamp is None:
+                raise ValueError(f"Invalid timestamp: {as_of}")
+        range_clause, range_params = day_range_clause(*days)
+        params = list(params)
+        
+        read, total_years = [], []
+        for archive_info in self._archives_between(*days) if archives else []:
+            whole = ((days[0] is None or days[0] <= archive_info['from_day'])
+                     and (days[1] is None or archive_info['to_day'] <= days[1]))
+            # The totals are those at archiving, so only stand for later times
+            if totals and whole and (timestamp is None or archive_info['archived_at'] <= timestamp):
+                total_years.append(archive_info['year'])
+            else:
+                read.append(archive_info)
+        schemas = ["main"] + self._attach_archives(read)
+        
+        group_clause = f"GROUP BY {group}" if group else ""
+        joins = """
+            LEFT JOIN Fund ON Split.FundId = Fund.Id
+            LEFT JOIN Account ON Split.AccountId = Account.Id
+        """
+        arms = []
+        arm_params = []
+        if total_years:
+            arms.append(f"""
+                SELECT {select}
+                FROM ArchiveTotal AS Split
+                {joins}
+                WHERE Split.Year IN ({", ".join("?" * len(total_years))}){where}
+                {group_clause}
+            """)
+            arm_params += total_years + params
+        
+        if timestamp is None:
+            for schema in schemas:
+                arms.append(f"""
+                    SELECT {select}
+                    FROM {schema}.Split AS Split
+                    JOIN {schema}.Transactions AS Transactions ON Split.Tran_id = Transactions.Id
+                    {joins}
+                    WHERE Transactions.Deleted = 0{where}{range_clause}
+                    {group_clause}
+                """)
+                arm_params += params + range_params
+            return "UNION ALL".join(arms), arm_params
+        
+        # Each changed transaction's first audit entry after as_of; baseline
+        # entries record history from before the log and archive entries
+        # moves to an archive file, not changes
+        changed = """
+            SELECT Tran_id, Before FROM AuditLog AS Entry
+            WHERE Logged_at > ? AND Action NOT IN ('baseline', 'archive')
+              AND NOT EXISTS (
+                  SELECT 1 FROM AuditLog AS Earlier
+                  WHERE Earlier.Tran_id = Entry.Tran_id AND Earlier.Id < Entry.Id
+                    AND Earlier.Logged_at > ? AND Earlier.Action NOT IN ('baseline', 'archive')
+              )
+        """
+        for schema in schemas:
+            arms.append(f"""
+                SELECT {select}
+                FROM {schema}.Split AS Split
+                JOIN {schema}.Transactions AS Transactions ON Split.Tran_id = Transactions.Id
+                {joins}
+                WHERE COALESCE(Transactions.Created_at, '') <= ?
+                  AND (Transactions.Deleted = 0 OR Transactions.Deleted_at > ?)
+                  AND Transactions.Id NOT IN (
+                      SELECT Tran_id FROM AuditLog
+                      WHERE Logged_at > ? AND Action NOT IN ('baseline', 'archive')
+                  ){where}{range_clause}
+                {group_clause}
+            """)
+            arm_params += [timestamp] * 3 + params + range_params
+        arms.append(f"""
+            SELECT {select}
+            FROM (
+                SELECT
+                    json_extract(Image.value, '$.split_id') AS Id,
+                    Changed.Tran_id AS Tran_id,
+                    json_extract(Image.value, '$.amount') AS Amount,
+                    json_extract(Image.value, '$.fund_id') AS FundId,
+                    json_extract(Image.value, '$.account_id') AS AccountId
+                FROM ({changed}) AS Changed, json_each(Changed.Before, '$.splits') AS Image
+            ) AS Split
+            JOIN (
+                SELECT
+                    Tran_id AS Id,
+                    json_extract(Before, '$.user_date') AS UserDate,
+                    json_extract(Before, '$.description') AS Description,
+                    CAST(julianday(json_extract(Before, '$.user_date')) - 2440587.5 AS INTEGER) AS UserDay,
+                    json_extract(Before, '$.deleted') AS Deleted
+                FROM ({changed})
+                WHERE COALESCE(json_extract(Before, '$.created_at'), '') <= ?
+            ) AS Transactions ON Split.Tran_id = Transactions.Id
+            {joins}
+            WHERE Transactions.Deleted = 0{where}{range_clause}
+            {group_clause}
+        """)
+        arm_params += [timestamp] * 5 + params + range_params
+        return "UNION ALL".join(arms), arm_params
+    
+    # ========== STREAMING QUERIES ==========
+    
+    def iter_ledger_rows(self, filter_id, filter_type='account', date_from=None, date_to=None,
+                         as_of=None):
+        """
+        Stream ledger rows with a running balance without building a DataFrame.
+        
+        With date_from the balance starts from the total of everything
+        posted before that date, so it matches the full ledger. The balance
+        is rounded to 2 decimal places like the summary totals. as_of shows
+        the ledger as it stood at that time.
+        
+        Returns:
+            tuple: (column names, cursor yielding one tuple per split; a
+                generator if the range is read in several date windows)
+        """
+        filter_clause = " AND " + ledger_filter_clause(filter_type)
+        first_day, last_day = date_bounds(date_from, date_to)
+        
+        opening_balance = 0
+        if first_day is not None:
+            for window in self._archive_windows(None, first_day - 1):
+                before, params = self._live_rows("Split.Amount AS Amount", filter_clause, [filter_id], as_of,
+                                                 days=window, totals=True)
+                opening_balance += self.conn.execute(
+                    f"SELECT COALESCE(SUM(Amount), 0) FROM ({before})", params
+                ).fetchone()[0]
+        
+        windows = self._archive_windows(first_day, last_day)
+        columns, cursor = self._ledger_window(filter_clause, filter_id, windows[0], as_of, opening_balance)
+        if len(windows) == 1:
+            return columns, cursor
+        return columns, self._chain_ledger_windows(cursor, filter_clause, filter_id, windows[1:], as_of,
+                                                   opening_balance)
+    
+    def _ledger_window(self, filter_clause, filter_id, days, as_of, opening_balance):
+        """Run the running-balance ledger query over one range of days."""
+        rows, params = self._live_rows("""
+            Split.Id AS SplitId,
+            Transactions.Id AS TransactionsId,
+            Transactions.UserDate AS UserDate,
+            Transactions.Description AS Description,
+            Split.FundId AS FundId,
+            Split.AccountId AS AccountId,
+            Split.Amount AS Amount
+        """, filter_clause, [filter_id], as_of, days=days)
+        cursor = self.conn.execute(f"""
+            SELECT *, ROUND(? + SUM(Amount) OVER (
+                ORDER BY UserDate, TransactionsId, SplitId
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ), 2) AS Balance
+            FROM ({rows})
+            ORDER BY UserDate, TransactionsId, SplitId
+        """, [opening_balance] + params)
+        return [col[0] for col in cursor.description], cursor
+    
+    def _chain_ledger_windows(self, cursor, filter_clause, filter_id, windows, as_of, balance):
+        """Yield the first window's rows and then each later window's, carrying the balance across."""
+        for row in cursor:
+            balance = row[-1]
+            yield row
+        for days in windows:
+            _, cursor = self._ledger_window(filter_clause, filter_id, days, as_of, balance)
+            for row in cursor:
+                balance = row[-1]
+                yield row
+    
+    def iter_summary_rows(self, group_by='account', date_from=None, date_to=None, as_of=None):
+        """
+        Stream live split totals grouped by account, fund or account type.
+        
+        date_from and date_to limit the totals to an inclusive date range;
+        date_to alone gives balances as at that date. as_of gives the totals
+        as the books stood at that time, before any later entries or edits.
+        Archived years the range covers completely are taken from their
+        recorded totals.
+        
+        Returns:
+            tuple: (column names, cursor yielding one tuple per group; an
+                iterator if the range is read in several date windows)
+        """
+        select, group = summary_grouping(group_by)
+        days = date_bounds(date_from, date_to)
+        
+        if as_of is None and not self._archives_between(*days):
+            range_clause, range_params = day_range_clause(*days)
+            cursor = self.conn.execute(f"""
+                SELECT {select}, ROUND(SUM(Split.Amount), 2) AS TotalAmount
+                FROM Split
+                JOIN Transactions ON Split.Tran_id = Transactions.Id
+                LEFT JOIN Fund ON Split.FundId = Fund.Id
+                LEFT JOIN Account ON Split.AccountId = Account.Id
+                WHERE Transactions.Deleted = 0{range_clause}
+                GROUP BY {group}
+                ORDER BY {group}
+            """, range_params)
+            return [col[0] for col in cursor.description], cursor
+        
+        # Total each part of the query, then combine the part totals
+        columns = [column.split(" AS ")[1] for column in select.split(", ")]
+        outer = ", ".join([columns[0]] + [f"MAX({column}) AS {column}" for column in columns[1:]])
+        windows = self._archive_windows(*days)
+        groups = {}
+        for window in windows:
+            partials, params = self._live_rows(f"{select}, SUM(Split.Amount) AS Amount",
+                                               "", (), as_of, group, days=window, totals=True)
+            cursor = self.conn.execute(f"""
+                SELECT {outer}, ROUND(SUM(Amount), 2) AS TotalAmount
+                FROM ({partials})
+                GROUP BY {columns[0]}
+                ORDER BY {columns[0]}
+            """, params)
+            if len(windows) == 1:
+                return [col[0] for col in cursor.description], cursor
+            for row in cursor:
+                if row[0] in groups:
+                    groups[row[0]][-1] += row[-1]
+                else:
+                    groups[row[0]] = list(row)
+        # Same order as ORDER BY: NULL first
+        rows = (tuple(row[:-1]) + (round(row[-1], 2),)
+                for _, row in sorted(groups.items(), key=lambda item: (item[0] is not None, item[0])))
+        return columns + ['TotalAmount'], rows
     
     # ========== TRANSACTION UPDATES ==========
     
-    def save_transaction(self, tran_id, user_date, description, splits_data):
+    def save_transaction(self, tran_id, user_date, description, splits_data, expected_version=None):
         """
         Save a transaction and its splits to the database.
         
@@ -90,15 +672,22 @@ class DatabaseManager:
             user_date: Transaction date
             description: Transaction description
             splits_data: List of dicts with keys: amount, fund_id, account_id
+            expected_version: Version read with fetch_transaction_version;
+                None saves whatever is stored
             
         Returns:
             bool: True if successful, False otherwise
+        
+        Raises:
+            TransactionConflict: If the stored version is not expected_version
         """
         try:
             # Begin transaction
-            self.conn.execute("BEGIN")
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.fetch_transaction_images([tran_id])
             
             # Delete existing data for this transaction
+            self._claim_version(tran_id, expected_version)
             self._delete_transaction_data(tran_id)
             
             # Insert new transaction
@@ -107,10 +696,16 @@ class DatabaseManager:
             # Insert new splits
             self._insert_splits(new_tran_id, splits_data)
             
+            self._audit('delete', [tran_id], before)
+            self._audit('insert', [new_tran_id])
+            
             # Commit the transaction
             self.conn.commit()
             return True
             
+        except TransactionConflict:
+            self.conn.rollback()
+            raise
         except Exception as e:
             # Rollback on error
             self.conn.rollback()
@@ -118,6 +713,149 @@ class DatabaseManager:
                 print(f"Error saving transaction: {e}")
             return False
     
+    def update_transaction(self, tran_id, user_date, description, splits_data, expected_version=None):
+        """
+        Save an edited transaction in place, keeping its id and unchanged splits.
+        
+        The edited splits are compared with the stored ones: unchanged splits
+        are left alone, changed ones are updated, and only added or removed
+        splits are inserted or deleted. The transaction keeps its Id, so its
+        position in the (UserDate, Id) ordering only moves if its date changes.
+        A split whose amount or account changes loses its reconciled mark.
+        
+        With expected_version the save only goes ahead if nobody has changed
+        or deleted the transaction since that version was read. The check
+        and the write share one short write transaction, so nothing is
+        locked while the user is editing.
+        
+        Args:
+            tran_id: Transaction ID
+            user_date: Transaction date
+            description: Transaction description
+            splits_data: List of dicts with keys: amount, fund_id, account_id and
+                optionally split_id (missing or 0 for a new split)
+            expected_version: Version read with fetch_transaction_version;
+                None saves over whatever is stored
+            
+        Returns:
+            bool: True if successful, False otherwise
+        
+        Raises:
+            TransactionConflict: If the stored version is not expected_version
+        """
+        try:
+            user_date = self._posting_date(user_date)
+            self.conn.execute("BEGIN IMMEDIATE")
+            
+            self.cursor.execute("""
+                SELECT UserDate, Description FROM Transactions 
+                WHERE Id = ? AND Deleted = 0
+            """, (tran_id,))
+            header = self.cursor.fetchone()
+            if header is None and expected_version is None:
+                raise ValueError(f"Transaction {tran_id} not found or deleted")
+            before = self.fetch_transaction_images([tran_id])
+            
+            self._claim_version(tran_id, expected_version)
+            if header != (user_date, description):
+                self.cursor.execute("""
+                    UPDATE Transactions SET UserDate = ?, Description = ? WHERE Id = ?
+                """, (user_date, description, tran_id))
+            
+            self.cursor.execute("""
+                SELECT Id, Amount, FundId, AccountId FROM Split WHERE Tran_id = ?
+            """, (tran_id,))
+            stored = {row[0]: row[1:] for row in self.cursor.fetchall()}
+            
+            updates = []
+            inserts = []
+            kept_ids = set()
+            for split in splits_data:
+                split_id = split.get('split_id')
+                values = (split['amount'], split['fund_id'], split['account_id'])
+                if split_id in stored and split_id not in kept_ids:
+                    kept_ids.add(split_id)
+                    old_amount, old_fund_id, old_account_id = stored[split_id]
+                    if values != (old_amount, old_fund_id, old_account_id):
+                        keep_cleared = int(values[0] == old_amount and values[2] == old_account_id)
+                        updates.append(values + (keep_cleared, keep_cleared, split_id))
+                else:
+                    inserts.append((tran_id,) + values)
+            deletes = [(split_id,) for split_id in stored if split_id not in kept_ids]
+            
+            if updates:
+                self.cursor.executemany("""
+                    UPDATE Split 
+                    SET Amount = ?, FundId = ?, AccountId = ?,
+                        Cleared = CASE WHEN ? THEN Cleared ELSE 0 END,
+                        Cleared_at = CASE WHEN ? THEN Cleared_at END
+                    WHERE Id = ?
+                """, updates)
+            if inserts:
+                self.cursor.executemany("""
+                    INSERT INTO Split (Tran_id, Amount, FundId, AccountId) 
+                    VALUES (?, ?, ?, ?)
+                """, inserts)
+            if deletes:
+                self.cursor.executemany("DELETE FROM Split WHERE Id = ?", deletes)
+            
+            self._audit('update', [tran_id], before)
+            self.conn.commit()
+            if _DEBUG:
+                print(f"Saved transaction {tran_id} in place: {len(updates)} updated, "
+                      f"{len(inserts)} inserted, {len(deletes)} deleted")
+            return True
+            
+        except TransactionConflict:
+            self.conn.rollback()
+            raise
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error updating transaction {tran_id}: {e}")
+            return False
+    
+    def _iso_date(self, user_date):
+        """Return user_date in the stored ISO form, raising ValueError if it is invalid."""
+        iso_date = normalize_date(user_date)
+        if iso_date is None:
+            raise ValueError(f"Invalid date: {user_date}")
+        return iso_date
+    
+    def _posting_date(self, user_date):
+        """Return a transaction date in ISO form, raising ValueError if it is invalid or archived."""
+        iso_date = self._iso_date(user_date)
+        # The cached list: this runs for every row of a bulk post
+        archives = self._archives if self._archives is not None else self.fetch_archives()
+        if archives and iso_date <= archives[-1]['date_to']:
+            raise ValueError(f"{iso_date} is in a closed year that has been archived")
+        return iso_date
+    
+    def _claim_version(self, tran_id, expected_version=None, include_deleted=False):
+        """
+        Move a live transaction on to its next version inside the caller's write transaction.
+        
+        Compare-and-set: the version only moves if it is still
+        expected_version (any version if None), otherwise the stored
+        transaction is reported in a TransactionConflict. include_deleted
+        also claims a soft-deleted transaction, for putting one back.
+        
+        Returns:
+            bool: True if the version moved on, False if the transaction
+                does not exist or is deleted and expected_version is None
+        """
+        self.cursor.execute("""
+            UPDATE Transactions SET Version = Version + 1
+            WHERE Id = ? AND (? OR Deleted = 0) AND (? IS NULL OR Version = ?)
+        """, (tran_id, bool(include_deleted), expected_version, expected_version))
+        if self.cursor.rowcount:
+            return True
+        if expected_version is None:
+            return False
+        row = self.conn.execute("SELECT Version FROM Transactions WHERE Id = ?", (tran_id,)).fetchone()
+        raise TransactionConflict(tran_id, expected_version, row[0] if row else None,
+                                  self.fetch_transaction_image(tran_id))
+    
     def _delete_transaction_data(self, tran_id):
         """Mark transaction as deleted with soft deletion (leaves splits intact)."""
         self.cursor.execute("""
@@ -131,7 +869,7 @@ class DatabaseManager:
         self.cursor.execute("""
             INSERT INTO Transactions (UserDate, Description, Created_at, Deleted) 
             VALUES (?, ?, CURRENT_TIMESTAMP, 0)
-        """, (user_date, description))
+        """, (self._posting_date(user_date), description))
         return self.cursor.lastrowid
     
     def _insert_splits(self, tran_id, splits_data):
@@ -142,33 +880,40 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?)
             """, (tran_id, split['amount'], split['fund_id'], split['account_id']))
     
-    def soft_delete_transaction(self, tran_id):
+    def soft_delete_transaction(self, tran_id, expected_version=None):
         """
         Soft delete a transaction by setting Deleted = 1.
         Does not modify the Split table.
         
         Args:
             tran_id: Transaction ID to delete
+            expected_version: Version read with fetch_transaction_version;
+                None deletes whatever is stored
             
         Returns:
             bool: True if successful, False otherwise
+        
+        Raises:
+            TransactionConflict: If the stored version is not expected_version
         """
         try:
-            # Update the transaction to mark it as deleted
-            self.cursor.execute("""
-                UPDATE Transactions 
-                SET Deleted = 1, Deleted_at = CURRENT_TIMESTAMP 
-                WHERE Id = ? AND Deleted = 0
-            """, (tran_id,))
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.fetch_transaction_images([tran_id])
             
-            # Check if a row was actually updated
-            if self.cursor.rowcount > 0:
+            # Check if the transaction is there to delete
+            if self._claim_version(tran_id, expected_version):
+                self._delete_transaction_data(tran_id)
+                self._audit('delete', [tran_id], before)
                 self.conn.commit()
                 return True
             else:
                 # Transaction was not found or already deleted
+                self.conn.rollback()
                 return False
                 
+        except TransactionConflict:
+            self.conn.rollback()
+            raise
         except Exception as e:
             self.conn.rollback()
             if _DEBUG:
@@ -186,7 +931,7 @@ class DatabaseManager:
             splits_data: List of dicts with keys: amount, fund_id, account_id
             
         Returns:
-            bool: True if successful, False otherwise
+            int: New transaction ID if successful, False otherwise
         """
         try:
             # Begin transaction
@@ -198,9 +943,11 @@ class DatabaseManager:
             # Insert new splits
             self._insert_splits(new_tran_id, splits_data)
             
+            self._audit('insert', [new_tran_id])
+            
             # Commit the transaction
             self.conn.commit()
-            return True
+            return new_tran_id
             
         except Exception as e:
             # Rollback on error
@@ -209,6 +956,968 @@ class DatabaseManager:
                 print(f"Error adding new transaction: {e}")
             return False
     
+    def repair_transactions(self, delete_tran_ids=(), no_fund_split_ids=(), no_account_split_ids=(),
+                            orphan_split_ids=()):
+        """
+        Apply automatic integrity repairs in one audited database transaction.
+        
+        Args:
+            delete_tran_ids: Transactions to soft delete
+            no_fund_split_ids: Splits to move to fund 0 ('No Fund')
+            no_account_split_ids: Splits to move to account 0 ('No Account')
+            orphan_split_ids: Splits with no transaction, to delete
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        moved = [(0, 'FundId', split_id) for split_id in no_fund_split_ids]
+        moved += [(0, 'AccountId', split_id) for split_id in no_account_split_ids]
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            
+            tran_ids = set(delete_tran_ids)
+            for _, _, split_id in moved:
+                row = self.cursor.execute("SELECT Tran_id FROM Split WHERE Id = ?", (split_id,)).fetchone()
+                if row:
+                    tran_ids.add(row[0])
+            tran_ids = sorted(tran_ids)
+            before = self.fetch_transaction_images(tran_ids)
+            
+            delete_tran_ids = set(delete_tran_ids)
+            for tran_id in tran_ids:
+                # Already deleted transactions are not deleted again
+                if self._claim_version(tran_id) and tran_id in delete_tran_ids:
+                    self._delete_transaction_data(tran_id)
+            for value, column, split_id in moved:
+                self.cursor.execute(f"UPDATE Split SET {column} = ? WHERE Id = ?", (value, split_id))
+            self.cursor.executemany("""
+                DELETE FROM Split 
+                WHERE Id = ? AND Tran_id NOT IN (SELECT Id FROM Transactions)
+            """, [(split_id,) for split_id in orphan_split_ids])
+            
+            self._audit('repair', tran_ids, before)
+            self.conn.commit()
+            return True
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error repairing transactions: {e}")
+            return False
+    
+    # ========== TRANSACTION IMAGES ==========
+    
+    def fetch_transaction_image(self, tran_id):
+        """
+        Capture a transaction's stored state so it can be put back later.
+        
+        Returns:
+            dict: Keys tran_id, user_date, description, deleted, created_at,
+                deleted_at and splits (a list of dicts with keys split_id,
+                amount, fund_id, account_id, cleared, cleared_at), or None if
+                the transaction does not exist
+        """
+        return self.fetch_transaction_images([tran_id]).get(tran_id)
+    
+    def fetch_transaction_images(self, tran_ids):
+        """
+        Capture several transactions at once.
+        
+        Returns:
+            dict: {tran_id: image} for the ids that exist
+        """
+        return {image['tran_id']: image for image in audit.read_transaction_images(self.conn, tran_ids)}
+    
+    def _audit(self, action, tran_ids, before=None):
+        """
+        Append audit log entries for transactions just written.
+        
+        Must be called inside the write's database transaction, after the
+        write, so the entries commit or roll back with it.
+        
+        Args:
+            action: Short name of the write, e.g. 'insert' or 'update'
+            tran_ids: Transactions the write touched
+            before: {tran_id: image} captured before the write; missing
+                ids are logged as new. Transactions the write left unchanged
+                are not logged.
+        """
+        before = before or {}
+        after = self.fetch_transaction_images(tran_ids)
+        audit.append_entries(self.conn, [
+            (action, tran_id, before.get(tran_id), after.get(tran_id)) for tran_id in tran_ids
+            if before.get(tran_id) != after.get(tran_id)
+        ])
+    
+    def apply_transaction_image(self, image, expected_version=None):
+        """
+        Put a transaction back exactly as captured by fetch_transaction_image.
+        
+        Splits keep their original ids: splits not in the image are removed,
+        and splits missing from the table are re-inserted with their old id.
+        
+        Args:
+            image: Image from fetch_transaction_image
+            expected_version: Version the caller last saw, deleted or not
+                (fetch_transaction_version with include_deleted); None
+                overwrites whatever is stored
+            
+        Returns:
+            bool: True if successful, False otherwise
+        
+        Raises:
+            TransactionConflict: If the stored version is not expected_version
+        """
+        return self.apply_transaction_images([image], create=False,
+                                             expected_versions={image['tran_id']: expected_version})
+    
+    def apply_transaction_images(self, images, create=True, expected_versions=None):
+        """
+        Apply several transaction images in a single commit.
+        
+        Used to copy transactions from another ledger file, so with create
+        True a transaction missing from this file is inserted with the
+        image's id.
+        
+        Args:
+            images: Images from fetch_transaction_image
+            create: Insert transactions missing from this file
+            expected_versions: {tran_id: version} to check before
+                overwriting; transactions not in it are overwritten
+                whatever their version
+            
+        Returns:
+            bool: True if every image was applied, False if none were
+        
+        Raises:
+            TransactionConflict: If a stored version is not the expected one
+        """
+        expected_versions = expected_versions or {}
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            tran_ids = [image['tran_id'] for image in images]
+            before = self.fetch_transaction_images(tran_ids)
+            for image in images:
+                self._apply_image(image, create, expected_versions.get(image['tran_id']))
+            self._audit('restore', tran_ids, before)
+            self.conn.commit()
+            return True
+            
+        except TransactionConflict:
+            self.conn.rollback()
+            raise
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error applying transaction images: {e}")
+            return False
+    
+    def _apply_image(self, image, create, expected_version=None):
+        """
+        Write one transaction image inside the caller's database transaction.
+        
+        Splits are matched within the transaction. An image copied from
+        another ledger file may carry a split id that a different transaction
+        holds in this file; that split is inserted under a new id rather than
+        taken from its owner. The version is claimed as for a save, so
+        expected_version guards against overwriting someone else's change.
+        """
+        tran_id = image['tran_id']
+        if create:
+            self.cursor.execute("""
+                INSERT OR IGNORE INTO Transactions (Id, UserDate, Description, Created_at, Deleted)
+                VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), 0)
+            """, (tran_id, image['user_date'], image['description'], image.get('created_at')))
+        
+        if not self._claim_version(tran_id, expected_version, include_deleted=True):
+            raise ValueError(f"Transaction {tran_id} not found")
+        self.cursor.execute("""
+            UPDATE Transactions 
+            SET UserDate = ?, Description = ?, Deleted = ?,
+                Deleted_at = CASE 
+                    WHEN ? = 0 THEN NULL 
+                    WHEN Deleted = 1 THEN Deleted_at 
+                    ELSE CURRENT_TIMESTAMP 
+                END
+            WHERE Id = ?
+        """, (image['user_date'], image['description'], int(image['deleted']),
+              int(image['deleted']), tran_id))
+        
+        split_ids = [split['split_id'] for split in image['splits']]
+        placeholders = ", ".join("?" * len(split_ids)) or "NULL"
+        self.cursor.execute(f"""
+            DELETE FROM Split WHERE Tran_id = ? AND Id NOT IN ({placeholders})
+        """, [tran_id] + split_ids)
+        
+        # A NULL id takes the next free one; only this transaction's own
+        # splits can then conflict, and they are updated in place
+        self.cursor.executemany("""
+            INSERT INTO Split (Id, Tran_id, Amount, FundId, AccountId, Cleared, Cleared_at)
+            VALUES (
+                CASE WHEN EXISTS (SELECT 1 FROM Split WHERE Id = ?1 AND Tran_id != ?2) THEN NULL ELSE ?1 END,
+                ?2, ?3, ?4, ?5, ?6, ?7
+            )
+            ON CONFLICT(Id) DO UPDATE SET
+                Amount = excluded.Amount, FundId = excluded.FundId,
+                AccountId = excluded.AccountId, Cleared = excluded.Cleared,
+                Cleared_at = excluded.Cleared_at
+        """, [
+            (split['split_id'], tran_id, split['amount'], split['fund_id'],
+             split['account_id'], split['cleared'], split['cleared_at'])
+            for split in image['splits']
+        ])
+    
+    def validate_transaction(self, user_date, description, splits_data):
+        """
+        Check that a transaction is fit to be posted.
+        
+        Args:
+            user_date: Transaction date
+            description: Transaction description
+            splits_data: List of dicts with keys: amount, fund_id, account_id
+            
+        Returns:
+            str: Description of the first problem found, or None if valid
+        """
+        if not user_date:
+            return "Transaction has no date"
+        iso_date = normalize_date(user_date)
+        if iso_date is None:
+            return f"Invalid date: {user_date}"
+        archives = self.fetch_archives()
+        if archives and iso_date <= archives[-1]['date_to']:
+            return f"{iso_date} is in a closed year that has been archived"
+        if description and len(description) > 100:
+            return "Description is longer than 100 characters"
+        if len(splits_data) < 2:
+            return "Transaction must have at least two splits"
+        
+        total_amount = 0.0
+        for split in splits_data:
+            try:
+                total_amount += float(split['amount'])
+            except (KeyError, ValueError, TypeError):
+                return f"Invalid split amount: {split.get('amount')}"
+        
+        # Same tolerance as the balance check in the editing UI
+        if abs(total_amount) >= 0.01:
+            return f"Splits sum to {total_amount:.2f}, not zero"
+        return None
+    
+    def add_transactions_bulk(self, transactions):
+        """
+        Add many transactions and their splits in a single database transaction.
+        
+        Every transaction is validated before anything is written; if any one
+        is invalid nothing is posted. Ids are allocated up front while the
+        write lock is held so Transactions and Split can each be written
+        with a single executemany.
+        
+        Args:
+            transactions: List of dicts with keys: user_date, description, splits
+                (splits as for add_new_transaction)
+            
+        Returns:
+            list: New transaction ids in input order if successful, None otherwise
+        """
+        for index, tran in enumerate(transactions):
+            error = self.validate_transaction(
+                tran['user_date'], tran['description'], tran['splits']
+            )
+            if error:
+                if _DEBUG:
+                    print(f"Bulk transaction {index} rejected: {error}")
+                return None
+        
+        if not transactions:
+            return []
+        
+        try:
+            # Take the write lock before reading the next free id
+            self.conn.execute("BEGIN IMMEDIATE")
+            new_tran_ids = self._write_transactions(transactions)
+            self._audit('insert', new_tran_ids)
+            self.conn.commit()
+            return new_tran_ids
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error adding transactions in bulk: {e}")
+            return None
+    
+    def _write_transactions(self, transactions):
+        """
+        Insert validated transactions with one executemany per table.
+        
+        The caller must hold the write lock (BEGIN IMMEDIATE) so the ids
+        allocated here cannot be taken by another connection.
+        
+        Returns:
+            list: New transaction ids in input order
+        """
+        first_id = self._next_transaction_id()
+        new_tran_ids = list(range(first_id, first_id + len(transactions)))
+        
+        self.cursor.executemany("""
+            INSERT INTO Transactions (Id, UserDate, Description, Created_at, Deleted) 
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, 0)
+        """, [
+            (tran_id, self._posting_date(tran['user_date']), tran['description'])
+            for tran_id, tran in zip(new_tran_ids, transactions)
+        ])
+        
+        self.cursor.executemany("""
+            INSERT INTO Split (Tran_id, Amount, FundId, AccountId) 
+            VALUES (?, ?, ?, ?)
+        """, [
+            (tran_id, split['amount'], split['fund_id'], split['account_id'])
+            for tran_id, tran in zip(new_tran_ids, transactions)
+            for split in tran['splits']
+        ])
+        return new_tran_ids
+    
+    def _next_transaction_id(self):
+        """Return the id AUTOINCREMENT would hand to the next Transactions row."""
+        self.cursor.execute("""
+            SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'Transactions'), 0),
+                COALESCE((SELECT MAX(Id) FROM Transactions), 0)
+            )
+        """)
+        return self.cursor.fetchone()[0] + 1
+    
+    # ========== RE-CATEGORIZATION ==========
+    
+    def _recategorize_clause(self, account_id, fund_id, date_from, date_to, description,
+                             to_account_id, to_fund_id):
+        """
+        Build the WHERE clause selecting the live splits a re-categorization would change.
+        
+        Splits already on the target account and fund are left out.
+        
+        Returns:
+            tuple: (clause over Split and Transactions, parameters)
+        
+        Raises:
+            ValueError: If there is no filter or no target, or a target does not exist
+        """
+        if to_account_id is None and to_fund_id is None:
+            raise ValueError("Give a new account, a new fund or both")
+        for table, target_id in (("Account", to_account_id), ("Fund", to_fund_id)):
+            if target_id is not None and not self.conn.execute(
+                f"SELECT 1 FROM {table} WHERE Id = ?", (target_id,)
+            ).fetchone():
+                raise ValueError(f"{table} {target_id} does not exist")
+        
+        clause = ""
+        params = []
+        if account_id is not None:
+            clause += " AND Split.AccountId = ?"
+            params.append(account_id)
+        if fund_id is not None:
+            clause += " AND Split.FundId = ?"
+            params.append(fund_id)
+        if description:
+            escaped = description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clause += " AND Transactions.Description LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+        range_clause, range_params = date_range_clause(date_from, date_to)
+        if not clause and not range_clause:
+            raise ValueError("Give an account, fund, date range or description to select splits")
+        
+        clause = f"""
+            Transactions.Deleted = 0{clause}{range_clause}
+            AND (Split.AccountId IS NOT COALESCE(?, Split.AccountId)
+                 OR Split.FundId IS NOT COALESCE(?, Split.FundId))
+        """
+        return clause, params + range_params + [to_account_id, to_fund_id]
+    
+    def preview_recategorization(self, account_id=None, fund_id=None, date_from=None, date_to=None,
+                                 description=None, to_account_id=None, to_fund_id=None):
+        """
+        Count and total the splits recategorize_splits would move, without changing anything.
+        
+        Args:
+            account_id: Only splits on this account
+            fund_id: Only splits in this fund
+            date_from: Only transactions on or after this date
+            date_to: Only transactions on or before this date
+            description: Only transactions whose description contains this text
+                (case-insensitive for ASCII letters)
+            to_account_id: Account to move the splits to, or None to keep it
+            to_fund_id: Fund to move the splits to, or None to keep it
+        
+        Returns:
+            dict: Keys splits, transactions, total and groups (a list of dicts
+                with keys fund_id, account_id, splits and total for each
+                current fund and account the splits will move from)
+        
+        Raises:
+            ValueError: As for recategorize_splits
+        """
+        where, params = self._recategorize_clause(account_id, fund_id, date_from, date_to,
+                                                  description, to_account_id, to_fund_id)
+        from_clause = f"FROM Split JOIN Transactions ON Split.Tran_id = Transactions.Id WHERE {where}"
+        splits, transactions, total = self.conn.execute(f"""
+            SELECT COUNT(*), COUNT(DISTINCT Split.Tran_id), ROUND(COALESCE(SUM(Split.Amount), 0), 2)
+            {from_clause}
+        """, params).fetchone()
+        groups = [
+            {'fund_id': row[0], 'account_id': row[1], 'splits': row[2], 'total': row[3]}
+            for row in self.conn.execute(f"""
+                SELECT Split.FundId, Split.AccountId, COUNT(*), ROUND(SUM(Split.Amount), 2)
+                {from_clause}
+                GROUP BY Split.FundId, Split.AccountId
+                ORDER BY Split.FundId, Split.AccountId
+            """, params)
+        ]
+        return {'splits': splits, 'transactions': transactions, 'total': total, 'groups': groups}
+    
+    def recategorize_splits(self, account_id=None, fund_id=None, date_from=None, date_to=None,
+                            description=None, to_account_id=None, to_fund_id=None):
+        """
+        Move every matching live split to a new account and/or fund in a single commit.
+        
+        The filter and target are as for preview_recategorization. The
+        matching splits are changed by one UPDATE; each affected transaction
+        gets an audit entry, written in chunks so memory stays flat however
+        many transactions move. As in update_transaction, a split moved to
+        a different account loses its reconciled mark, and each affected
+        transaction moves on to its next version.
+        
+        Returns:
+            int: Number of splits changed, or None if the change failed
+        
+        Raises:
+            ValueError: If there is no filter or no target, or a target does not exist
+        """
+        where, params = self._recategorize_clause(account_id, fund_id, date_from, date_to,
+                                                  description, to_account_id, to_fund_id)
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # The splits' old values, for the audit log's before images
+            self.cursor.execute(f"""
+                CREATE TEMP TABLE RecategorizedSplit AS
+                SELECT Split.Id, Split.Tran_id, Split.FundId, Split.AccountId, Split.Cleared, Split.Cleared_at
+                FROM Split JOIN Transactions ON Split.Tran_id = Transactions.Id
+                WHERE {where}
+            """, params)
+            self.cursor.execute("CREATE INDEX temp.idx_recategorizedsplit_tran_id ON RecategorizedSplit(Tran_id)")
+            
+            self.cursor.execute("""
+                UPDATE Split
+                SET AccountId = COALESCE(?, AccountId),
+                    FundId = COALESCE(?, FundId),
+                    Cleared = CASE WHEN AccountId IS COALESCE(?, AccountId) THEN Cleared ELSE 0 END,
+                    Cleared_at = CASE WHEN AccountId IS COALESCE(?, AccountId) THEN Cleared_at END
+                WHERE Id IN (SELECT Id FROM RecategorizedSplit)
+            """, (to_account_id, to_fund_id, to_account_id, to_account_id))
+            changed = self.cursor.rowcount
+            self.cursor.execute("""
+                UPDATE Transactions SET Version = Version + 1
+                WHERE Id IN (SELECT Tran_id FROM RecategorizedSplit)
+            """)
+            
+            tran_ids = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT Tran_id FROM RecategorizedSplit ORDER BY Tran_id"
+            )]
+            for start in range(0, len(tran_ids), RECATEGORIZE_AUDIT_CHUNK):
+                chunk = tran_ids[start:start + RECATEGORIZE_AUDIT_CHUNK]
+                old = {row[0]: row[1:] for row in self.conn.execute("""
+                    SELECT Id, FundId, AccountId, Cleared, Cleared_at FROM RecategorizedSplit
+                    WHERE Tran_id BETWEEN ? AND ?
+                """, (chunk[0], chunk[-1]))}
+                entries = []
+                for after in audit.read_transaction_images(self.conn, chunk):
+                    before = dict(after, splits=[
+                        dict(split, fund_id=old[split['split_id']][0], account_id=old[split['split_id']][1],
+                             cleared=old[split['split_id']][2], cleared_at=old[split['split_id']][3])
+                        if split['split_id'] in old else split
+                        for split in after['splits']
+                    ])
+                    entries.append(('recategorize', after['tran_id'], before, after))
+                audit.append_entries(self.conn, entries)
+            
+            self.cursor.execute("DROP TABLE RecategorizedSplit")
+            self.conn.commit()
+            if _DEBUG:
+                print(f"Re-categorized {changed} splits in {len(tran_ids)} transactions")
+            return changed
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error re-categorizing splits: {e}")
+            return None
+    
+    # ========== RECURRING TEMPLATES ==========
+    
+    def add_recurring_template(self, description, frequency, start_date, splits_data,
+                               interval=1, end_date=None):
+        """
+        Add a recurring transaction template and its splits.
+        
+        Args:
+            description: Description given to each posted transaction
+            frequency: 'weekly', 'monthly', 'quarterly' or 'yearly'
+            start_date: Date of the first occurrence
+            splits_data: List of dicts with keys: amount, fund_id, account_id
+            interval: Periods between occurrences, e.g. 2 for fortnightly
+            end_date: Optional last date an occurrence may fall on
+            
+        Returns:
+            int: New template ID if successful, False otherwise
+            
+        Raises:
+            ValueError: If the template would not make a valid transaction
+        """
+        if frequency not in ('weekly', 'monthly', 'quarterly', 'yearly'):
+            raise ValueError("frequency must be 'weekly', 'monthly', 'quarterly' or 'yearly'")
+        if int(interval) < 1:
+            raise ValueError("interval must be at least 1")
+        error = self.validate_transaction(start_date, description, splits_data)
+        if error:
+            raise ValueError(error)
+        end_date = self._iso_date(end_date) if end_date else None
+        
+        try:
+            self.conn.execute("BEGIN")
+            self.cursor.execute("""
+                INSERT INTO RecurringTemplate (Description, Frequency, Interval, StartDate, EndDate)
+                VALUES (?, ?, ?, ?, ?)
+            """, (description, frequency, int(interval), self._iso_date(start_date), end_date))
+            template_id = self.cursor.lastrowid
+            self.cursor.executemany("""
+                INSERT INTO RecurringSplit (TemplateId, Amount, FundId, AccountId)
+                VALUES (?, ?, ?, ?)
+            """, [
+                (template_id, split['amount'], split['fund_id'], split['account_id'])
+                for split in splits_data
+            ])
+            self.conn.commit()
+            return template_id
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error adding recurring template: {e}")
+            return False
+    
+    def fetch_recurring_templates(self, active_only=False):
+        """
+        Fetch recurring templates with their splits and last posted occurrence.
+        
+        Returns:
+            list: Dicts with keys template_id, description, frequency,
+                interval, start_date, end_date, active, last_posted (ISO date
+                or None) and splits (as for add_new_transaction), ordered by id
+        """
+        templates = {}
+        for row in self.conn.execute(f"""
+            SELECT
+                RecurringTemplate.Id, Description, Frequency, Interval, StartDate, EndDate, Active,
+                (SELECT MAX(OccurrenceDate) FROM RecurringPosting
+                 WHERE RecurringPosting.TemplateId = RecurringTemplate.Id)
+            FROM RecurringTemplate
+            {"WHERE Active = 1" if active_only else ""}
+            ORDER BY RecurringTemplate.Id
+        """):
+            templates[row[0]] = {
+                'template_id': row[0],
+                'description': row[1],
+                'frequency': row[2],
+                'interval': row[3],
+                'start_date': row[4],
+                'end_date': row[5],
+                'active': bool(row[6]),
+                'last_posted': row[7],
+                'splits': []
+            }
+        for template_id, amount, fund_id, account_id in self.conn.execute("""
+            SELECT TemplateId, Amount, FundId, AccountId FROM RecurringSplit ORDER BY Id
+        """):
+            if template_id in templates:
+                templates[template_id]['splits'].append(
+                    {'amount': amount, 'fund_id': fund_id, 'account_id': account_id}
+                )
+        return list(templates.values())
+    
+    def set_recurring_template_active(self, template_id, active=True):
+        """
+        Pause or resume a recurring template.
+        
+        Occurrences that fall due while a template is paused are still
+        posted when it is resumed; end it with end_date to stop them.
+        
+        Returns:
+            bool: True if the template exists, False otherwise
+        """
+        try:
+            self.conn.execute("BEGIN")
+            self.cursor.execute("UPDATE RecurringTemplate SET Active = ? WHERE Id = ?",
+                                (int(active), template_id))
+            updated = self.cursor.rowcount > 0
+            self.conn.commit()
+            return updated
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error updating recurring template {template_id}: {e}")
+            return False
+    
+    def post_recurring(self, occurrences):
+        """
+        Post recurring occurrences and record them in a single database transaction.
+        
+        Each occurrence is validated on its own: one that cannot be posted
+        (for example because its date is in an archived year) is skipped
+        and the rest are still posted. Occurrences already in
+        RecurringPosting are dropped after the write lock is taken, so two
+        connections catching up at the same time cannot post the same
+        occurrence twice.
+        
+        Args:
+            occurrences: List of dicts with keys template_id, occurrence_date
+                (ISO) and user_date, description and splits as for
+                add_transactions_bulk (see recurring.due_occurrences)
+            
+        Returns:
+            dict: Keys posted (the occurrences actually posted, each with
+                tran_id added) and skipped (the invalid ones, each with error
+                added), or None if the write failed
+        """
+        valid, skipped = [], []
+        for occurrence in occurrences:
+            error = self.validate_transaction(
+                occurrence['user_date'], occurrence['description'], occurrence['splits']
+            )
+            if error:
+                if _DEBUG:
+                    print(f"Recurring template {occurrence['template_id']} "
+                          f"on {occurrence['occurrence_date']} skipped: {error}")
+                skipped.append(dict(occurrence, error=error))
+            else:
+                valid.append(occurrence)
+        
+        if not valid:
+            return {'posted': [], 'skipped': skipped}
+        
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            posted = set(self.conn.execute("SELECT TemplateId, OccurrenceDate FROM RecurringPosting"))
+            pending = [
+                dict(occurrence) for occurrence in valid
+                if (occurrence['template_id'], occurrence['occurrence_date']) not in posted
+            ]
+            if not pending:
+                self.conn.rollback()
+                return {'posted': [], 'skipped': skipped}
+            
+            new_tran_ids = self._write_transactions(pending)
+            for occurrence, tran_id in zip(pending, new_tran_ids):
+                occurrence['tran_id'] = tran_id
+            self.cursor.executemany("""
+                INSERT INTO RecurringPosting (TemplateId, OccurrenceDate, Tran_id)
+                VALUES (?, ?, ?)
+            """, [
+                (occurrence['template_id'], occurrence['occurrence_date'], occurrence['tran_id'])
+                for occurrence in pending
+            ])
+            
+            self._audit('recurring', new_tran_ids)
+            self.conn.commit()
+            return {'posted': pending, 'skipped': skipped}
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error posting recurring transactions: {e}")
+            return None
+    
+    # ========== ARCHIVES ==========
+    
+    def fetch_archives(self):
+        """
+        List the archived years, oldest first.
+        
+        The list is cached and read again only when another connection has
+        committed since (PRAGMA data_version), or after archive_transactions.
+        
+        Returns:
+            list: Dicts with keys year, file_name, path, date_from, date_to,
+                from_day, to_day, transactions, splits, sha256 and archived_at
+        """
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._archives is not None and data_version == self._archives_version:
+            return self._archives
+        folder = os.path.dirname(os.path.abspath(self.db_path))
+        try:
+            rows = self.conn.execute("""
+                SELECT Year, FileName, DateFrom, DateTo, Transactions, Splits, Sha256, Archived_at
+                FROM Archive
+                ORDER BY DateFrom
+            """).fetchall()
+        except sqlite3.OperationalError:
+            # An older file opened read-only, so never migrated or archived
+            rows = []
+        self._archives = [{
+            'year': year,
+            'file_name': file_name,
+            'path': os.path.join(folder, file_name),
+            'date_from': date_from,
+            'date_to': date_to,
+            'from_day': day_number(date_from),
+            'to_day': day_number(date_to),
+            'transactions': transactions,
+            'splits': splits,
+            'sha256': sha256,
+            'archived_at': archived_at
+        } for year, file_name, date_from, date_to, transactions, splits, sha256, archived_at in rows]
+        self._archives_version = data_version
+        return self._archives
+    
+    def _archives_between(self, first_day, last_day):
+        """Return the archives holding any day from first_day to last_day (None for open)."""
+        return [
+            archive_info for archive_info in self.fetch_archives()
+            if (first_day is None or archive_info['to_day'] >= first_day)
+            and (last_day is None or archive_info['from_day'] <= last_day)
+        ]
+    
+    def _archive_windows(self, first_day, last_day):
+        """
+        Split a range of days into consecutive windows that each reach at most MAX_ATTACHED_ARCHIVES archives.
+        
+        Returns:
+            list: (first, last) UserDay ranges in date order; just the
+                range itself unless it reaches more archives than that
+        """
+        reached = self._archives_between(first_day, last_day)
+        windows = []
+        start = first_day
+        for index in range(MAX_ATTACHED_ARCHIVES, len(reached), MAX_ATTACHED_ARCHIVES):
+            boundary = reached[index]['from_day']
+            windows.append((start, boundary - 1))
+            start = boundary
+        windows.append((start, last_day))
+        return windows
+    
+    def _attach_archives(self, archives):
+        """
+        Attach archive files read-only for a query, detaching others if needed to make room.
+        
+        Archives stay attached between queries until the room is needed.
+        
+        Returns:
+            list: Schema names of the archives, in the order given
+        
+        Raises:
+            ValueError: If there are too many archives or a file is missing
+        """
+        if len(archives) > MAX_ATTACHED_ARCHIVES:
+            raise ValueError(f"A query can read at most {MAX_ATTACHED_ARCHIVES} archived years at once")
+        wanted = {archive_info['year'] for archive_info in archives}
+        missing = len(wanted - set(self._attached_archives))
+        for year in [year for year in self._attached_archives if year not in wanted]:
+            if len(self._attached_archives) + missing <= MAX_ATTACHED_ARCHIVES:
+                break
+            self.conn.execute(f"DETACH DATABASE {self._attached_archives.pop(year)}")
+        
+        schemas = []
+        for archive_info in archives:
+            year = archive_info['year']
+            if year not in self._attached_archives:
+                if not os.path.exists(archive_info['path']):
+                    raise ValueError(f"Archive for {year} not found: {archive_info['path']}")
+                # Year is an INTEGER column, so the schema name is always a safe identifier
+                schema = f"archive_{int(year)}"
+                uri = f"file:{pathname2url(archive_info['path'])}?mode=ro"
+                self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+                self._attached_archives[year] = schema
+                if _DEBUG:
+                    print(f"Attached {archive_info['path']} as {schema}")
+            schemas.append(self._attached_archives[year])
+        return schemas
+    
+    def archive_transactions(self, year, date_from, date_to, file_name):
+        """
+        Move every transaction dated from date_from to date_to into a new archive file.
+        
+        Called by archive.archive_year. It all happens under one write lock:
+        the archive file is written from the ledger as it stands, the year is
+        recorded in Archive with its live totals per fund and account in
+        ArchiveTotal, each moved transaction gets an 'archive' audit entry,
+        and the rows are deleted from the ledger file. If anything fails the
+        ledger is left as it was and the new file is removed. The ledger file
+        only shrinks once it is vacuumed.
+        
+        Args:
+            year: Year the archive is recorded under
+            date_from: First date to archive
+            date_to: Last date to archive
+            file_name: Archive file name, in the ledger file's folder
+        
+        Returns:
+            dict: Keys year, path, transactions and splits, or None if the
+                database rejected the change
+        
+        Raises:
+            ValueError: If the year cannot be archived (see _check_archivable)
+        """
+        first_day, last_day = date_bounds(date_from, date_to)
+        path = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), file_name)
+        in_range = "SELECT Id FROM Transactions WHERE UserDay BETWEEN ? AND ?"
+        days = (first_day, last_day)
+        written = False
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._check_archivable(year, first_day, last_day)
+            tran_ids = [row[0] for row in self.conn.execute(f"{in_range} ORDER BY Id", days)]
+            if not tran_ids:
+                raise ValueError(f"There are no transactions dated from {date_from} to {date_to}")
+            splits = self.conn.execute(f"SELECT COUNT(*) FROM Split WHERE Tran_id IN ({in_range})",
+                                       days).fetchone()[0]
+            
+            sha256 = archive.write_archive_file(self.conn, path, first_day, last_day)
+            written = True
+            self.cursor.execute("""
+                INSERT INTO Archive (Year, FileName, DateFrom, DateTo, Transactions, Splits, Sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (year, file_name, normalize_date(date_from), normalize_date(date_to),
+                  len(tran_ids), splits, sha256))
+            self.cursor.execute("""
+                INSERT INTO ArchiveTotal (Year, FundId, AccountId, Amount, ClearedAmount)
+                SELECT ?, Split.FundId, Split.AccountId, SUM(Split.Amount),
+                       SUM(CASE WHEN Split.Cleared = 1 THEN Split.Amount ELSE 0 END)
+                FROM Split
+                JOIN Transactions ON Split.Tran_id = Transactions.Id
+                WHERE Transactions.Deleted = 0 AND Transactions.UserDay BETWEEN ? AND ?
+                GROUP BY Split.FundId, Split.AccountId
+            """, (year,) + days)
+            
+            # The images are in the archive file; the entries record the move
+            audit.append_entries(self.conn, [('archive', tran_id, None, None) for tran_id in tran_ids])
+            self.cursor.execute(f"UPDATE RecurringPosting SET Tran_id = NULL WHERE Tran_id IN ({in_range})", days)
+            self.cursor.execute(f"DELETE FROM Split WHERE Tran_id IN ({in_range})", days)
+            self.cursor.execute("DELETE FROM Transactions WHERE UserDay BETWEEN ? AND ?", days)
+            self.conn.commit()
+            self._archives = None
+            if _DEBUG:
+                print(f"Archived {len(tran_ids)} transactions and {splits} splits to {path}")
+            return {'year': year, 'path': path, 'transactions': len(tran_ids), 'splits': splits}
+            
+        except ValueError:
+            self.conn.rollback()
+            raise
+        except Exception as e:
+            self.conn.rollback()
+            if written and os.path.exists(path):
+                os.remove(path)
+            if _DEBUG:
+                print(f"Error archiving {year}: {e}")
+            return None
+    
+    def _check_archivable(self, year, first_day, last_day):
+        """
+        Raise ValueError unless the days from first_day to last_day can be archived as year.
+        
+        Years are archived oldest first and never overlap, and every split in
+        the year on an account that is reconciled must itself be reconciled,
+        as archived splits can no longer be.
+        """
+        if self.conn.execute("SELECT 1 FROM Archive WHERE Year = ?", (year,)).fetchone():
+            raise ValueError(f"{year} has already been archived")
+        archived_to = self.conn.execute("SELECT MAX(DateTo) FROM Archive").fetchone()[0]
+        if archived_to is not None and day_number(archived_to) >= first_day:
+            raise ValueError(f"Everything up to {archived_to} has already been archived")
+        earlier = self.conn.execute("""
+            SELECT MIN(UserDate) FROM Transactions WHERE Deleted = 0 AND UserDay < ?
+        """, (first_day,)).fetchone()[0]
+        if earlier is not None:
+            raise ValueError(f"Archive the earlier years first; the ledger has transactions from {earlier}")
+        unreconciled = self.conn.execute("""
+            SELECT COUNT(*)
+            FROM Split
+            JOIN Transactions ON Split.Tran_id = Transactions.Id
+            WHERE Transactions.Deleted = 0 AND Transactions.UserDay BETWEEN ? AND ?
+              AND Split.Cleared = 0
+              AND Split.AccountId IN (SELECT AccountId FROM Split WHERE Cleared = 1)
+        """, (first_day, last_day)).fetchone()[0]
+        if unreconciled:
+            raise ValueError(f"{unreconciled} splits on reconciled accounts are not reconciled yet")
+    
+    # ========== RECONCILIATION ==========
+    
+    def fetch_unreconciled_splits(self, account_id):
+        """
+        Fetch live splits on an account that have not been reconciled yet.
+        
+        Returns:
+            list: (SplitId, UserDate, Description, Amount) tuples
+        """
+        return self.conn.execute("""
+            SELECT Split.Id, Transactions.UserDate, Transactions.Description, Split.Amount
+            FROM Split
+            JOIN Transactions ON Split.Tran_id = Transactions.Id
+            WHERE Transactions.Deleted = 0 AND Split.AccountId = ? AND Split.Cleared = 0
+            ORDER BY Transactions.UserDate, Transactions.Id, Split.Id
+        """, (account_id,)).fetchall()
+    
+    def set_splits_cleared(self, split_ids, cleared=True):
+        """
+        Mark splits as reconciled against a bank statement, or clear the mark.
+        
+        Args:
+            split_ids: Split ids to update
+            cleared: True to mark reconciled, False to unmark
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.conn.execute("BEGIN")
+            tran_ids = self._split_transaction_ids(split_ids)
+            before = self.fetch_transaction_images(tran_ids)
+            self.cursor.executemany("""
+                UPDATE Split
+                SET Cleared = ?, Cleared_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+                WHERE Id = ?
+            """, [(int(cleared), int(cleared), split_id) for split_id in split_ids])
+            self._audit('reconcile', tran_ids, before)
+            self.conn.commit()
+            return True
+            
+        except Exception as e:
+            self.conn.rollback()
+            if _DEBUG:
+                print(f"Error updating cleared flag: {e}")
+            return False
+    
+    def _split_transaction_ids(self, split_ids):
+        """Return the distinct transaction ids owning the given splits."""
+        split_ids = list(split_ids)
+        tran_ids = set()
+        for start in range(0, len(split_ids), 500):
+            batch = split_ids[start:start + 500]
+            tran_ids.update(row[0] for row in self.conn.execute(f"""
+                SELECT DISTINCT Tran_id FROM Split WHERE Id IN ({", ".join("?" * len(batch))})
+            """, batch))
+        return sorted(tran_ids)
+    
+    def fetch_reconciled_balance(self, account_id):
+        """Return the sum of live reconciled splits on an account, archived years included."""
+        result = self.conn.execute("""
+            SELECT COALESCE(SUM(Split.Amount), 0) + (
+                SELECT COALESCE(SUM(ClearedAmount), 0) FROM ArchiveTotal WHERE AccountId = ?
+            )
+            FROM Split
+            JOIN Transactions ON Split.Tran_id = Transactions.Id
+            WHERE Transactions.Deleted = 0 AND Split.AccountId = ? AND Split.Cleared = 1
+        """, (account_id, account_id)).fetchone()
+        return round(result[0], 2)
+    
     # ========== CONNECTION MANAGEMENT ==========
     
     def close(self):
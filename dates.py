@@ -0,0 +1,94 @@
+"""
+Date handling module for Tallis Ledger.
+Parses the date formats users may type and converts them to the stored ISO form.
+
+UserDate is always stored as ISO YYYY-MM-DD so that it sorts chronologically.
+Transactions.UserDay holds the same date as a day number (days since
+1970-01-01), computed by SQLite from UserDate, for indexed range queries.
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+_DEBUG = False  # Set to True for debugging output
+
+# Accepted input formats, tried in order. Where a date is ambiguous
+# (e.g. 02/03/2025) the earlier format wins.
+DATE_FORMATS = [
+    "%Y-%m-%d",      # 2025-07-20
+    "%Y/%m/%d",      # 2025/07/20
+    "%m/%d/%Y",      # 07/20/2025
+    "%m-%d-%Y",      # 07-20-2025
+    "%d/%m/%Y",      # 20/07/2025
+    "%d-%m-%Y",      # 20-07-2025
+]
+
+EPOCH = date(1970, 1, 1)
+
+# Created_at, Deleted_at and AuditLog.Logged_at are SQLite CURRENT_TIMESTAMP
+# values: UTC, to the second
+TIMESTAMP_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M",
+]
+
+
+def parse_date(date_string):
+    """Parse a date in any accepted format, returning a date or None."""
+    if not date_string or not isinstance(date_string, str):
+        return None
+    return _parse_date_string(date_string.strip())
+
+
+# The same few dates are parsed over and over: every split of a transaction
+# being edited, every row of a bulk post dated the same day
+@lru_cache(maxsize=4096)
+def _parse_date_string(date_string):
+    """Parse a stripped date string; cached per value."""
+    # Stored dates are already ISO; date.fromisoformat is far cheaper than strptime
+    if len(date_string) == 10 and date_string[4] == "-" and date_string[7] == "-":
+        try:
+            return date.fromisoformat(date_string)
+        except ValueError:
+            pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_string, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_date(date_string):
+    """Convert a date in any accepted format to ISO YYYY-MM-DD, or None if invalid."""
+    parsed = parse_date(date_string)
+    return parsed.isoformat() if parsed else None
+
+
+def day_number(date_string):
+    """Convert a date in any accepted format to a UserDay number, or None if invalid."""
+    parsed = parse_date(date_string)
+    return (parsed - EPOCH).days if parsed else None
+
+
+def normalize_timestamp(value):
+    """
+    Convert a timestamp to the stored 'YYYY-MM-DD HH:MM:SS' form, or None if invalid.
+
+    A date on its own, in any accepted format, means the end of that day.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMATS[0])
+    if isinstance(value, date):
+        return f"{value.isoformat()} 23:59:59"
+    if not value or not isinstance(value, str):
+        return None
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), timestamp_format).strftime(TIMESTAMP_FORMATS[0])
+        except ValueError:
+            continue
+    iso_date = normalize_date(value)
+    return f"{iso_date} 23:59:59" if iso_date else None
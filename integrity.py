@@ -0,0 +1,252 @@
+"""
+Journal integrity module for Tallis Ledger.
+Finds damaged or suspicious postings in one set-based pass and repairs what it can.
+
+Checks:
+    unbalanced      live transaction whose splits do not sum to zero
+    too_few_splits  live transaction with fewer than two splits
+    missing_fund    split whose FundId has no Fund row
+    missing_account split whose AccountId has no Account row
+    orphan_split    split whose Tran_id has no Transactions row
+    bad_date        live transaction whose UserDate is not a valid ISO date
+    duplicate       live transaction identical in date, description and
+                    splits to an earlier live transaction
+
+The work is split into Tran_id ranges. Each range is checked with two
+aggregate queries, and on large files the ranges are spread across worker
+processes, each with its own read-only connection. Duplicate detection needs
+the whole file, so workers return a compact fingerprint of each transaction;
+matching fingerprints are compared exactly when the results are merged.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DatabaseManager
+
+_DEBUG = False  # Set to True for debugging output
+
+# Transactions per chunk; small files are checked in a single chunk
+DEFAULT_CHUNK_SIZE = 50000
+
+# Same tolerance as the balance check when a transaction is saved
+BALANCE_TOLERANCE = 0.005
+
+
+# ========== CHUNK CHECKS ==========
+
+def _problem(check, tran_id=None, split_id=None, detail=""):
+    """Build one problem record."""
+    return {'check': check, 'tran_id': tran_id, 'split_id': split_id, 'detail': detail}
+
+
+def check_range(conn, low_id, high_id):
+    """
+    Check every transaction and split with Tran_id in [low_id, high_id].
+
+    Returns:
+        tuple: (problems, fingerprints) where fingerprints is a list of
+            (key, tran_id) for every live transaction. Equal keys mark
+            possible duplicates, which check_database confirms exactly.
+    """
+    problems = []
+    fingerprints = []
+
+    # The last two columns summarise the (account, fund, amount) multiset
+    # cheaply in SQL; identical transactions always produce identical sums
+    for tran_id, user_date, iso_date, description, split_count, total, weighted, keys in conn.execute("""
+        SELECT
+            Transactions.Id,
+            Transactions.UserDate,
+            date(Transactions.UserDate) IS Transactions.UserDate,
+            Transactions.Description,
+            COUNT(Split.Id),
+            COALESCE(SUM(Split.Amount), 0),
+            SUM(CAST(ROUND(Split.Amount * 100) AS INTEGER) *
+                (IFNULL(Split.AccountId, -1) * 1000003 + IFNULL(Split.FundId, -1))),
+            SUM(IFNULL(Split.AccountId, -1) * 1000003 + IFNULL(Split.FundId, -1))
+        FROM Transactions
+        LEFT JOIN Split ON Split.Tran_id = Transactions.Id
+        WHERE Transactions.Id BETWEEN ? AND ? AND Transactions.Deleted = 0
+        GROUP BY Transactions.Id
+    """, (low_id, high_id)):
+        if not iso_date:
+            problems.append(_problem('bad_date', tran_id, detail=f"date {user_date!r} is not YYYY-MM-DD"))
+        if split_count < 2:
+            problems.append(_problem('too_few_splits', tran_id, detail=f"{split_count} splits"))
+        if abs(total) >= BALANCE_TOLERANCE:
+            problems.append(_problem('unbalanced', tran_id, detail=f"splits sum to {total:.2f}"))
+        if split_count:
+            fingerprints.append(((user_date, description, split_count, weighted, keys), tran_id))
+
+    for split_id, tran_id, fund_id, account_id, no_fund, no_account, no_tran in conn.execute("""
+        SELECT
+            Split.Id,
+            Split.Tran_id,
+            Split.FundId,
+            Split.AccountId,
+            Fund.Id IS NULL,
+            Account.Id IS NULL,
+            Transactions.Id IS NULL
+        FROM Split
+        LEFT JOIN Fund ON Fund.Id = Split.FundId
+        LEFT JOIN Account ON Account.Id = Split.AccountId
+        LEFT JOIN Transactions ON Transactions.Id = Split.Tran_id
+        WHERE Split.Tran_id BETWEEN ? AND ?
+          AND (Fund.Id IS NULL OR Account.Id IS NULL OR Transactions.Id IS NULL)
+    """, (low_id, high_id)):
+        if no_tran:
+            problems.append(_problem('orphan_split', tran_id, split_id, f"transaction {tran_id} does not exist"))
+        if no_fund:
+            problems.append(_problem('missing_fund', tran_id, split_id, f"fund {fund_id} does not exist"))
+        if no_account:
+            problems.append(_problem('missing_account', tran_id, split_id, f"account {account_id} does not exist"))
+
+    return problems, fingerprints
+
+
+# Per-process connection opened by _init_worker
+_worker_db = None
+
+
+def _init_worker(db_path):
+    """Open this worker process's read-only connection."""
+    global _worker_db
+    _worker_db = DatabaseManager(db_path, read_only=True)
+
+
+def _check_range_in_worker(id_range):
+    """Run check_range inside a worker process."""
+    return check_range(_worker_db.conn, *id_range)
+
+
+# ========== WHOLE-FILE CHECK ==========
+
+def _id_ranges(conn, chunk_size):
+    """Split the span of transaction ids into [low, high] chunks."""
+    low_id, high_id = conn.execute("""
+        SELECT MIN(low), MAX(high) FROM (
+            SELECT MIN(Id) AS low, MAX(Id) AS high FROM Transactions
+            UNION ALL
+            SELECT MIN(Tran_id), MAX(Tran_id) FROM Split
+        )
+    """).fetchone()
+    if low_id is None:
+        return []
+    return [(start, min(start + chunk_size - 1, high_id))
+            for start in range(low_id, high_id + 1, chunk_size)]
+
+
+def _confirm_duplicates(conn, candidate_groups):
+    """
+    Compare the splits of each group of possible duplicates exactly.
+
+    Returns:
+        list: A duplicate problem for every transaction that exactly matches
+            an earlier one in its group
+    """
+    tran_ids = [tran_id for group in candidate_groups for tran_id in group]
+    splits = {}
+    # Stay well under SQLite's limit on bound parameters
+    for start in range(0, len(tran_ids), 500):
+        batch = tran_ids[start:start + 500]
+        placeholders = ", ".join("?" * len(batch))
+        for tran_id, account_id, fund_id, pence in conn.execute(f"""
+            SELECT Tran_id, AccountId, FundId, CAST(ROUND(Amount * 100) AS INTEGER)
+            FROM Split WHERE Tran_id IN ({placeholders})
+        """, batch):
+            splits.setdefault(tran_id, []).append((account_id or 0, fund_id or 0, pence or 0))
+
+    problems = []
+    for group in candidate_groups:
+        first_seen = {}
+        for tran_id in sorted(group):
+            original = first_seen.setdefault(tuple(sorted(splits.get(tran_id, []))), tran_id)
+            if original != tran_id:
+                problems.append(_problem('duplicate', tran_id, detail=f"duplicate of transaction {original}"))
+    return problems
+
+
+def check_database(db_manager, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, structural=False):
+    """
+    Run every check over the whole ledger.
+
+    Args:
+        db_manager: DatabaseManager for the ledger
+        workers: Worker processes to spread the chunks over; 1 checks in
+            this process on db_manager's own connection
+        chunk_size: Transactions per chunk
+        structural: Also run SQLite's PRAGMA quick_check on the file
+
+    Returns:
+        list: Problem dicts with keys: check, tran_id, split_id, detail,
+            ordered by transaction id
+    """
+    conn = db_manager.conn
+    id_ranges = _id_ranges(conn, chunk_size)
+    workers = min(workers or os.cpu_count() or 1, max(len(id_ranges), 1))
+
+    if workers == 1:
+        results = [check_range(conn, *id_range) for id_range in id_ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_manager.db_path,)) as executor:
+            results = list(executor.map(_check_range_in_worker, id_ranges))
+
+    problems = []
+    candidates = {}
+    for chunk_problems, fingerprints in results:
+        problems.extend(chunk_problems)
+        for key, tran_id in fingerprints:
+            candidates.setdefault(key, []).append(tran_id)
+    problems.extend(_confirm_duplicates(
+        conn, [tran_ids for tran_ids in candidates.values() if len(tran_ids) > 1]
+    ))
+
+    # Splits with no Tran_id at all fall outside every range
+    for (split_id,) in conn.execute("SELECT Id FROM Split WHERE Tran_id IS NULL"):
+        problems.append(_problem('orphan_split', None, split_id, "split has no transaction"))
+
+    if structural:
+        for (result,) in conn.execute("PRAGMA quick_check"):
+            if result != "ok":
+                problems.append(_problem('quick_check', detail=result))
+
+    problems.sort(key=lambda p: (p['tran_id'] is None, p['tran_id'] or 0, p['split_id'] or 0))
+    if _DEBUG:
+        print(f"Checked {len(id_ranges)} chunks with {workers} workers: {len(problems)} problems")
+    return problems
+
+
+# ========== REPAIR ==========
+
+def repair_problems(db_manager, problems, include_duplicates=False):
+    """
+    Repair what can be repaired automatically, through the audited write path.
+
+    Transactions with fewer than two splits are soft-deleted, splits pointing
+    at missing funds or accounts are moved to fund 0 / account 0 ('No Fund' /
+    'No Account') so they show up for review, and orphan splits are deleted.
+    Unbalanced transactions need a bookkeeper's judgement and are left alone.
+    Duplicates are soft-deleted only if include_duplicates is True, since two
+    identical postings on the same day can be genuine.
+
+    Args:
+        db_manager: Writable DatabaseManager the problems were found in
+        problems: Problem dicts from check_database
+        include_duplicates: Also soft-delete duplicate transactions
+
+    Returns:
+        bool: True if the repairs were committed, False otherwise
+    """
+    by_check = {}
+    for p in problems:
+        by_check.setdefault(p['check'], []).append(p)
+
+    delete_checks = ['too_few_splits'] + (['duplicate'] if include_duplicates else [])
+    return db_manager.repair_transactions(
+        delete_tran_ids=sorted({p['tran_id'] for check in delete_checks for p in by_check.get(check, [])}),
+        no_fund_split_ids=sorted({p['split_id'] for p in by_check.get('missing_fund', [])}),
+        no_account_split_ids=sorted({p['split_id'] for p in by_check.get('missing_account', [])}),
+        orphan_split_ids=sorted({p['split_id'] for p in by_check.get('orphan_split', [])})
+    )
@@ -3,11 +3,20 @@ Ledger sheet module for Tallis Ledger.
 Wraps the tksheet widget and handles data display.
 """
 
+import bisect
+import tkinter as tk
+from tkinter import simpledialog
+import numpy as np
 from tksheet import Sheet
 
 _DEBUG = False  # Set to True for debugging output
 
 
+def _row_key(user_date, tran_id, split_id):
+    """Sort key of a ledger row; a missing date sorts first, as SQLite sorts NULL."""
+    return (user_date or "", int(tran_id), int(split_id))
+
+
 class LedgerSheet:
     """Wraps the tksheet widget and handles data display."""
     
@@ -23,6 +32,36 @@ class LedgerSheet:
         self.sheet.enable_bindings(("single_select", "edit_cell"))
         self.sheet.pack(expand=True, fill="both")
         self.sheet.bind("<ButtonRelease-1>", self.on_cell_click_callback)
+        self.sheet.bind("<<SheetRedrawn>>", self._on_sheet_redrawn)
+        # tksheet passes every right click to this; only header clicks are used
+        self.sheet.bind("<3>", self._on_right_click)
+        
+        # Running balance model for the displayed ledger, one entry per row.
+        # Balance cells are only rewritten when their row is on screen, so
+        # rows flagged in balance_stale may show an out of date balance.
+        self.amounts = np.zeros(0)
+        self.balances = np.zeros(0)
+        self.balance_stale = np.zeros(0, dtype=bool)
+        
+        # Sort key (UserDate, TransactionsId, SplitId) of each displayed row,
+        # in the order fetch_ledger_data returns them, for bisecting
+        self.row_keys = []
+        
+        # Client-side sort and filter. view_order holds the model row shown at
+        # each sheet row, or None when the sheet is in ledger order. The sort
+        # permutations and lowercased column text are built on first use and
+        # kept until the data changes.
+        self.view_order = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_column = None
+        self.filter_term = ""
+        self._view_rows = None
+        self._sort_orders = {}
+        self._text_indexes = {}
+        
+        # Headers and ledger rows kept by hold_rows while an edit is shown
+        self._held = None
     
     def format_decimal_columns(self, df, include_balance=True):
         """Format Amount and Balance columns to 2 decimal places."""
@@ -38,14 +77,342 @@ class LedgerSheet:
         
         if include_balance:
             # Add balance column with cumulative sum of Amount column
-            full_df['Balance'] = full_df['Amount'].cumsum()
+            self.amounts = full_df['Amount'].to_numpy(dtype=float)
+            self.balances = np.cumsum(self.amounts)
+            full_df['Balance'] = self.balances
+        else:
+            self.amounts = np.zeros(0)
+            self.balances = np.zeros(0)
+        self.balance_stale = np.zeros(len(self.balances), dtype=bool)
+        # Built column-wise; the same keys as _row_key gives for each row
+        self.row_keys = list(zip(full_df['UserDate'].fillna("").tolist(),
+                                 full_df['TransactionsId'].tolist(), full_df['SplitId'].tolist()))
         
         # Format Amount and Balance columns to 2 decimal places
         formatted_data = self.format_decimal_columns(full_df, include_balance)
         
+        self._reset_view()
+        self._held = None
+        rows = formatted_data.values.tolist()
         self.sheet.headers(list(formatted_data.columns))
-        self.sheet.set_sheet_data(formatted_data.values.tolist())
+        self.sheet.set_sheet_data(rows)
         self.set_column_widths()
+        # tksheet keeps this list, so it already holds the ledger-order rows
+        self._view_rows = rows
+    
+    def refresh_transaction(self, tran_id, filter_id, filter_type='account'):
+        """
+        Replace one transaction's rows in the displayed ledger without reloading it.
+        
+        The transaction's old rows are removed, its current rows are fetched on
+        their own and inserted at their sorted (UserDate, TransactionsId, SplitId)
+        position. Each change shifts only the balances after it, and only
+        the balances on screen are written to the sheet.
+        """
+        if self._balance_column() is None:
+            return
+        # Rows are inserted by their position in ledger order
+        self.clear_view()
+        self._invalidate_view_caches()
+        
+        # Remove the transaction's existing rows
+        old_rows = [i for i, key in enumerate(self.row_keys) if key[1] == tran_id]
+        if old_rows:
+            self.sheet.del_rows(old_rows, redraw=False)
+            del self.row_keys[old_rows[0]:old_rows[-1] + 1]
+            self._remove_balance_rows(old_rows)
+        
+        # Insert its current rows (none if it is now deleted) in sorted position
+        new_df = self.db_manager.fetch_ledger_data(filter_id, filter_type, tran_id=tran_id)
+        new_rows = self.format_decimal_columns(new_df, include_balance=False).values.tolist()
+        if new_rows:
+            new_keys = [_row_key(row[2], row[1], row[0]) for row in new_rows]
+            insert_at = bisect.bisect_left(self.row_keys, new_keys[0])
+            self.sheet.insert_rows(rows=[row + [""] for row in new_rows], idx=insert_at, redraw=False)
+            self.row_keys[insert_at:insert_at] = new_keys
+            self._insert_balance_rows(insert_at, new_df['Amount'].to_numpy(dtype=float))
+        
+        self._write_visible_balances()
+        self.sheet.refresh()
+    
+    def hold_rows(self):
+        """
+        Keep the displayed ledger while the sheet shows a transaction being edited or added.
+        
+        The sheet is returned to ledger order first. restore_rows puts the
+        rows back, so leaving edit mode needs no ledger query; the change
+        saved is then patched in with refresh_transaction.
+        
+        Returns:
+            list: The ledger rows in ledger order, Balance last
+        """
+        self.clear_view()
+        self._held = (list(self.sheet.headers()), self.sheet.get_sheet_data())
+        return self._held[1]
+    
+    def restore_rows(self):
+        """
+        Show the ledger kept by hold_rows again.
+        
+        Returns:
+            bool: False if no ledger was held
+        """
+        if self._held is None:
+            return False
+        headers, rows = self._held
+        self._held = None
+        self.sheet.headers(headers)
+        self.sheet.set_sheet_data(rows)
+        self.set_column_widths()
+        self._view_rows = rows
+        self._write_visible_balances()
+        return True
+    
+    # ========== NAVIGATION ==========
+    
+    def row_for_date(self, iso_date):
+        """
+        Find the first row dated on or after iso_date.
+        
+        Returns:
+            int: Row index, the last row if every row is earlier, or None if the ledger is empty
+        """
+        if not self.row_keys:
+            return None
+        return min(bisect.bisect_left(self.row_keys, (iso_date,)), len(self.row_keys) - 1)
+    
+    def row_for_transaction(self, tran_id, user_date):
+        """
+        Find the first row of a transaction given its date.
+        
+        Returns:
+            int: Row index, or None if the transaction is not in the displayed ledger
+        """
+        row = bisect.bisect_left(self.row_keys, (user_date, tran_id))
+        if row < len(self.row_keys) and self.row_keys[row][1] == tran_id:
+            return row
+        return None
+    
+    def show_row(self, row):
+        """Scroll straight to row, select it and fill in the balances now on screen."""
+        self.sheet.see(row, 0, bottom_right_corner=False, check_cell_visibility=False, redraw=False)
+        self.sheet.set_currently_selected(row, 3)
+        self._write_visible_balances()
+        self.sheet.refresh()
+    
+    # ========== RUNNING BALANCES ==========
+    
+    def _balance_column(self):
+        """Return the index of the Balance column, or None if it is not shown."""
+        headers = self.sheet.headers()
+        return headers.index('Balance') if 'Balance' in headers else None
+    
+    def _shift_balances(self, start, delta):
+        """Add delta to every balance from row start onward."""
+        if delta and start < len(self.balances):
+            self.balances[start:] += delta
+            self.balance_stale[start:] = True
+    
+    def _remove_balance_rows(self, rows):
+        """Drop rows from the balance model and shift the balances after them."""
+        removed = self.amounts[rows].sum()
+        self.amounts = np.delete(self.amounts, rows)
+        self.balances = np.delete(self.balances, rows)
+        self.balance_stale = np.delete(self.balance_stale, rows)
+        self._shift_balances(rows[0], -removed)
+    
+    def _insert_balance_rows(self, position, amounts):
+        """Add rows with the given amounts at position and shift the balances after them."""
+        opening_balance = self.balances[position - 1] if position > 0 else 0.0
+        self.amounts = np.insert(self.amounts, position, amounts)
+        self.balances = np.insert(self.balances, position, opening_balance + np.cumsum(amounts))
+        self.balance_stale = np.insert(self.balance_stale, position, np.ones(len(amounts), dtype=bool))
+        self._shift_balances(position + len(amounts), amounts.sum())
+    
+    def _write_visible_balances(self):
+        """
+        Write the out of date balances of the rows on screen into the sheet.
+        
+        Returns:
+            bool: True if any cell was written
+        """
+        balance_col = self._balance_column()
+        shown = len(self.balances) if self.view_order is None else len(self.view_order)
+        if balance_col is None or shown != self.sheet.get_total_rows():
+            return False
+        start, end = self.sheet.visible_rows
+        if self.view_order is None:
+            model_rows = np.arange(start, min(end, shown))
+        else:
+            model_rows = self.view_order[start:end]
+        # A sorted or filtered view shares its row lists with ledger order,
+        # so a balance written in either is up to date in both
+        stale = np.flatnonzero(self.balance_stale[model_rows])
+        for offset in stale:
+            row = model_rows[offset]
+            self.sheet.set_cell_data(start + int(offset), balance_col, f"{self.balances[row]:.2f}", redraw=False)
+        self.balance_stale[model_rows[stale]] = False
+        return len(stale) > 0
+    
+    def _on_sheet_redrawn(self, _event):
+        """Fill in balances scrolled into view since they were last changed."""
+        if self._write_visible_balances():
+            self.sheet.after_idle(self.sheet.refresh)
+    
+    # ========== SORT AND FILTER ==========
+    
+    def _reset_view(self):
+        """Forget any sort or filter and the caches behind them, for newly loaded data."""
+        self.view_order = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_column = None
+        self.filter_term = ""
+        self._invalidate_view_caches()
+    
+    def _invalidate_view_caches(self):
+        """Drop the sort permutations and text indexes after the rows change."""
+        self._view_rows = None
+        self._sort_orders = {}
+        self._text_indexes = {}
+    
+    def _ledger_rows(self):
+        """The displayed rows in ledger order, captured while the sheet is in ledger order."""
+        if self._view_rows is None:
+            self._view_rows = self.sheet.get_sheet_data()
+        return self._view_rows
+    
+    def _sort_order(self, column):
+        """Stable ascending permutation of the ledger rows by one column."""
+        if column not in self._sort_orders:
+            header = self.sheet.headers()[column]
+            if header == 'Amount':
+                values = self.amounts
+            elif header == 'Balance':
+                values = self.balances
+            elif header in ('UserDate', 'TransactionsId', 'SplitId'):
+                # Ledger order is already (UserDate, TransactionsId, SplitId)
+                values = np.array([key[('UserDate', 'TransactionsId', 'SplitId').index(header)]
+                                   for key in self.row_keys])
+            else:
+                values = np.array(self._text_index(column))
+            self._sort_orders[column] = np.argsort(values, kind='stable')
+        return self._sort_orders[column]
+    
+    def _text_index(self, column):
+        """Lowercased text of one column for every ledger row."""
+        if column not in self._text_indexes:
+            if self.sheet.headers()[column] == 'Balance':
+                # Balance cells off screen may not have been written yet
+                texts = [f"{balance:.2f}" for balance in self.balances]
+            else:
+                texts = [str(row[column]).lower() for row in self._ledger_rows()]
+            self._text_indexes[column] = texts
+        return self._text_indexes[column]
+    
+    def sort_by(self, column, descending=False):
+        """Show the ledger sorted by a column; None restores ledger order."""
+        self.sort_column = column
+        self.sort_descending = descending
+        self._apply_view()
+    
+    def filter_rows(self, column, term):
+        """Show only rows whose column contains term, ignoring case; an empty term shows all."""
+        self.filter_column = column if term else None
+        self.filter_term = term.lower()
+        self._apply_view()
+    
+    def clear_view(self, row=None):
+        """
+        Return the sheet to ledger order, unsorted and unfiltered.
+        
+        Args:
+            row: Optional sheet row in the current view
+        
+        Returns:
+            int: The ledger-order position of row, or None if no row was given
+        """
+        if row is not None and self.view_order is not None and row < len(self.view_order):
+            row = int(self.view_order[row])
+        if self.view_order is not None:
+            self.sort_column = None
+            self.filter_column = None
+            self.filter_term = ""
+            self._apply_view()
+        return row
+    
+    def _apply_view(self):
+        """Rebuild the sheet rows from the cached ledger rows in sorted, filtered order."""
+        if self._balance_column() is None or len(self.balances) != len(self.row_keys):
+            return
+        rows = self._ledger_rows()
+        order = None
+        if self.sort_column is not None:
+            order = self._sort_order(self.sort_column)
+            if self.sort_descending:
+                order = order[::-1]
+        if self.filter_column is not None:
+            texts = self._text_index(self.filter_column)
+            matches = np.fromiter((self.filter_term in text for text in texts), dtype=bool, count=len(texts))
+            order = np.flatnonzero(matches) if order is None else order[matches[order]]
+        
+        self.view_order = order
+        if order is None:
+            data = list(rows)
+        else:
+            data = [rows[row] for row in order.tolist()]
+        self.sheet.set_sheet_data(data, reset_col_positions=False, redraw=False)
+        self._write_visible_balances()
+        self.sheet.refresh()
+        if _DEBUG:
+            print(f"Showing {len(data)} of {len(rows)} rows, sorted by {self.sort_column}, "
+                  f"filtered by {self.filter_column}:{self.filter_term!r}")
+    
+    def _on_right_click(self, event):
+        """Offer sort and filter commands when a column header is right-clicked."""
+        if self.sheet.identify_region(event) != "header" or self._balance_column() is None:
+            return
+        column = self.sheet.identify_column(event, allow_end=False)
+        if column is None:
+            return
+        header = self.sheet.headers()[column]
+        menu = tk.Menu(self.sheet, tearoff=0)
+        menu.add_command(label=f"Sort by {header}, Ascending", command=lambda: self.sort_by(column))
+        menu.add_command(label=f"Sort by {header}, Descending",
+                         command=lambda: self.sort_by(column, descending=True))
+        menu.add_command(label=f"Filter {header}...", command=lambda: self._ask_filter(column))
+        menu.add_separator()
+        menu.add_command(label="Ledger Order, No Filter", command=self.clear_view)
+        menu.tk_popup(event.x_root, event.y_root)
+    
+    def _ask_filter(self, column):
+        """Ask for the text to filter a column by."""
+        header = self.sheet.headers()[column]
+        term = simpledialog.askstring(
+            "Filter", f"Show rows whose {header} contains:",
+            initialvalue=self.filter_term if self.filter_column == column else "",
+            parent=self.sheet
+        )
+        if term is not None:
+            self.filter_rows(column, term.strip())
+    
+    def fill_column(self, column, start_row, end_row, value, skip_row=None):
+        """
+        Set one column of a block of rows to value in a single write and redraw once.
+        
+        skip_row keeps its current value; pass the row being edited so that
+        tksheet still sees the edit as a change when it stores it.
+        """
+        if end_row <= start_row:
+            return
+        kept = self.sheet.get_cell_data(skip_row, column) if skip_row is not None else None
+        self.sheet.set_data(
+            start_row, column,
+            data=[[kept if row == skip_row else value] for row in range(start_row, end_row)],
+            undo=False, emit_event=False, redraw=False
+        )
+        # Idle so the redraw also picks up the edited cell, which tksheet stores afterwards
+        self.sheet.after_idle(self.sheet.refresh)
     
     def highlight_row(self, row_index, bg="red", fg="white"):
         """Highlight a specific row with the given colors."""
@@ -73,9 +440,8 @@ class LedgerSheet:
     
     def setup_account_dropdown(self, start_row, end_row):
         """Set up account dropdown for the specified row range."""
-        # Get all account options from database
-        account_options = self.db_manager.fetch_chart_options()
-        dropdown_values = [f"{row['Id']}:{row['Name']}" for _, row in account_options.iterrows()]
+        # The same label strings the ledger rows hold
+        dropdown_values = list(self.db_manager.fetch_choice_labels()['account'].values())
         
         # Find the AccountChoice column index
         headers = self.sheet.headers()
@@ -96,9 +462,8 @@ class LedgerSheet:
     
     def setup_fund_dropdown(self, start_row, end_row):
         """Set up fund dropdown for the specified row range."""
-        # Get all fund options from database
-        fund_options = self.db_manager.fetch_fund_options()
-        dropdown_values = [f"{row['Id']}:{row['Name']}" for _, row in fund_options.iterrows()]
+        # The same label strings the ledger rows hold
+        dropdown_values = list(self.db_manager.fetch_choice_labels()['fund'].values())
         
         # Find the FundChoice column index
         headers = self.sheet.headers()
@@ -0,0 +1,241 @@
+"""
+Ledger comparison module for Tallis Ledger.
+Finds the transactions that differ between two copies of a ledger and builds a change set to bring one in line with the other.
+
+Each file is summarised by a small hash tree built in one pass over its live
+transactions:
+
+    root                 hash of every month hash
+    month                hash of the transactions dated in that month
+    (month, account)     hash of the month's transactions touching the account
+
+A transaction's own hash covers its id, date, description and splits
+(account, fund, amount in pence and reconciled flag). Splits are compared
+by content in any order, not by id: a split copied in by apply_change_set
+gets a new id if the original one is taken in the target file. Comparing two trees
+is a handful of dictionary lookups. Only months whose hashes differ are read
+again, and within them only transactions touching an account whose hash
+differs are compared one by one to find exactly which changed.
+
+Transactions are matched by Id, which is right for copies taken from the
+same file. If both copies have added a different transaction under the same
+Id, the other file's version wins.
+
+Only the transactions still in each main file are compared. Archived years
+are moved out to their own files, so both copies must have archived the same
+years with the same totals; otherwise compare_ledgers refuses, rather than
+report every transaction one copy has archived as removed.
+"""
+
+import hashlib
+from datetime import date
+from itertools import groupby
+
+from dates import day_number
+
+_DEBUG = False  # Set to True for debugging output
+
+
+# ========== HASHING ==========
+
+def _live_split_rows(conn, where="", params=()):
+    """Yield live (tran_id, user_date, description, split_id, account_id, fund_id, pence, cleared) rows."""
+    return conn.execute(f"""
+        SELECT
+            Transactions.Id,
+            Transactions.UserDate,
+            Transactions.Description,
+            Split.Id,
+            Split.AccountId,
+            Split.FundId,
+            CAST(ROUND(Split.Amount * 100) AS INTEGER),
+            COALESCE(Split.Cleared, 0)
+        FROM Transactions
+        JOIN Split ON Split.Tran_id = Transactions.Id
+        WHERE Transactions.Deleted = 0 {where}
+        ORDER BY Transactions.Id, Split.Id
+    """, params)
+
+
+def _hashed_transactions(rows):
+    """
+    Group split rows by transaction and hash each transaction.
+
+    Yields:
+        tuple: (tran_id, month, account ids touched, 16 byte digest)
+    """
+    for tran_id, splits in groupby(rows, key=lambda row: row[0]):
+        splits = list(splits)
+        user_date, description = splits[0][1], splits[0][2]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((tran_id, user_date, description)).encode())
+        for split in sorted(split[4:] for split in splits):
+            digest.update(repr(split).encode())
+        month = (user_date or "")[:7]
+        yield tran_id, month, {split[4] for split in splits}, digest.digest()
+
+
+def build_hash_tree(conn):
+    """
+    Hash every live transaction into month and (month, account) buckets.
+
+    Returns:
+        dict: Keys root (hex string), months ({month: hex}) and
+            accounts ({(month, account_id): hex})
+    """
+    months = {}
+    accounts = {}
+    for tran_id, month, account_ids, digest in _hashed_transactions(_live_split_rows(conn)):
+        months.setdefault(month, hashlib.blake2b(digest_size=16)).update(digest)
+        for account_id in account_ids:
+            accounts.setdefault((month, account_id), hashlib.blake2b(digest_size=16)).update(digest)
+
+    root = hashlib.blake2b(digest_size=16)
+    for month in sorted(months):
+        root.update(month.encode() + months[month].digest())
+    return {
+        'root': root.hexdigest(),
+        'months': {month: h.hexdigest() for month, h in months.items()},
+        'accounts': {key: h.hexdigest() for key, h in accounts.items()}
+    }
+
+
+def _month_clause(month):
+    """WHERE fragment selecting one month's transactions through the UserDay index."""
+    # Dates that are not valid have no UserDay and are bucketed by their text
+    invalid = "SELECT Id FROM Transactions WHERE UserDay IS NULL AND substr(UserDate, 1, 7) IS ?"
+    first_day = day_number(f"{month}-01")
+    if first_day is None:
+        return f"AND Transactions.Id IN ({invalid})", [month or None]
+    year, month_number = divmod(int(month[5:7]), 12)
+    last_day = day_number(date(int(month[:4]) + year, month_number + 1, 1).isoformat()) - 1
+    return (f"AND Transactions.Id IN (SELECT Id FROM Transactions WHERE UserDay BETWEEN ? AND ? "
+            f"UNION ALL {invalid})", [first_day, last_day, month])
+
+
+def transaction_hashes(conn, month, account_ids):
+    """
+    Hash the live transactions in one month that touch any of account_ids.
+
+    Returns:
+        dict: {tran_id: digest}
+    """
+    where, params = _month_clause(month)
+    return {
+        tran_id: digest
+        for tran_id, _month, touched, digest in _hashed_transactions(_live_split_rows(conn, where, params))
+        if touched & account_ids
+    }
+
+
+# ========== COMPARISON ==========
+
+def _archive_summary(conn):
+    """Archived years and their totals in pence, for checking two files archived the same."""
+    years = conn.execute("""
+        SELECT Year, DateFrom, DateTo, Transactions, Splits FROM Archive ORDER BY Year
+    """).fetchall()
+    totals = conn.execute("""
+        SELECT Year, FundId, AccountId,
+            CAST(ROUND(Amount * 100) AS INTEGER), CAST(ROUND(ClearedAmount * 100) AS INTEGER)
+        FROM ArchiveTotal
+        ORDER BY Year, FundId, AccountId
+    """).fetchall()
+    return years, totals
+
+
+def compare_ledgers(target, source):
+    """
+    Find the transactions that differ between two ledger files.
+
+    Args:
+        target: DatabaseManager for the file to be brought in line
+        source: DatabaseManager for the file to copy from
+
+    Returns:
+        list: Dicts with keys tran_id and change, where change is 'added'
+            (live only in source), 'removed' (live only in target) or
+            'changed', ordered by tran_id
+
+    Raises:
+        ValueError: If the two files have not archived the same years
+    """
+    if _archive_summary(target.conn) != _archive_summary(source.conn):
+        raise ValueError("The two files have not archived the same years; "
+                         "close the same years in both before comparing them")
+
+    target_tree = build_hash_tree(target.conn)
+    source_tree = build_hash_tree(source.conn)
+    if target_tree['root'] == source_tree['root']:
+        return []
+
+    # Only (month, account) buckets whose hashes differ need reading again
+    differing = {}
+    for key in target_tree['accounts'].keys() | source_tree['accounts'].keys():
+        month, account_id = key
+        if target_tree['months'].get(month) == source_tree['months'].get(month):
+            continue
+        if target_tree['accounts'].get(key) != source_tree['accounts'].get(key):
+            differing.setdefault(month, set()).add(account_id)
+    if _DEBUG:
+        print(f"{len(differing)} months differ across "
+              f"{sum(len(a) for a in differing.values())} accounts")
+
+    target_hashes = {}
+    source_hashes = {}
+    for month, account_ids in differing.items():
+        target_hashes.update(transaction_hashes(target.conn, month, account_ids))
+        source_hashes.update(transaction_hashes(source.conn, month, account_ids))
+
+    changes = []
+    for tran_id in sorted(target_hashes.keys() | source_hashes.keys()):
+        if tran_id not in target_hashes:
+            changes.append({'tran_id': tran_id, 'change': 'added'})
+        elif tran_id not in source_hashes:
+            changes.append({'tran_id': tran_id, 'change': 'removed'})
+        elif target_hashes[tran_id] != source_hashes[tran_id]:
+            changes.append({'tran_id': tran_id, 'change': 'changed'})
+    return changes
+
+
+def build_change_set(target, source, changes):
+    """
+    Turn the result of compare_ledgers into transaction images to apply to target.
+
+    Added and changed transactions are copied from source; removed ones are
+    soft-deleted as they stand in target. A transaction that has gone from
+    the file it is read from since compare_ledgers ran is left out.
+
+    Returns:
+        list: Images as produced by DatabaseManager.fetch_transaction_image
+    """
+    images = []
+    for change in changes:
+        if change['change'] == 'removed':
+            image = target.fetch_transaction_image(change['tran_id'])
+            if image is not None:
+                image['deleted'] = True
+        else:
+            image = source.fetch_transaction_image(change['tran_id'])
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def apply_change_set(target, images):
+    """
+    Apply a change set to target in a single commit.
+
+    Returns:
+        bool: True if successful, False otherwise
+
+    Raises:
+        ValueError: If a transaction is dated in a year target has archived
+    """
+    archives = target.fetch_archives()
+    if archives:
+        closed = [image['tran_id'] for image in images if image['user_date'] <= archives[-1]['date_to']]
+        if closed:
+            raise ValueError(f"The change set has transactions dated in a year this file has archived: "
+                             f"{', '.join(map(str, closed[:10]))}")
+    return target.apply_transaction_images(images, create=True)
@@ -0,0 +1,242 @@
+"""
+Schema migration module for Tallis Ledger.
+Brings ledger files created by older versions up to the current schema.
+
+The schema version is stored in PRAGMA user_version. createtables.sql builds
+the current schema and sets user_version to SCHEMA_VERSION directly, so a new
+file never runs any of these steps. Each step runs in its own transaction.
+A file filled by insertdata.sql or another script after createtables.sql
+gets its audit baseline the first time it is opened for writing.
+"""
+
+import audit
+from dates import normalize_date
+
+_DEBUG = False  # Set to True for debugging output
+
+
+def _v1_split_cleared(conn):
+    """Add the persisted reconciliation flag to Split."""
+    conn.execute("ALTER TABLE Split ADD COLUMN Cleared BOOLEAN DEFAULT 0")
+    conn.execute("ALTER TABLE Split ADD COLUMN Cleared_at DATETIME")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_split_account_cleared ON Split(AccountId, Cleared)")
+
+
+def _v2_iso_user_dates(conn):
+    """
+    Rewrite UserDate in ISO form and add the indexed UserDay day number.
+
+    Dates that cannot be parsed in any accepted format are left untouched;
+    their UserDay is NULL and the integrity checker reports them.
+    """
+    repairs = []
+    for tran_id, user_date in conn.execute("""
+        SELECT Id, UserDate FROM Transactions
+        WHERE UserDate IS NOT NULL AND (date(UserDate) IS NULL OR date(UserDate) != UserDate)
+    """):
+        iso_date = normalize_date(user_date)
+        if iso_date:
+            repairs.append((iso_date, tran_id))
+    conn.executemany("UPDATE Transactions SET UserDate = ? WHERE Id = ?", repairs)
+    if _DEBUG:
+        print(f"Normalized {len(repairs)} dates to ISO form")
+
+    conn.execute("""
+        ALTER TABLE Transactions ADD COLUMN UserDay INTEGER
+        GENERATED ALWAYS AS (CAST(julianday(UserDate) - 2440587.5 AS INTEGER)) VIRTUAL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_userday ON Transactions(UserDay, Id)")
+
+
+def _v3_audit_log(conn):
+    """
+    Add the hash-chained audit log and record every existing transaction in it.
+
+    The baseline entries let the audit state check vouch for history that
+    predates the log.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AuditLog (
+            Id INTEGER PRIMARY KEY,
+            Logged_at DATETIME,
+            Action TEXT,
+            Tran_id INTEGER,
+            Before TEXT,
+            After TEXT,
+            Hash TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_auditlog_tran_id ON AuditLog(Tran_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AuditCheckpoint (
+            Id INTEGER PRIMARY KEY AUTOINCREMENT,
+            LogId INTEGER,
+            Hash TEXT,
+            Verified_at DATETIME
+        )
+    """)
+    for table in ("AuditLog", "AuditCheckpoint"):
+        for statement in ("UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table.lower()}_no_{statement.lower()}
+                BEFORE {statement} ON {table}
+                BEGIN SELECT RAISE(ABORT, '{table} is append-only'); END
+            """)
+
+    audit.append_baseline(conn)
+
+
+def _v4_recurring_templates(conn):
+    """Add the recurring transaction templates and the record of posted occurrences."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS RecurringTemplate (
+            Id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Description TEXT CHECK(length(Description) <= 100),
+            Frequency TEXT CHECK(Frequency IN ('weekly', 'monthly', 'quarterly', 'yearly')),
+            Interval INTEGER DEFAULT 1 CHECK(Interval >= 1),
+            StartDate DATE,
+            EndDate DATE,
+            Active BOOLEAN DEFAULT 1,
+            Created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS RecurringSplit (
+            Id INTEGER PRIMARY KEY AUTOINCREMENT,
+            TemplateId INTEGER,
+            Amount REAL,
+            FundId INTEGER,
+            AccountId INTEGER,
+            FOREIGN KEY (TemplateId) REFERENCES RecurringTemplate(Id),
+            FOREIGN KEY (FundId) REFERENCES Fund(Id),
+            FOREIGN KEY (AccountId) REFERENCES Account(Id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS RecurringPosting (
+            TemplateId INTEGER,
+            OccurrenceDate DATE,
+            Tran_id INTEGER,
+            PRIMARY KEY (TemplateId, OccurrenceDate),
+            FOREIGN KEY (TemplateId) REFERENCES RecurringTemplate(Id),
+            FOREIGN KEY (Tran_id) REFERENCES Transactions(Id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recurringsplit_template_id ON RecurringSplit(TemplateId)")
+
+
+def _v5_as_of_indexes(conn):
+    """
+    Index the timestamps that as-of queries filter on.
+
+    (Created_at, Deleted_at) replaces the single-column Created_at index,
+    which it covers.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_created_at")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_created_deleted ON Transactions(Created_at, Deleted_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_auditlog_logged_at ON AuditLog(Logged_at)")
+
+
+def _v6_transaction_version(conn):
+    """Add the row version checked when a transaction is saved or deleted."""
+    conn.execute("ALTER TABLE Transactions ADD COLUMN Version INTEGER NOT NULL DEFAULT 1")
+
+
+def _v7_archives(conn):
+    """Add the record of archived years and their totals per fund and account."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Archive (
+            Year INTEGER PRIMARY KEY,
+            FileName TEXT NOT NULL,
+            DateFrom DATE NOT NULL,
+            DateTo DATE NOT NULL,
+            Transactions INTEGER,
+            Splits INTEGER,
+            Sha256 TEXT,
+            Archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ArchiveTotal (
+            Year INTEGER,
+            FundId INTEGER,
+            AccountId INTEGER,
+            Amount REAL,
+            ClearedAmount REAL,
+            PRIMARY KEY (Year, FundId, AccountId),
+            FOREIGN KEY (Year) REFERENCES Archive(Year)
+        )
+    """)
+
+
+# Index i holds the step that upgrades a file from version i to version i + 1
+MIGRATIONS = [
+    _v1_split_cleared,
+    _v2_iso_user_dates,
+    _v3_audit_log,
+    _v4_recurring_templates,
+    _v5_as_of_indexes,
+    _v6_transaction_version,
+    _v7_archives,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(conn):
+    """
+    Apply any migrations the file has not had yet.
+
+    Files without a Split table (for example a brand new empty file) are
+    left alone; they must be created with createtables.sql.
+
+    A file whose audit log is empty but which already has transactions
+    gets a baseline entry for each of them.
+
+    Returns:
+        int: Number of migrations applied
+    """
+    has_tables = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Split'"
+    ).fetchone()
+    if not has_tables:
+        return 0
+
+    version = schema_version(conn)
+    applied = 0
+    for number in range(version, SCHEMA_VERSION):
+        try:
+            conn.execute("BEGIN")
+            MIGRATIONS[number](conn)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f"PRAGMA user_version = {number + 1}")
+            conn.commit()
+            applied += 1
+        except Exception:
+            conn.rollback()
+            raise
+        if _DEBUG:
+            print(f"Upgraded schema to version {number + 1}")
+
+    # Only an empty log is baselined; a transaction missing from a log that
+    # has entries was added outside Tallis Ledger and stays unlogged
+    needs_baseline = (
+        not conn.execute("SELECT 1 FROM AuditLog LIMIT 1").fetchone()
+        and conn.execute("SELECT 1 FROM Transactions LIMIT 1").fetchone()
+    )
+    if needs_baseline:
+        try:
+            conn.execute("BEGIN")
+            audit.append_baseline(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if _DEBUG:
+            print("Recorded audit baseline")
+    return applied
@@ -0,0 +1,171 @@
+"""
+Re-categorization module for Tallis Ledger.
+Provides a window for moving many splits to a new account or fund at once.
+
+The splits to move are chosen by account, fund, date range and description.
+Preview shows how many splits would move and their totals for each current
+fund and account; Apply moves them all in one commit through
+DatabaseManager.recategorize_splits.
+"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+_DEBUG = False  # Set to True for debugging output
+
+ANY = "Any"
+UNCHANGED = "Unchanged"
+
+
+class RecategorizeWindow:
+    """
+    Form for bulk re-categorization of splits.
+
+    Apply is only enabled while the form matches the last preview, so what
+    is moved is always what was previewed.
+    """
+
+    def __init__(self, root, db_manager, on_applied_callback=None):
+        self.db_manager = db_manager
+        self.on_applied_callback = on_applied_callback
+        self.previewed = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Tallis Ledger - Re-categorize Splits")
+        self.window.geometry("700x500")
+
+        choice_labels = self.db_manager.fetch_choice_labels()
+        account_values = list(choice_labels['account'].values())
+        fund_values = list(choice_labels['fund'].values())
+
+        form = ttk.Frame(self.window, padding=10)
+        form.pack(side="top", fill="x")
+
+        ttk.Label(form, text="Move splits matching:").grid(row=0, column=0, columnspan=4, sticky="w")
+        self.account = self._combobox(form, 1, 0, "Account:", [ANY] + account_values)
+        self.fund = self._combobox(form, 1, 2, "Fund:", [ANY] + fund_values)
+        self.date_from = self._entry(form, 2, 0, "From:")
+        self.date_to = self._entry(form, 2, 2, "To:")
+        self.description = self._entry(form, 3, 0, "Description contains:")
+
+        ttk.Label(form, text="To:").grid(row=4, column=0, columnspan=4, sticky="w", pady=(10, 0))
+        self.to_account = self._combobox(form, 5, 0, "Account:", [UNCHANGED] + account_values)
+        self.to_fund = self._combobox(form, 5, 2, "Fund:", [UNCHANGED] + fund_values)
+
+        button_container = ttk.Frame(self.window)
+        button_container.pack(side="top", pady=5)
+        ttk.Button(button_container, text="Close", command=self.close).pack(side="left", padx=3, pady=8)
+        ttk.Button(button_container, text="Preview", command=self.preview).pack(side="left", padx=3, pady=8)
+        self.apply_button = ttk.Button(button_container, text="Apply", command=self.apply,
+                                       style="Accent.TButton", state="disabled")
+        self.apply_button.pack(side="left", padx=3, pady=8)
+        self.status_label = ttk.Label(button_container, text="")
+        self.status_label.pack(side="left", padx=(20, 0))
+
+        # Totals per current fund and account of the splits that would move
+        self.groups = ttk.Treeview(self.window, columns=("fund", "account", "splits", "total"),
+                                   show="headings")
+        for column, heading, anchor in (("fund", "Fund", "w"), ("account", "Account", "w"),
+                                        ("splits", "Splits", "e"), ("total", "Total", "e")):
+            self.groups.heading(column, text=heading)
+            self.groups.column(column, anchor=anchor)
+        self.groups.pack(expand=True, fill="both", padx=10, pady=(0, 10))
+
+    def _combobox(self, parent, row, column, label, values):
+        """Add a labelled read-only combobox defaulting to its first value."""
+        ttk.Label(parent, text=label).grid(row=row, column=column, sticky="e", padx=(0, 5), pady=2)
+        variable = tk.StringVar(value=values[0])
+        combobox = ttk.Combobox(parent, textvariable=variable, values=values, state="readonly", width=28)
+        combobox.grid(row=row, column=column + 1, sticky="w", pady=2)
+        combobox.bind("<<ComboboxSelected>>", self._on_form_changed)
+        return variable
+
+    def _entry(self, parent, row, column, label):
+        """Add a labelled text entry."""
+        ttk.Label(parent, text=label).grid(row=row, column=column, sticky="e", padx=(0, 5), pady=2)
+        variable = tk.StringVar()
+        entry = ttk.Entry(parent, textvariable=variable, width=30)
+        entry.grid(row=row, column=column + 1, sticky="w", pady=2)
+        entry.bind("<KeyRelease>", self._on_form_changed)
+        return variable
+
+    def _choice_id(self, variable, placeholder):
+        """Return the id of a combobox's 'Id:Name' choice, or None for the placeholder."""
+        value = variable.get()
+        return None if value == placeholder else int(value.split(":")[0])
+
+    def criteria(self):
+        """Return the form as keyword arguments for DatabaseManager.recategorize_splits."""
+        return {
+            'account_id': self._choice_id(self.account, ANY),
+            'fund_id': self._choice_id(self.fund, ANY),
+            'date_from': self.date_from.get().strip() or None,
+            'date_to': self.date_to.get().strip() or None,
+            'description': self.description.get().strip() or None,
+            'to_account_id': self._choice_id(self.to_account, UNCHANGED),
+            'to_fund_id': self._choice_id(self.to_fund, UNCHANGED),
+        }
+
+    def _on_form_changed(self, _event=None):
+        """Disable Apply once the form no longer matches the preview."""
+        if self.previewed is not None and self.criteria() != self.previewed:
+            self.apply_button.config(state="disabled")
+
+    def preview(self):
+        """Count and total the splits that would move."""
+        criteria = self.criteria()
+        try:
+            result = self.db_manager.preview_recategorization(**criteria)
+        except ValueError as e:
+            messagebox.showwarning("Re-categorize", str(e), parent=self.window)
+            return
+
+        labels = self.db_manager.fetch_choice_labels()
+        self.groups.delete(*self.groups.get_children())
+        for group in result['groups']:
+            self.groups.insert("", "end", values=(
+                labels['fund'].get(group['fund_id'], group['fund_id']),
+                labels['account'].get(group['account_id'], group['account_id']),
+                group['splits'],
+                f"{group['total']:.2f}"
+            ))
+        self.status_label.config(text=f"{result['splits']} splits in {result['transactions']} "
+                                      f"transactions, total {result['total']:.2f}")
+        self.previewed = criteria if result['splits'] else None
+        self.apply_button.config(state="normal" if self.previewed else "disabled")
+
+    def apply(self):
+        """Move the previewed splits in one commit after confirmation."""
+        if self.previewed is None or self.criteria() != self.previewed:
+            return
+        if not messagebox.askyesno(
+            "Re-categorize",
+            f"{self.status_label.cget('text')}.\n\nMove them now? Each transaction changed is "
+            "recorded in the audit log; the change cannot be undone with Ctrl+Z.",
+            parent=self.window
+        ):
+            return
+
+        self.window.config(cursor="watch")
+        self.window.update_idletasks()
+        try:
+            changed = self.db_manager.recategorize_splits(**self.previewed)
+        finally:
+            self.window.config(cursor="")
+        if changed is None:
+            messagebox.showerror("Re-categorize", "The database rejected the change. Nothing was moved.",
+                                 parent=self.window)
+            return
+
+        if _DEBUG:
+            print(f"Re-categorized {changed} splits")
+        self.previewed = None
+        self.apply_button.config(state="disabled")
+        self.groups.delete(*self.groups.get_children())
+        self.status_label.config(text=f"Moved {changed} splits")
+        if self.on_applied_callback:
+            self.on_applied_callback()
+
+    def close(self):
+        """Close the window."""
+        self.window.destroy()
@@ -0,0 +1,169 @@
+"""
+Bank reconciliation module for Tallis Ledger.
+Matches bank statement lines to unreconciled splits on a bank account.
+
+Splits are indexed by (amount in pence, day number) in a dict, so each
+statement line only looks at the few splits with exactly its amount within
+the date window rather than scanning the whole account. All candidate pairs
+are then scored and assigned greedily best-first, giving O(n log n) matching
+overall. Description similarity is only used to break ties between
+candidates with the same amount.
+"""
+
+import csv
+from difflib import SequenceMatcher
+
+from dates import parse_date
+
+_DEBUG = False  # Set to True for debugging output
+
+
+def parse_day(date_string):
+    """Convert a date string to a day number (proleptic ordinal), or None."""
+    parsed = parse_date(str(date_string)) if date_string else None
+    return parsed.toordinal() if parsed else None
+
+
+def to_pence(amount):
+    """Convert an amount to integer pence so equality is exact."""
+    return int(round(float(amount) * 100))
+
+
+def load_statement(path):
+    """
+    Read bank statement lines from a CSV file.
+
+    The file needs Date, Description and Amount columns (header names are
+    matched case-insensitively). Money paid into the bank is positive, as it
+    is on the bank account in the ledger.
+
+    Returns:
+        list: Dicts with keys: line, date, day, description, amount
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If a column is missing or a line has a bad date or amount
+    """
+    lines = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+        try:
+            date_col, desc_col, amount_col = columns['date'], columns['description'], columns['amount']
+        except KeyError:
+            raise ValueError("Statement must have Date, Description and Amount columns")
+
+        for number, row in enumerate(reader, start=1):
+            day = parse_day(row[date_col])
+            if day is None:
+                raise ValueError(f"Statement line {number}: invalid date '{row[date_col]}'")
+            try:
+                amount = float(row[amount_col])
+            except (TypeError, ValueError):
+                raise ValueError(f"Statement line {number}: invalid amount {row[amount_col] or ''!r}")
+            lines.append({
+                'line': number,
+                'date': row[date_col].strip(),
+                'day': day,
+                'description': row[desc_col] or "",
+                'amount': amount,
+            })
+    return lines
+
+
+def _similarity(a, b):
+    """Return how alike two descriptions are, from 0.0 to 1.0."""
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+def match_statement(statement_lines, splits, date_window=3):
+    """
+    Pair statement lines with ledger splits of the same amount.
+
+    Args:
+        statement_lines: Lines from load_statement
+        splits: (SplitId, UserDate, Description, Amount) tuples, as returned by
+            DatabaseManager.fetch_unreconciled_splits
+        date_window: Largest difference in days allowed between the
+            statement date and the ledger date
+
+    Returns:
+        tuple: (matches, unmatched_lines) where matches is a list of dicts with
+            keys: line, split_id, days_apart, similarity
+    """
+    # Hashed index on (amount in pence, day number)
+    index = {}
+    split_descriptions = {}
+    for split_id, user_date, description, amount in splits:
+        day = parse_day(user_date)
+        if day is None:
+            if _DEBUG:
+                print(f"Split {split_id} has unparseable date {user_date}; skipped")
+            continue
+        index.setdefault((to_pence(amount), day), []).append(split_id)
+        split_descriptions[split_id] = description or ""
+
+    candidates = []
+    for line in statement_lines:
+        pence = to_pence(line['amount'])
+        for offset in range(-date_window, date_window + 1):
+            for split_id in index.get((pence, line['day'] + offset), ()):
+                similarity = _similarity(line['description'], split_descriptions[split_id])
+                # Closest date first, then most similar description, then
+                # earliest line and split so the result is deterministic
+                score = (abs(offset), -similarity, line['line'], split_id)
+                candidates.append((score, line['line'], split_id, abs(offset), similarity))
+
+    candidates.sort()
+    used_lines = set()
+    used_splits = set()
+    matches = []
+    for _score, line_number, split_id, days_apart, similarity in candidates:
+        if line_number in used_lines or split_id in used_splits:
+            continue
+        used_lines.add(line_number)
+        used_splits.add(split_id)
+        matches.append({
+            'line': line_number,
+            'split_id': split_id,
+            'days_apart': days_apart,
+            'similarity': round(similarity, 2),
+        })
+
+    matches.sort(key=lambda match: match['line'])
+    unmatched = [line for line in statement_lines if line['line'] not in used_lines]
+    return matches, unmatched
+
+
+def reconcile(db_manager, account_id, statement_path, date_window=3, apply=False):
+    """
+    Match a statement file against an account and optionally persist the result.
+
+    Args:
+        db_manager: DatabaseManager for the ledger
+        account_id: Bank account to reconcile
+        statement_path: CSV statement, see load_statement
+        date_window: See match_statement
+        apply: Mark the matched splits as reconciled in the database
+
+    Returns:
+        dict: Keys lines (every statement line, as load_statement returns
+            them), matches, unmatched and reconciled_balance
+
+    Raises:
+        OSError, ValueError: As load_statement
+    """
+    statement_lines = load_statement(statement_path)
+    splits = db_manager.fetch_unreconciled_splits(account_id)
+    matches, unmatched = match_statement(statement_lines, splits, date_window)
+
+    if apply and matches:
+        if not db_manager.set_splits_cleared([match['split_id'] for match in matches]):
+            raise RuntimeError("Failed to mark matched splits as reconciled")
+
+    return {
+        'lines': statement_lines,
+        'matches': matches,
+        'unmatched': unmatched,
+        'reconciled_balance': db_manager.fetch_reconciled_balance(account_id),
+    }
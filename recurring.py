@@ -0,0 +1,123 @@
+"""
+Recurring transactions module for Tallis Ledger.
+Works out which occurrences of the recurring templates are due and posts them in one batch.
+
+A template (RecurringTemplate and its RecurringSplit rows) repeats weekly,
+monthly, quarterly or yearly from its StartDate, every Interval periods,
+until its optional EndDate. Monthly dates are always counted from the start
+date, so a template starting on 31 January falls on 28 or 29 February and
+30 April and then returns to the 31st.
+
+Each posted occurrence is recorded in RecurringPosting under the key
+(TemplateId, OccurrenceDate) in the same commit as its transaction, so an
+occurrence can never be posted twice, even by two copies of the application
+catching up at once. Deleting a posted transaction does not make its
+occurrence due again.
+"""
+
+from datetime import date, timedelta
+import calendar
+
+from dates import parse_date
+
+_DEBUG = False  # Set to True for debugging output
+
+# Months per period for the calendar-based frequencies
+_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+FREQUENCIES = ('weekly',) + tuple(_MONTHS)
+
+
+def add_months(start, months):
+    """Return the date months after start, moved back to the month end if that day does not exist."""
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    day = min(start.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+
+def occurrence_dates(start, frequency, interval=1, end=None, after=None, up_to=None):
+    """
+    Yield a template's occurrence dates in order.
+
+    Args:
+        start: First occurrence (a date)
+        frequency: One of FREQUENCIES
+        interval: Periods between occurrences
+        end: Optional last date an occurrence may fall on
+        after: Only yield dates later than this
+        up_to: Stop after this date; required unless end is given
+
+    Yields:
+        date: Each occurrence date
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of: {', '.join(FREQUENCIES)}")
+    if interval < 1:
+        raise ValueError("interval must be at least 1")
+    last = min(d for d in (end, up_to) if d is not None)
+    count = 0
+    if after is not None and frequency == 'weekly':
+        # Skip straight to the first occurrence after 'after'
+        count = max((after - start).days // (7 * interval), 0)
+    elif after is not None:
+        months_between = (after.year - start.year) * 12 + after.month - start.month
+        count = max(months_between // (_MONTHS[frequency] * interval) - 1, 0)
+    while True:
+        if frequency == 'weekly':
+            occurrence = start + timedelta(weeks=count * interval)
+        else:
+            occurrence = add_months(start, count * _MONTHS[frequency] * interval)
+        if occurrence > last:
+            return
+        if after is None or occurrence > after:
+            yield occurrence
+        count += 1
+
+
+def due_occurrences(db_manager, as_of=None):
+    """
+    List every occurrence of the active templates due on or before as_of and not yet posted.
+
+    Args:
+        db_manager: DatabaseManager for the ledger
+        as_of: Last date to post up to (any accepted format); defaults to today
+
+    Returns:
+        list: Dicts with keys template_id, occurrence_date (ISO), user_date,
+            description and splits, as accepted by DatabaseManager.post_recurring,
+            in date order
+    """
+    as_of_date = date.today() if as_of is None else parse_date(as_of)
+    if as_of_date is None:
+        raise ValueError(f"Invalid date: {as_of}")
+
+    occurrences = []
+    for template in db_manager.fetch_recurring_templates(active_only=True):
+        start = parse_date(template['start_date'])
+        last_posted = parse_date(template['last_posted'])
+        for occurrence in occurrence_dates(start, template['frequency'], template['interval'],
+                                           parse_date(template['end_date']), last_posted, as_of_date):
+            occurrences.append({
+                'template_id': template['template_id'],
+                'occurrence_date': occurrence.isoformat(),
+                'user_date': occurrence.isoformat(),
+                'description': template['description'],
+                'splits': template['splits']
+            })
+    occurrences.sort(key=lambda occ: (occ['occurrence_date'], occ['template_id']))
+    if _DEBUG:
+        print(f"{len(occurrences)} recurring occurrences due up to {as_of_date}")
+    return occurrences
+
+
+def post_due(db_manager, as_of=None):
+    """
+    Post every valid due occurrence in a single commit.
+
+    Returns:
+        dict: As DatabaseManager.post_recurring: keys posted (with tran_id
+            added) and skipped (with error added), or None if the database
+            rejected the batch
+    """
+    return db_manager.post_recurring(due_occurrences(db_manager, as_of))
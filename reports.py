@@ -0,0 +1,169 @@
+"""
+Report generation module for Tallis Ledger.
+Produces per-fund or per-account statement files in parallel across a process pool.
+
+Each worker process opens its own read-only connection once and then writes
+one statement file per fund or account it is handed, with the fund and
+account names next to their ids. The running balance is
+computed over that one fund or account only, instead of over every partition
+as the LedgerViewWithFundBalance views do. Results are merged in id order
+into a single index document, so the output does not depend on which worker
+finished first.
+"""
+
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DatabaseManager
+
+_DEBUG = False  # Set to True for debugging output
+
+INDEX_FILENAME = "index.json"
+
+# Per-process connection opened by _init_worker
+_worker_db = None
+
+# Per-process {id: name} of every fund and account, read by _init_worker
+_worker_names = None
+
+
+def _init_worker(db_path):
+    """Open this worker process's read-only connection and read the fund and account names."""
+    global _worker_db, _worker_names
+    _worker_db = DatabaseManager(db_path, read_only=True)
+    _worker_names = {
+        column: dict(_worker_db.conn.execute(f"SELECT Id, Name FROM {table}"))
+        for column, table in (('FundId', "Fund"), ('AccountId', "Account"))
+    }
+
+
+def _with_names(columns, rows):
+    """
+    Add a FundName and AccountName column after the FundId and AccountId columns.
+
+    Returns:
+        tuple: (column names, iterator of rows)
+    """
+    positions = [columns.index('FundId'), columns.index('AccountId')]
+    names = [_worker_names['FundId'], _worker_names['AccountId']]
+    named_columns = list(columns)
+    # Insert from the right so the earlier position still holds
+    for position in sorted(positions, reverse=True):
+        named_columns.insert(position + 1, columns[position][:-2] + "Name")
+
+    def named_rows():
+        for row in rows:
+            row = list(row)
+            for position, lookup in sorted(zip(positions, names), reverse=True):
+                row.insert(position + 1, lookup.get(row[position]))
+            yield row
+    return named_columns, named_rows()
+
+
+def _write_statement(task):
+    """
+    Write the statement for one fund or account and return its index entry.
+
+    Runs inside a worker process using the connection from _init_worker.
+    """
+    group_by, target_id, name, target_type, out_dir = task
+    filename = f"{group_by}_{target_id}.csv"
+    columns, rows = _with_names(*_worker_db.iter_ledger_rows(target_id, group_by))
+
+    row_count = 0
+    balance = 0.0
+    with open(os.path.join(out_dir, filename), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            row_count += 1
+            balance = row[-1]
+
+    return {
+        'id': target_id,
+        'name': name,
+        'type': target_type,
+        'splits': row_count,
+        'balance': round(balance, 2),
+        'file': filename
+    }
+
+
+def list_statement_targets(db_manager, group_by='fund', target_type=None):
+    """
+    List the funds or accounts that statements can be produced for.
+
+    Args:
+        db_manager: DatabaseManager to query
+        group_by: 'fund' or 'account'
+        target_type: Only include funds or accounts whose Type contains this
+            text (case-insensitive), e.g. 'Restricted'
+
+    Returns:
+        list: (Id, Name, Type) tuples in Id order
+    """
+    if group_by == 'fund':
+        table = "Fund"
+    elif group_by == 'account':
+        table = "Account"
+    else:
+        raise ValueError("group_by must be 'fund' or 'account'")
+
+    query = f"SELECT Id, Name, Type FROM {table}"
+    params = []
+    if target_type:
+        query += " WHERE Type LIKE ?"
+        params.append(f"%{target_type}%")
+    query += " ORDER BY Id"
+    return db_manager.conn.execute(query, params).fetchall()
+
+
+def generate_statements(db_path, out_dir, group_by='fund', target_type=None, workers=None):
+    """
+    Write a statement file for every fund or account using a process pool.
+
+    Args:
+        db_path: Ledger database file
+        out_dir: Directory for the statement files and index.json
+        group_by: 'fund' or 'account'
+        target_type: Optional Type filter, see list_statement_targets
+        workers: Number of worker processes (defaults to the CPU count)
+
+    Returns:
+        list: Index entries in id order, as written to index.json
+    """
+    global _worker_db, _worker_names
+    os.makedirs(out_dir, exist_ok=True)
+    with DatabaseManager(db_path, read_only=True) as db_manager:
+        targets = list_statement_targets(db_manager, group_by, target_type)
+
+    tasks = [(group_by, target_id, name, t_type, out_dir) for target_id, name, t_type in targets]
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+
+    if _DEBUG:
+        print(f"Generating {len(tasks)} {group_by} statements with {workers} workers")
+
+    if workers == 1:
+        # Not worth starting a pool; run in this process
+        _init_worker(db_path)
+        try:
+            entries = [_write_statement(task) for task in tasks]
+        finally:
+            _worker_db.close()
+            _worker_db = None
+            _worker_names = None
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_path,)) as executor:
+            entries = list(executor.map(_write_statement, tasks,
+                                        chunksize=max(1, len(tasks) // (workers * 4))))
+
+    # executor.map already preserves task order; sort anyway so the index
+    # never depends on how the work was scheduled
+    entries.sort(key=lambda entry: entry['id'])
+    with open(os.path.join(out_dir, INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({'group_by': group_by, 'type': target_type, 'statements': entries}, f, indent=2)
+    return entries
@@ -0,0 +1,422 @@
+"""
+HTTP server module for Tallis Ledger.
+Serves the ledger as JSON to several users over the local network using only the standard library.
+
+Usage:
+    python server.py --db your_ledger.db --host 127.0.0.1 --port 8080
+
+All writes go through a single DatabaseManager guarded by a lock, so there is
+only ever one writer. Reads are served from a small pool of connections and
+the database is switched to WAL journalling so readers never block the writer.
+Every GET response carries an ETag derived from SQLite's data_version, so a
+client revalidating an unchanged ledger receives 304 Not Modified.
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from database import DatabaseManager, TransactionConflict
+from integrity import check_database
+
+_DEBUG = False  # Set to True for debugging output
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+GZIP_MIN_BYTES = 1024
+
+
+class LedgerService:
+    """Owns the database connections shared by all request handler threads."""
+
+    def __init__(self, db_path, reader_count=4):
+        self.db_path = db_path
+
+        # The single writer; every write path is serialized on writer_lock
+        self.writer = DatabaseManager(db_path, check_same_thread=False, profile='interactive')
+        self.writer.conn.execute("PRAGMA journal_mode = WAL")
+        self.writer_lock = threading.Lock()
+
+        self.readers = queue.Queue()
+        for _ in range(reader_count):
+            self.readers.put(DatabaseManager(db_path, check_same_thread=False, profile='interactive'))
+
+        # A dedicated connection that never writes: its data_version changes
+        # whenever any other connection (ours or another program's) commits
+        self._version_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._version_lock = threading.Lock()
+        # data_version restarts on every connection, so tag ETags with this
+        # server instance to stop a restarted server matching stale ones
+        self._instance_tag = secrets.token_hex(4)
+
+    def data_version(self):
+        """Return a value that changes whenever the database file is modified."""
+        with self._version_lock:
+            version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        return f"{self._instance_tag}-{version}"
+
+    @contextmanager
+    def reader(self):
+        """Check a read connection out of the pool for the duration of a block."""
+        db_manager = self.readers.get()
+        try:
+            yield db_manager
+        finally:
+            # Never return a connection to the pool holding a read snapshot
+            if db_manager.conn.in_transaction:
+                db_manager.conn.rollback()
+            self.readers.put(db_manager)
+
+    @contextmanager
+    def writer_session(self):
+        """Hold the single writer for the duration of a block."""
+        with self.writer_lock:
+            yield self.writer
+
+    def close(self):
+        """Close every connection owned by the service."""
+        self.writer.close()
+        while not self.readers.empty():
+            self.readers.get().close()
+        self._version_conn.close()
+
+
+class ApiError(Exception):
+    """Raised by route handlers to send an error response, with optional extra fields for the body."""
+
+    def __init__(self, status, message, details=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.details = details or {}
+
+
+class LedgerRequestHandler(BaseHTTPRequestHandler):
+    """Routes /api requests onto the LedgerService."""
+
+    server_version = "TallisLedger/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # ========== ROUTING ==========
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        """Find the route for this request, run it and send the response."""
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            for route_method, pattern, handler_name in ROUTES:
+                match = pattern.fullmatch(url.path)
+                if route_method == method and match:
+                    break
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {method} {url.path}")
+
+            if method == "GET":
+                # Take the version before reading so a concurrent write can
+                # only make the ETag stale, never wrong
+                etag = f'"{self.server.service.data_version()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send_empty(HTTPStatus.NOT_MODIFIED, etag)
+                    return
+                payload = getattr(self, handler_name)(query, *match.groups())
+                self._send_json(HTTPStatus.OK, payload, etag)
+            else:
+                payload = getattr(self, handler_name)(query, *match.groups())
+                self._send_json(HTTPStatus.OK, payload)
+        except ApiError as e:
+            self._send_json(e.status, dict(e.details, error=e.message))
+        except Exception as e:
+            if _DEBUG:
+                print(f"Error handling {method} {self.path}: {e}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+
+    # ========== RESPONSES ==========
+
+    def _send_json(self, status, payload, etag=None):
+        """Send payload as JSON, gzipped if the client accepts it and it is worth it."""
+        body = json.dumps(payload).encode("utf-8")
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "") and len(body) >= GZIP_MIN_BYTES
+        if gzipped:
+            body = gzip.compress(body, compresslevel=5)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_empty(self, status, etag):
+        """Send a bodyless response such as 304 Not Modified."""
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_json(self):
+        """Parse the request body as JSON."""
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}")
+
+    def log_message(self, format, *args):
+        """Only log requests when debugging."""
+        if _DEBUG:
+            super().log_message(format, *args)
+
+    # ========== LOOKUPS ==========
+
+    def get_accounts(self, _query):
+        with self.server.service.reader() as db_manager:
+            return db_manager.fetch_chart_options().to_dict("records")
+
+    def get_funds(self, _query):
+        with self.server.service.reader() as db_manager:
+            return db_manager.fetch_fund_options().to_dict("records")
+
+    # ========== LEDGER AND TRANSACTIONS ==========
+
+    def get_ledger(self, query):
+        """Return one page of an account or fund ledger with running balances."""
+        if "account" in query:
+            filter_type, filter_value = "account", query["account"]
+        elif "fund" in query:
+            filter_type, filter_value = "fund", query["fund"]
+        else:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Specify account=<id> or fund=<id>")
+        try:
+            filter_id = int(filter_value)
+            offset = max(int(query.get("offset", 0)), 0)
+            limit = min(max(int(query.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "account, fund, offset and limit must be integers")
+
+        with self.server.service.reader() as db_manager:
+            try:
+                columns, rows = db_manager.iter_ledger_rows(
+                    filter_id, filter_type, query.get("from"), query.get("to"), query.get("as_of")
+                )
+            except ValueError as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+            page = [dict(zip(columns, row)) for row in itertools.islice(rows, offset, offset + limit + 1)]
+        return {
+            'offset': offset,
+            'limit': limit,
+            'has_more': len(page) > limit,
+            'rows': page[:limit]
+        }
+
+    def _transaction_body(self, image, version):
+        """
+        The one JSON shape a transaction has in GET responses and 409 bodies.
+
+        It is a fetch_transaction_image dict (ids, not labels) with the row
+        version added, so a client can edit it and PUT it straight back.
+        """
+        if image is None:
+            return None
+        return dict(image, version=version)
+
+    def get_transaction(self, _query, tran_id):
+        with self.server.service.reader() as db_manager:
+            # Read before the splits so a change in between fails the next save
+            version = db_manager.fetch_transaction_version(int(tran_id))
+            image = db_manager.fetch_transaction_image(int(tran_id)) if version is not None else None
+        if image is None or image['deleted']:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Transaction {tran_id} not found")
+        return self._transaction_body(image, version)
+
+    def _expected_version(self, value):
+        """Parse the optional version a client read the transaction at."""
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "version must be an integer")
+
+    def _conflict(self, conflict):
+        """Turn a TransactionConflict into a 409 response carrying the stored version."""
+        return ApiError(HTTPStatus.CONFLICT, str(conflict), {
+            'version': conflict.current_version,
+            'transaction': self._transaction_body(conflict.current, conflict.current_version)
+        })
+
+    def _parse_transaction(self, body, db_manager):
+        """
+        Check a posted transaction body has the fields the database expects.
+
+        db_manager is a pooled reader: validation reads the ledger (the
+        archived years), and the writer may only be used under writer_lock.
+        """
+        try:
+            transaction = {
+                'user_date': body['user_date'],
+                'description': body.get('description', ""),
+                'splits': [
+                    {
+                        'split_id': int(split.get('split_id', 0)),
+                        'amount': float(split['amount']),
+                        'fund_id': int(split.get('fund_id', 0)),
+                        'account_id': int(split.get('account_id', 0))
+                    }
+                    for split in body['splits']
+                ]
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ApiError(HTTPStatus.BAD_REQUEST,
+                           "Transaction needs user_date, description and splits "
+                           "with amount, fund_id and account_id")
+        error = db_manager.validate_transaction(
+            transaction['user_date'], transaction['description'], transaction['splits']
+        )
+        if error:
+            raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, error)
+        return transaction
+
+    def post_transactions(self, _query):
+        """Post one transaction object or a list of them in a single commit."""
+        body = self._read_json()
+        bodies = body if isinstance(body, list) else [body]
+        with self.server.service.reader() as reader:
+            transactions = [self._parse_transaction(item, reader) for item in bodies]
+        with self.server.service.writer_session() as db_manager:
+            new_ids = db_manager.add_transactions_bulk(transactions)
+        if new_ids is None:
+            raise ApiError(HTTPStatus.CONFLICT, "The database rejected the transactions")
+        return {'transaction_ids': new_ids}
+
+    def put_transaction(self, _query, tran_id):
+        body = self._read_json()
+        with self.server.service.reader() as reader:
+            transaction = self._parse_transaction(body, reader)
+        expected_version = self._expected_version(body.get('version'))
+        with self.server.service.writer_session() as db_manager:
+            try:
+                success = db_manager.update_transaction(
+                    int(tran_id), transaction['user_date'], transaction['description'],
+                    transaction['splits'], expected_version
+                )
+            except TransactionConflict as e:
+                raise self._conflict(e)
+            version = db_manager.fetch_transaction_version(int(tran_id))
+        if not success:
+            raise ApiError(HTTPStatus.CONFLICT, f"Failed to save transaction {tran_id}")
+        return {'saved': True, 'version': version}
+
+    def delete_transaction(self, query, tran_id):
+        expected_version = self._expected_version(query.get("version"))
+        with self.server.service.writer_session() as db_manager:
+            try:
+                success = db_manager.soft_delete_transaction(int(tran_id), expected_version)
+            except TransactionConflict as e:
+                raise self._conflict(e)
+        if not success:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Transaction {tran_id} not found or already deleted")
+        return {'deleted': True}
+
+    # ========== REPORTS ==========
+
+    def get_summary(self, query):
+        group_by = query.get("group_by", "account")
+        with self.server.service.reader() as db_manager:
+            try:
+                columns, rows = db_manager.iter_summary_rows(group_by, query.get("from"), query.get("to"),
+                                                             query.get("as_of"))
+            except ValueError as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+            return [dict(zip(columns, row)) for row in rows]
+
+    def get_check(self, _query):
+        with self.server.service.reader() as db_manager:
+            return check_database(db_manager)
+
+
+ROUTES = [
+    ("GET", re.compile(r"/api/accounts"), "get_accounts"),
+    ("GET", re.compile(r"/api/funds"), "get_funds"),
+    ("GET", re.compile(r"/api/ledger"), "get_ledger"),
+    ("GET", re.compile(r"/api/transactions/(\d+)"), "get_transaction"),
+    ("POST", re.compile(r"/api/transactions"), "post_transactions"),
+    ("PUT", re.compile(r"/api/transactions/(\d+)"), "put_transaction"),
+    ("DELETE", re.compile(r"/api/transactions/(\d+)"), "delete_transaction"),
+    ("GET", re.compile(r"/api/reports/summary"), "get_summary"),
+    ("GET", re.compile(r"/api/reports/check"), "get_check"),
+]
+
+
+class LedgerServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying a LedgerService for its handlers."""
+
+    daemon_threads = True
+
+    def __init__(self, db_path, host="127.0.0.1", port=8080, reader_count=4):
+        self.service = LedgerService(db_path, reader_count)
+        super().__init__((host, port), LedgerRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+def make_server(db_path, host="127.0.0.1", port=0, reader_count=4):
+    """
+    Create a LedgerServer without starting it.
+
+    With the default port=0 the operating system picks a free port, which is
+    available afterwards as server.server_address[1]. Call serve_forever()
+    (typically on a background thread) to start handling requests.
+    """
+    return LedgerServer(db_path, host, port, reader_count)
+
+
+def main(argv=None):
+    """Main entry point for the Tallis Ledger HTTP server."""
+    parser = argparse.ArgumentParser(description="Serve a Tallis Ledger database as JSON over HTTP")
+    parser.add_argument("--db", default="your_ledger.db", help="ledger database file")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--readers", type=int, default=4, help="number of pooled read connections")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.db, args.host, args.port, args.readers)
+    print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
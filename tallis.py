@@ -0,0 +1,613 @@
+"""
+Tallis Ledger - Command-line entry point
+Runs integrity checks, reports, exports and bulk posting without the GUI.
+
+Usage:
+    python -m tallis --db your_ledger.db check
+    python -m tallis --db your_ledger.db --format json ledger --account 1001
+    python -m tallis --db your_ledger.db summary fund --to 2024-12-31
+    python -m tallis --db your_ledger.db summary account --as-of "2025-01-15 09:00"
+    python -m tallis --db your_ledger.db post journals.csv
+    python -m tallis --db your_ledger.db statements out/ --type Restricted
+    python -m tallis --db your_ledger.db backup backups/ --keep 30
+    python -m tallis --db your_ledger.db compare treasurer.db --changes changes.json
+    python -m tallis --db your_ledger.db apply-changes changes.json
+    python -m tallis --db your_ledger.db audit --state
+    python -m tallis --db north.db consolidate south.db east.db --summary fund --by-ledger
+    python -m tallis --db your_ledger.db recategorize --fund 200 --from 2025-04-01 --new-fund 210 --apply
+    python -m tallis --db your_ledger.db recurring add --description Rent --frequency monthly \
+        --start 2025-01-31 --split 1:5001:950 --split 1:1001:-950
+    python -m tallis --db your_ledger.db recurring post --as-of 2025-12-31 --dry-run
+    python -m tallis --db your_ledger.db archive close 2019 --year-start 04-01
+    python -m tallis --db your_ledger.db archive verify
+
+This module must not import tkinter or tksheet so that it can run from cron
+on a machine with no display. Modules only some commands need are imported
+inside those commands, so every command starts quickly.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from backup import BackupError, DEFAULT_KEEP, DEFAULT_PAGES_PER_STEP, create_backup
+from database import DatabaseManager, PROFILES
+from dates import normalize_date, normalize_timestamp
+from recurring import FREQUENCIES, due_occurrences, post_due
+
+_DEBUG = False  # Set to True for debugging output
+
+
+# ========== OUTPUT ==========
+
+def write_rows(columns, rows, output_format, out=sys.stdout):
+    """
+    Stream rows to out as CSV or as a JSON array of objects.
+
+    Rows are written as they are produced so large exports never have to
+    be held in memory.
+    """
+    if output_format == 'csv':
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+    elif output_format == 'json':
+        out.write("[")
+        for i, row in enumerate(rows):
+            out.write(",\n" if i else "\n")
+            out.write(json.dumps(dict(zip(columns, row))))
+        out.write("\n]\n")
+    else:
+        raise ValueError("output_format must be 'csv' or 'json'")
+
+
+# ========== INPUT ==========
+
+# Columns a bulk posting CSV file must have
+POST_CSV_COLUMNS = ['Ref', 'UserDate', 'Description', 'FundId', 'AccountId', 'Amount']
+
+
+def load_json_records(path, keys):
+    """
+    Read a JSON file holding a list of objects.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is not JSON or not a list of objects that all have keys
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            records = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}")
+    if not isinstance(records, list) or not all(
+            isinstance(record, dict) and keys <= record.keys() for record in records):
+        raise ValueError(f"{path} must hold a list of objects with keys {', '.join(sorted(keys))}")
+    return records
+
+
+def load_transactions_file(path):
+    """
+    Read transactions for bulk posting from a CSV or JSON file.
+
+    CSV files have the columns Ref, UserDate, Description, FundId, AccountId
+    and Amount; rows sharing a Ref form one transaction, with the date and
+    description taken from its first row. JSON files hold a list of objects
+    with keys user_date, description and splits, as accepted by
+    DatabaseManager.add_transactions_bulk.
+
+    Returns:
+        list: Transaction dicts for DatabaseManager.add_transactions_bulk
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If a column or key is missing or a number is invalid
+    """
+    if path.lower().endswith(".json"):
+        return load_json_records(path, {'user_date', 'description', 'splits'})
+
+    transactions = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in POST_CSV_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing the column{'s' if len(missing) > 1 else ''} "
+                             f"{', '.join(missing)}")
+        # Line 1 is the header
+        for number, row in enumerate(reader, start=2):
+            tran = transactions.setdefault(row['Ref'], {
+                'user_date': (row['UserDate'] or "").strip(),
+                'description': row['Description'],
+                'splits': []
+            })
+            try:
+                tran['splits'].append({
+                    'amount': float(row['Amount'] or 0),
+                    'fund_id': int(row['FundId'] or 0),
+                    'account_id': int(row['AccountId'] or 0)
+                })
+            except ValueError:
+                raise ValueError(f"{path} line {number}: Amount, FundId and AccountId must be numbers")
+    return list(transactions.values())
+
+
+# ========== COMMANDS ==========
+
+def cmd_check(db_manager, args):
+    """Report integrity problems; exit status 1 if any are found."""
+    from integrity import check_database, repair_problems
+    problems = check_database(db_manager, args.workers, args.chunk_size, args.structural)
+    columns = ['check', 'tran_id', 'split_id', 'detail']
+    write_rows(columns, ([p[c] for c in columns] for p in problems), args.format)
+    if args.repair and problems:
+        if not repair_problems(db_manager, problems, args.include_duplicates):
+            print("Repair failed; nothing was changed", file=sys.stderr)
+            return 2
+        print("Repaired what could be repaired automatically; run check again for what is left",
+              file=sys.stderr)
+    return 1 if problems else 0
+
+
+def cmd_ledger(db_manager, args):
+    """Export the ledger for one account or fund with a running balance."""
+    if args.account is not None:
+        columns, rows = db_manager.iter_ledger_rows(args.account, 'account', args.date_from, args.date_to,
+                                                    args.as_of)
+    else:
+        columns, rows = db_manager.iter_ledger_rows(args.fund, 'fund', args.date_from, args.date_to,
+                                                    args.as_of)
+    write_rows(columns, rows, args.format)
+    return 0
+
+
+def cmd_summary(db_manager, args):
+    """Export live totals grouped by account, fund or account type."""
+    columns, rows = db_manager.iter_summary_rows(args.group_by, args.date_from, args.date_to, args.as_of)
+    write_rows(columns, rows, args.format)
+    return 0
+
+
+def cmd_post(db_manager, args):
+    """Post every transaction in a file in a single commit."""
+    try:
+        transactions = load_transactions_file(args.file)
+    except (ValueError, OSError, json.JSONDecodeError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    for index, tran in enumerate(transactions):
+        error = db_manager.validate_transaction(
+            tran['user_date'], tran['description'], tran['splits']
+        )
+        if error:
+            print(f"Transaction {index + 1} ({tran['description']}): {error}", file=sys.stderr)
+            return 1
+
+    new_ids = db_manager.add_transactions_bulk(transactions)
+    if new_ids is None:
+        print("The database rejected the batch. Nothing was posted.", file=sys.stderr)
+        return 1
+    write_rows(['TransactionsId'], ([tran_id] for tran_id in new_ids), args.format)
+    return 0
+
+
+def cmd_statements(db_manager, args):
+    """Write per-fund or per-account statement files using a process pool."""
+    from reports import generate_statements
+    entries = generate_statements(
+        db_manager.db_path, args.out_dir, args.by, args.type, args.workers
+    )
+    columns = ['id', 'name', 'type', 'splits', 'balance', 'file']
+    write_rows(columns, ([entry[c] for c in columns] for entry in entries), args.format)
+    return 0
+
+
+def cmd_reconcile(db_manager, args):
+    """Match a bank statement against an account, marking matches if --apply is given."""
+    from reconciliation import reconcile
+    try:
+        result = reconcile(db_manager, args.account, args.statement, args.window, args.apply)
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    matched = {match['line']: match for match in result['matches']}
+    columns = ['line', 'date', 'description', 'amount', 'split_id', 'days_apart', 'similarity']
+    rows = (
+        [line['line'], line['date'], line['description'], line['amount']] +
+        [matched.get(line['line'], {}).get(key) for key in columns[4:]]
+        for line in result['lines']
+    )
+    write_rows(columns, rows, args.format)
+    print(f"{len(result['matches'])} matched, {len(result['unmatched'])} unmatched, "
+          f"reconciled balance {result['reconciled_balance']:.2f}", file=sys.stderr)
+    return 0
+
+
+def cmd_backup(db_manager, args):
+    """Take a verified online backup of the ledger and rotate old backups."""
+    try:
+        path = create_backup(db_manager.db_path, args.backup_dir, compress=not args.no_compress,
+                             keep=args.keep, pages_per_step=args.pages_per_step)
+    except (BackupError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(path)
+    return 0
+
+
+def cmd_compare(db_manager, args):
+    """List the transactions that differ from another copy of the ledger."""
+    from ledger_sync import compare_ledgers, build_change_set
+    if not os.path.exists(args.other):
+        print(f"Database not found: {args.other}", file=sys.stderr)
+        return 2
+    with DatabaseManager(args.other, read_only=True) as other:
+        try:
+            changes = compare_ledgers(db_manager, other)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        if args.changes:
+            with open(args.changes, "w", encoding="utf-8") as f:
+                json.dump(build_change_set(db_manager, other, changes), f, indent=1)
+    write_rows(['tran_id', 'change'], ([c['tran_id'], c['change']] for c in changes), args.format)
+    print(f"{len(changes)} transactions differ", file=sys.stderr)
+    return 1 if changes else 0
+
+
+def cmd_apply_changes(db_manager, args):
+    """Apply a change set written by compare in a single commit."""
+    from ledger_sync import apply_change_set
+    try:
+        images = load_json_records(args.file, {'tran_id', 'user_date', 'description', 'deleted', 'splits'})
+    except (ValueError, OSError, json.JSONDecodeError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        applied = apply_change_set(db_manager, images)
+    except ValueError as e:
+        print(f"{e}; nothing was applied", file=sys.stderr)
+        return 1
+    if not applied:
+        print("The database rejected the change set; nothing was applied", file=sys.stderr)
+        return 1
+    print(f"Applied {len(images)} transaction changes", file=sys.stderr)
+    return 0
+
+
+def cmd_audit(db_manager, args):
+    """Verify the audit log's hash chain from the last checkpoint."""
+    from audit import verify_audit_log
+    result = verify_audit_log(db_manager, full=args.full, state=args.state)
+    columns = ['check', 'entry_id', 'tran_id', 'detail']
+    write_rows(columns, ([p[c] for c in columns] for p in result['problems']), args.format)
+    print(f"{result['checked']} entries verified, {len(result['problems'])} problems; "
+          f"head entry {result['head_id']} hash {result['head_hash']}", file=sys.stderr)
+    return 1 if result['problems'] else 0
+
+
+def cmd_consolidate(db_manager, args):
+    """Export a ledger or summary consolidated across --db and other ledger files."""
+    from workspace import Workspace
+    try:
+        with Workspace([db_manager.db_path] + args.others) as workspace:
+            if args.summary:
+                columns, rows = workspace.iter_summary_rows(args.summary, args.only, args.by_ledger,
+                                                            args.date_from, args.date_to)
+            elif args.account is not None:
+                columns, rows = workspace.iter_ledger_rows(args.account, 'account', args.only,
+                                                           args.date_from, args.date_to)
+            else:
+                columns, rows = workspace.iter_ledger_rows(args.fund, 'fund', args.only,
+                                                           args.date_from, args.date_to)
+            write_rows(columns, rows, args.format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+def cmd_recategorize(db_manager, args):
+    """Preview moving splits to a new account or fund, and make the move if --apply is given."""
+    criteria = dict(account_id=args.account, fund_id=args.fund, date_from=args.date_from,
+                    date_to=args.date_to, description=args.match,
+                    to_account_id=args.new_account, to_fund_id=args.new_fund)
+    try:
+        preview = db_manager.preview_recategorization(**criteria)
+        columns = ['fund_id', 'account_id', 'splits', 'total']
+        write_rows(columns, ([group[c] for c in columns] for group in preview['groups']), args.format)
+        print(f"{preview['splits']} splits in {preview['transactions']} transactions, "
+              f"total {preview['total']:.2f}", file=sys.stderr)
+        if not args.apply or not preview['splits']:
+            return 0
+        changed = db_manager.recategorize_splits(**criteria)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if changed is None:
+        print("The database rejected the change; nothing was moved", file=sys.stderr)
+        return 1
+    print(f"Moved {changed} splits", file=sys.stderr)
+    return 0
+
+
+def cmd_recurring_list(db_manager, args):
+    """List the recurring templates."""
+    columns = ['template_id', 'description', 'frequency', 'interval', 'start_date', 'end_date',
+               'active', 'last_posted']
+    templates = db_manager.fetch_recurring_templates()
+    write_rows(columns, ([template[c] for c in columns] for template in templates), args.format)
+    return 0
+
+
+def cmd_recurring_add(db_manager, args):
+    """Add a recurring template from --split FUND:ACCOUNT:AMOUNT options."""
+    splits = []
+    for value in args.split:
+        try:
+            fund_id, account_id, amount = value.split(":")
+            splits.append({'amount': float(amount), 'fund_id': int(fund_id), 'account_id': int(account_id)})
+        except ValueError:
+            print(f"Invalid split (expected FUND:ACCOUNT:AMOUNT): {value}", file=sys.stderr)
+            return 2
+    try:
+        template_id = db_manager.add_recurring_template(args.description, args.frequency, args.start,
+                                                        splits, args.interval, args.end)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if not template_id:
+        print("The database rejected the template", file=sys.stderr)
+        return 1
+    print(template_id)
+    return 0
+
+
+def cmd_recurring_pause(db_manager, args):
+    """Pause or resume a recurring template."""
+    if not db_manager.set_recurring_template_active(args.template_id, args.recurring_command == 'resume'):
+        print(f"No recurring template {args.template_id}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_recurring_post(db_manager, args):
+    """Post every recurring occurrence due up to --as-of in a single commit."""
+    skipped = []
+    if args.dry_run:
+        occurrences = due_occurrences(db_manager, args.as_of)
+    else:
+        result = post_due(db_manager, args.as_of)
+        if result is None:
+            print("The database rejected the batch. Nothing was posted.", file=sys.stderr)
+            return 1
+        occurrences, skipped = result['posted'], result['skipped']
+    columns = ['template_id', 'occurrence_date', 'description', 'tran_id']
+    write_rows(columns, ([occ.get(c) for c in columns] for occ in occurrences), args.format)
+    for occ in skipped:
+        print(f"Template {occ['template_id']} on {occ['occurrence_date']} skipped: {occ['error']}",
+              file=sys.stderr)
+    print(f"{len(occurrences)} occurrences {'due' if args.dry_run else 'posted'}", file=sys.stderr)
+    return 1 if skipped else 0
+
+
+def cmd_archive_list(db_manager, args):
+    """List the archived years."""
+    columns = ['year', 'date_from', 'date_to', 'transactions', 'splits', 'file_name', 'archived_at']
+    archives = db_manager.fetch_archives()
+    write_rows(columns, ([archive_info[c] for c in columns] for archive_info in archives), args.format)
+    return 0
+
+
+def cmd_archive_close(db_manager, args):
+    """Move a closed financial year into its archive file."""
+    from archive import archive_year
+    try:
+        result = archive_year(db_manager, args.year, args.year_start)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if result is None:
+        print("The database rejected the change. Nothing was archived.", file=sys.stderr)
+        return 1
+    print(f"Archived {result['transactions']} transactions and {result['splits']} splits to "
+          f"{result['path']}; back it up, then VACUUM the ledger to reclaim the space", file=sys.stderr)
+    return 0
+
+
+def cmd_archive_verify(db_manager, args):
+    """Check every archive file against its recorded hash and the audit log."""
+    from archive import verify_archives
+    problems = verify_archives(db_manager)
+    columns = ['year', 'tran_id', 'detail']
+    write_rows(columns, ([p[c] for c in columns] for p in problems), args.format)
+    print(f"{len(db_manager.fetch_archives())} archives checked, {len(problems)} problems", file=sys.stderr)
+    return 1 if problems else 0
+
+
+def date_argument(value):
+    """argparse type for dates in any accepted format, returned in ISO form."""
+    iso_date = normalize_date(value)
+    if iso_date is None:
+        raise argparse.ArgumentTypeError(f"invalid date: {value}")
+    return iso_date
+
+
+def timestamp_argument(value):
+    """argparse type for as-of timestamps; a date alone means the end of that day."""
+    timestamp = normalize_timestamp(value)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f"invalid timestamp: {value}")
+    return timestamp
+
+
+def add_as_of_argument(parser):
+    """Add the --as-of option for point-in-time queries."""
+    parser.add_argument("--as-of", type=timestamp_argument, metavar="TIMESTAMP",
+                        help="show the books as they stood at this UTC time, e.g. '2025-03-31 17:00'")
+
+
+def add_date_range_arguments(parser):
+    """Add the inclusive --from / --to date range options."""
+    parser.add_argument("--from", dest="date_from", type=date_argument, metavar="DATE", help="first date to include")
+    parser.add_argument("--to", dest="date_to", type=date_argument, metavar="DATE", help="last date to include")
+
+
+def build_parser():
+    """Build the argument parser for all subcommands."""
+    parser = argparse.ArgumentParser(prog="tallis", description="Tallis Ledger command-line tools")
+    parser.add_argument("--db", default="your_ledger.db", help="ledger database file")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv", help="output format")
+    parser.add_argument("--profile", choices=list(PROFILES), default="interactive",
+                        help="connection tuning profile (see database.PROFILES)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = subparsers.add_parser("check", help="run integrity checks")
+    check_parser.add_argument("--workers", type=int, default=1, help="worker processes (0: CPU count)")
+    check_parser.add_argument("--chunk-size", type=int, default=50000, help="transactions per chunk")
+    check_parser.add_argument("--structural", action="store_true", help="also run PRAGMA quick_check")
+    check_parser.add_argument("--repair", action="store_true",
+                              help="repair what can be repaired automatically, with audit entries")
+    check_parser.add_argument("--include-duplicates", action="store_true",
+                              help="make --repair delete duplicate transactions")
+    check_parser.set_defaults(func=cmd_check)
+
+    ledger_parser = subparsers.add_parser("ledger", help="export an account or fund ledger")
+    target = ledger_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--account", type=int, help="account id")
+    target.add_argument("--fund", type=int, help="fund id")
+    add_date_range_arguments(ledger_parser)
+    add_as_of_argument(ledger_parser)
+    ledger_parser.set_defaults(func=cmd_ledger)
+
+    summary_parser = subparsers.add_parser("summary", help="export summary totals")
+    summary_parser.add_argument("group_by", choices=["account", "fund", "type"])
+    add_date_range_arguments(summary_parser)
+    add_as_of_argument(summary_parser)
+    summary_parser.set_defaults(func=cmd_summary)
+
+    post_parser = subparsers.add_parser("post", help="bulk post transactions from a CSV or JSON file")
+    post_parser.add_argument("file")
+    post_parser.set_defaults(func=cmd_post)
+
+    statements_parser = subparsers.add_parser("statements", help="write statement files in parallel")
+    statements_parser.add_argument("out_dir")
+    statements_parser.add_argument("--by", choices=["fund", "account"], default="fund")
+    statements_parser.add_argument("--type", help="only funds or accounts whose Type contains this text")
+    statements_parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    statements_parser.set_defaults(func=cmd_statements)
+
+    reconcile_parser = subparsers.add_parser("reconcile", help="match a bank statement CSV to an account")
+    reconcile_parser.add_argument("statement")
+    reconcile_parser.add_argument("--account", type=int, required=True, help="bank account id")
+    reconcile_parser.add_argument("--window", type=int, default=3, help="date tolerance in days")
+    reconcile_parser.add_argument("--apply", action="store_true", help="mark matched splits as reconciled")
+    reconcile_parser.set_defaults(func=cmd_reconcile)
+
+    backup_parser = subparsers.add_parser("backup", help="take a verified, compressed online backup")
+    backup_parser.add_argument("backup_dir")
+    backup_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="number of backups to keep")
+    backup_parser.add_argument("--no-compress", action="store_true", help="leave the backup uncompressed")
+    backup_parser.add_argument("--pages-per-step", type=int, default=DEFAULT_PAGES_PER_STEP,
+                               help="pages copied per step of the backup")
+    backup_parser.set_defaults(func=cmd_backup)
+
+    compare_parser = subparsers.add_parser("compare", help="list transactions that differ from another copy")
+    compare_parser.add_argument("other", help="the other copy of the ledger")
+    compare_parser.add_argument("--changes", metavar="FILE",
+                                help="write the changes that make --db match the other copy to FILE")
+    compare_parser.set_defaults(func=cmd_compare)
+
+    apply_parser = subparsers.add_parser("apply-changes", help="apply a change set written by compare")
+    apply_parser.add_argument("file")
+    apply_parser.set_defaults(func=cmd_apply_changes)
+
+    audit_parser = subparsers.add_parser("audit", help="verify the tamper-evident audit log")
+    audit_parser.add_argument("--full", action="store_true", help="re-hash the whole log, not just new entries")
+    audit_parser.add_argument("--state", action="store_true",
+                              help="also check every transaction against its last audited state")
+    audit_parser.set_defaults(func=cmd_audit)
+
+    consolidate_parser = subparsers.add_parser("consolidate",
+                                               help="report across --db and other ledger files")
+    consolidate_parser.add_argument("others", nargs="+", metavar="OTHER", help="other ledger files")
+    target = consolidate_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--summary", choices=["account", "fund", "type"], help="summary totals")
+    target.add_argument("--account", type=int, help="account id")
+    target.add_argument("--fund", type=int, help="fund id")
+    consolidate_parser.add_argument("--only", action="append", metavar="NAME",
+                                    help="only include this ledger (its file name without .db); repeatable")
+    consolidate_parser.add_argument("--by-ledger", action="store_true",
+                                    help="keep each ledger's summary totals apart")
+    add_date_range_arguments(consolidate_parser)
+    consolidate_parser.set_defaults(func=cmd_consolidate)
+
+    recategorize_parser = subparsers.add_parser("recategorize",
+                                                help="move matching splits to a new account or fund")
+    recategorize_parser.add_argument("--account", type=int, help="only splits on this account")
+    recategorize_parser.add_argument("--fund", type=int, help="only splits in this fund")
+    recategorize_parser.add_argument("--match", metavar="TEXT", help="only transactions whose description contains TEXT")
+    add_date_range_arguments(recategorize_parser)
+    recategorize_parser.add_argument("--new-account", type=int, metavar="ID", help="account to move the splits to")
+    recategorize_parser.add_argument("--new-fund", type=int, metavar="ID", help="fund to move the splits to")
+    recategorize_parser.add_argument("--apply", action="store_true", help="make the change; without it only preview")
+    recategorize_parser.set_defaults(func=cmd_recategorize)
+
+    recurring_parser = subparsers.add_parser("recurring", help="manage and post recurring transactions")
+    recurring_commands = recurring_parser.add_subparsers(dest="recurring_command", required=True)
+    recurring_list = recurring_commands.add_parser("list", help="list the recurring templates")
+    recurring_list.set_defaults(func=cmd_recurring_list)
+    recurring_add = recurring_commands.add_parser("add", help="add a recurring template")
+    recurring_add.add_argument("--description", required=True)
+    recurring_add.add_argument("--frequency", choices=FREQUENCIES, required=True)
+    recurring_add.add_argument("--start", type=date_argument, required=True, metavar="DATE",
+                               help="date of the first occurrence")
+    recurring_add.add_argument("--interval", type=int, default=1, help="periods between occurrences")
+    recurring_add.add_argument("--end", type=date_argument, metavar="DATE", help="last date to post on")
+    recurring_add.add_argument("--split", action="append", required=True, metavar="FUND:ACCOUNT:AMOUNT",
+                               help="one split of each posted transaction; repeatable")
+    recurring_add.set_defaults(func=cmd_recurring_add)
+    for action, help_text in (("pause", "stop posting a template"),
+                              ("resume", "start posting a template again, catching up on missed dates")):
+        recurring_pause = recurring_commands.add_parser(action, help=help_text)
+        recurring_pause.add_argument("template_id", type=int)
+        recurring_pause.set_defaults(func=cmd_recurring_pause)
+    recurring_post = recurring_commands.add_parser("post", help="post every occurrence that is due")
+    recurring_post.add_argument("--as-of", type=date_argument, metavar="DATE",
+                                help="post occurrences up to this date (default: today)")
+    recurring_post.add_argument("--dry-run", action="store_true", help="list what is due without posting")
+    recurring_post.set_defaults(func=cmd_recurring_post)
+
+    archive_parser = subparsers.add_parser("archive", help="move closed years into read-only archive files")
+    archive_commands = archive_parser.add_subparsers(dest="archive_command", required=True)
+    archive_list = archive_commands.add_parser("list", help="list the archived years")
+    archive_list.set_defaults(func=cmd_archive_list)
+    archive_close = archive_commands.add_parser("close", help="archive a financial year that has ended")
+    archive_close.add_argument("year", type=int, help="calendar year the financial year starts in")
+    archive_close.add_argument("--year-start", default="01-01", metavar="MM-DD",
+                               help="month and day the financial year starts on (default: 01-01)")
+    archive_close.set_defaults(func=cmd_archive_close)
+    archive_verify = archive_commands.add_parser("verify", help="check the archive files")
+    archive_verify.set_defaults(func=cmd_archive_verify)
+
+    return parser
+
+
+def main(argv=None):
+    """Main entry point for the Tallis Ledger command-line interface."""
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 2
+    with DatabaseManager(args.db, profile=args.profile) as db_manager:
+        try:
+            return args.func(db_manager, args)
+        except BrokenPipeError:
+            # Output was piped into something like head that stopped reading
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -89,6 +89,39 @@ class FundSelector:
         self.dropdown.config(state="readonly" if enabled else "disabled")
 
 
+class GoToBar:
+    """Entry box for jumping to a date or a transaction id in the ledger."""
+    
+    def __init__(self, parent_frame, on_go_callback):
+        self.parent_frame = parent_frame
+        self.on_go_callback = on_go_callback
+        
+        self.target = tk.StringVar()
+        
+        self.entry = ttk.Entry(self.parent_frame, textvariable=self.target, width=14)
+        self.entry.pack(side="left", padx=(0, 5))
+        self.entry.bind('<Return>', self._on_go)
+        
+        self.button = ttk.Button(self.parent_frame, text="Go", command=self._on_go, width=4)
+        self.button.pack(side="left", padx=(0, 10))
+    
+    def _on_go(self, event=None):
+        """Handle the Go button or the Return key."""
+        if self.on_go_callback:
+            self.on_go_callback(self.target.get().strip())
+    
+    def focus(self):
+        """Put the cursor in the entry with its text selected."""
+        self.entry.focus_set()
+        self.entry.select_range(0, "end")
+    
+    def set_enabled(self, enabled):
+        """Enable or disable the entry and button."""
+        state = "normal" if enabled else "disabled"
+        self.entry.config(state=state)
+        self.button.config(state=state)
+
+
 class EditModeManager:
     """Controls the edit mode UI state and buttons."""
     
@@ -177,9 +210,31 @@ class EditModeManager:
             command=self._on_add_transaction,
             style="Accent.TButton"
         )
-        self.add_transaction_button.pack(pady=8)
+        self.add_transaction_button.pack(side="left", padx=3, pady=8)
         
-        self.buttons = [button_container, self.add_transaction_button]
+        self.batch_entry_button = ttk.Button(
+            button_container, 
+            text="Batch Entry", 
+            command=self._on_batch_entry
+        )
+        self.batch_entry_button.pack(side="left", padx=3, pady=8)
+        
+        self.recategorize_button = ttk.Button(
+            button_container, 
+            text="Re-categorize", 
+            command=self._on_recategorize
+        )
+        self.recategorize_button.pack(side="left", padx=3, pady=8)
+        
+        self.backup_button = ttk.Button(
+            button_container, 
+            text="Back Up Now", 
+            command=self._on_backup
+        )
+        self.backup_button.pack(side="left", padx=3, pady=8)
+        
+        self.buttons = [button_container, self.add_transaction_button, self.batch_entry_button,
+                        self.recategorize_button, self.backup_button]
         if _DEBUG:
             print(f"[DEBUG] Add Transaction button created, {len(self.buttons)} buttons tracked")
     
@@ -218,6 +273,30 @@ class EditModeManager:
             if _DEBUG:
                 print("Add Transaction clicked - application reference not available")
     
+    def _on_batch_entry(self):
+        """Handle Batch Entry button click."""
+        if self.application and hasattr(self.application, 'open_batch_entry'):
+            self.application.open_batch_entry()
+        else:
+            if _DEBUG:
+                print("Batch Entry clicked - application reference not available")
+    
+    def _on_recategorize(self):
+        """Handle Re-categorize button click."""
+        if self.application and hasattr(self.application, 'open_recategorize'):
+            self.application.open_recategorize()
+        else:
+            if _DEBUG:
+                print("Re-categorize clicked - application reference not available")
+    
+    def _on_backup(self):
+        """Handle Back Up Now button click."""
+        if self.application and hasattr(self.application, 'backup_now'):
+            self.application.backup_now()
+        else:
+            if _DEBUG:
+                print("Back Up Now clicked - application reference not available")
+    
     def _placeholder_add_split(self):
         """Add a new split row to the current transaction."""
         if self.application and hasattr(self.application, 'add_split_row'):
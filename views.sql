@@ -8,7 +8,10 @@ DROP VIEW IF EXISTS AccountSummaryView;
 DROP VIEW IF EXISTS FundSummaryView;
 DROP VIEW IF EXISTS AccountTypeSummaryView;
 
--- Create a comprehensive view for ledger data with formatted choice fields
+-- Create a comprehensive view for ledger data with formatted choice fields.
+-- Archived years are moved out to their own files, so each archived year
+-- appears as one brought forward row per fund and account, taken from
+-- ArchiveTotal, and balances and summaries still include it.
 CREATE VIEW LedgerView AS
 SELECT
     Split.Id AS SplitId,
@@ -27,7 +30,24 @@ JOIN Transactions ON Split.Tran_id = Transactions.Id
 LEFT JOIN Fund ON Split.FundId = Fund.Id
 LEFT JOIN Account ON Split.AccountId = Account.Id
 WHERE Transactions.Deleted = 0
-ORDER BY Transactions.UserDate, Transactions.Id, Split.Id;
+UNION ALL
+SELECT
+    NULL AS SplitId,
+    NULL AS TransactionsId,
+    Archive.DateTo AS UserDate,
+    'Archived ' || Archive.Year || ' brought forward' AS Description,
+    Fund.Id AS FundId,
+    Fund.Name AS FundName,
+    Fund.Type AS FundType,
+    Account.Id AS AccountId,
+    Account.Name AS AccountName,
+    Account.Type AS AccountType,
+    ArchiveTotal.Amount AS Amount
+FROM ArchiveTotal
+JOIN Archive ON ArchiveTotal.Year = Archive.Year
+LEFT JOIN Fund ON ArchiveTotal.FundId = Fund.Id
+LEFT JOIN Account ON ArchiveTotal.AccountId = Account.Id
+ORDER BY UserDate, TransactionsId, SplitId;
 
 CREATE VIEW LedgerViewWithFundBalance AS
 SELECT 
@@ -103,11 +123,8 @@ GROUP BY FundId;
 
 CREATE VIEW AccountTypeSummaryView AS
 SELECT 
-    Account.Type AS AccountType,
-    FORMAT("%.2f",SUM(Split.Amount)) AS TotalAmount
-FROM Split
-JOIN Transactions ON Split.Tran_id = Transactions.Id
-LEFT JOIN Account ON Split.AccountId = Account.Id
-WHERE Transactions.Deleted = 0
-GROUP BY Account.Type;
+    AccountType,
+    FORMAT("%.2f",SUM(Amount)) AS TotalAmount
+FROM LedgerView 
+GROUP BY AccountType;
 
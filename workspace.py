@@ -0,0 +1,376 @@
+"""
+Workspace module for Tallis Ledger.
+Attaches several ledger files to one connection and reports across them.
+
+Each file is attached read-only under a schema name (by default its file
+name without the extension) to an in-memory connection. The connection has
+temporary LedgerView, AccountSummaryView and FundSummaryView views with the
+same columns as those in views.sql plus a leading Ledger column, each built
+as a UNION ALL over the attached files, so consolidation happens inside
+SQLite and every file's own indexes are used.
+
+Accounts and funds are matched across files by Id, which suits connected
+charities sharing one chart of accounts. Pass by_ledger=True to the summary
+queries to keep each file's totals apart.
+
+Archived years are included as they are for a single file: summaries and
+opening balances use each file's ArchiveTotal for years wholly inside the
+dates asked for, and the streaming queries attach the archive files they
+need, read-only, in the room the ledger files leave. LedgerView only shows
+the transactions still in each ledger file.
+
+A workspace is for reporting only; changes are still made by opening one
+file at a time.
+"""
+
+import os
+import re
+import sqlite3
+from urllib.request import pathname2url
+
+import migrations
+from database import DatabaseManager, ledger_filter_clause, date_bounds, day_range_clause, summary_grouping
+from dates import day_number
+
+_DEBUG = False  # Set to True for debugging output
+
+# SQLite's default limit on attached databases (SQLITE_MAX_ATTACHED),
+# shared by the ledger files and any archive files a query reads
+MAX_LEDGERS = 10
+
+
+def ledger_name(db_path):
+    """Default schema name for a ledger file: its file name made into an SQL identifier."""
+    name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(db_path))[0])
+    return name if re.match(r"[A-Za-z_]", name) else "_" + name
+
+
+class Workspace:
+    """Several ledger files attached to one connection for consolidated reporting."""
+
+    def __init__(self, db_paths, names=None):
+        """
+        Attach ledger files read-only to a new in-memory connection.
+
+        Files on an older schema are upgraded first, as opening them in
+        Tallis Ledger would.
+
+        Args:
+            db_paths: Ledger files to attach
+            names: Optional schema names, one per file; defaults to ledger_name()
+
+        Raises:
+            ValueError: If a file is missing, a name is invalid or repeated,
+                or there are more than MAX_LEDGERS files
+        """
+        db_paths = list(db_paths)
+        names = list(names) if names else [ledger_name(path) for path in db_paths]
+        if len(names) != len(db_paths):
+            raise ValueError("names must give one name per ledger file")
+        if not db_paths or len(db_paths) > MAX_LEDGERS:
+            raise ValueError(f"a workspace holds between 1 and {MAX_LEDGERS} ledger files")
+        for name in names:
+            # Names are written into SQL, so only plain identifiers are accepted
+            if not re.fullmatch(r"[A-Za-z_]\w*", name) or name.lower() in ("main", "temp"):
+                raise ValueError(f"Invalid ledger name: {name}")
+        if len({name.lower() for name in names}) != len(names):
+            raise ValueError("Ledger names must be unique; pass names to tell the files apart")
+
+        self.ledgers = dict(zip(names, db_paths))
+        self._attached_archives = set()
+        self.conn = sqlite3.connect(":memory:", uri=True)
+        try:
+            for name, path in self.ledgers.items():
+                self._attach(name, path)
+            self._create_views()
+        except Exception:
+            self.conn.close()
+            raise
+
+    def _attach(self, name, path):
+        """Upgrade a ledger file if needed and attach it read-only as name."""
+        if not os.path.exists(path):
+            raise ValueError(f"Database not found: {path}")
+        uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            version = migrations.schema_version(conn)
+        finally:
+            conn.close()
+        if version < migrations.SCHEMA_VERSION:
+            DatabaseManager(path).close()
+        self.conn.execute(f"ATTACH DATABASE ? AS {name}", (uri,))
+        if _DEBUG:
+            print(f"Attached {path} as {name}")
+
+    def _ledger_names(self, ledgers):
+        """Validate a per-file filter, returning the names to include in workspace order."""
+        if ledgers is None:
+            return list(self.ledgers)
+        unknown = set(ledgers) - set(self.ledgers)
+        if unknown:
+            raise ValueError(f"Unknown ledger: {', '.join(sorted(unknown))}")
+        return [name for name in self.ledgers if name in ledgers]
+
+    def _archives(self, name):
+        """
+        List one ledger's archived years, oldest first.
+
+        Returns:
+            list: Dicts with keys year, path, from_day and to_day
+        """
+        folder = os.path.dirname(os.path.abspath(self.ledgers[name]))
+        return [{
+            'year': year,
+            'path': os.path.join(folder, file_name),
+            'from_day': day_number(date_from),
+            'to_day': day_number(date_to)
+        } for year, file_name, date_from, date_to in self.conn.execute(
+            f"SELECT Year, FileName, DateFrom, DateTo FROM {name}.Archive ORDER BY DateFrom"
+        )]
+
+    def _attach_archive(self, name, archive_info):
+        """
+        Attach one ledger's archive file read-only, if it is not already.
+
+        Returns:
+            str: Schema name of the archive
+
+        Raises:
+            ValueError: If the file is missing or there is no room to attach it
+        """
+        # Year is an INTEGER column, so the schema name is always a safe identifier
+        schema = f"{name}_archive_{int(archive_info['year'])}"
+        if schema in self._attached_archives:
+            return schema
+        if len(self.ledgers) + len(self._attached_archives) >= MAX_LEDGERS:
+            raise ValueError(f"At most {MAX_LEDGERS} ledger and archive files can be read at once; "
+                             "use fewer ledgers or dates that reach fewer archived years")
+        if not os.path.exists(archive_info['path']):
+            raise ValueError(f"Archive for {archive_info['year']} not found: {archive_info['path']}")
+        uri = f"file:{pathname2url(archive_info['path'])}?mode=ro"
+        self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+        self._attached_archives.add(schema)
+        if _DEBUG:
+            print(f"Attached {archive_info['path']} as {schema}")
+        return schema
+
+    def _union(self, select, ledgers, where="", params=(), group="", days=(None, None),
+               totals=False, archives=True):
+        """
+        Repeat one query over each ledger and combine the results with UNION ALL.
+
+        Each copy reads that ledger's Split, Transactions, Fund and Account
+        tables under their usual names and gets a leading Ledger column.
+        Archived years reached by days are read from the ledger's archive
+        files, or with totals (the caller only sums Split.Amount by fund and
+        account columns) from its ArchiveTotal if they lie wholly inside
+        days, as DatabaseManager._live_rows does.
+
+        Args:
+            select: SELECT column list
+            ledgers: Names of the ledgers to include
+            where: Extra WHERE conditions starting with " AND ", without the date range
+            params: Parameters for where
+            group: Optional GROUP BY expression, applied to each part
+            days: (first, last) UserDay range; either end None for open
+            totals: The caller only needs Split.Amount summed
+            archives: False to read the ledger files only
+
+        Returns:
+            tuple: (SQL text, parameters)
+        """
+        range_clause, range_params = day_range_clause(*days)
+        group_clause = f"GROUP BY {group}" if group else ""
+        arms = []
+        arm_params = []
+        for name in ledgers:
+            schemas, total_years = [name], []
+            for archive_info in self._archives(name) if archives else []:
+                if ((days[0] is not None and archive_info['to_day'] < days[0])
+                        or (days[1] is not None and archive_info['from_day'] > days[1])):
+                    continue
+                whole = ((days[0] is None or days[0] <= archive_info['from_day'])
+                         and (days[1] is None or archive_info['to_day'] <= days[1]))
+                if totals and whole:
+                    total_years.append(archive_info['year'])
+                else:
+                    schemas.append(self._attach_archive(name, archive_info))
+
+            joins = f"""
+                LEFT JOIN {name}.Fund AS Fund ON Split.FundId = Fund.Id
+                LEFT JOIN {name}.Account AS Account ON Split.AccountId = Account.Id
+            """
+            if total_years:
+                # Years are written in rather than bound so the views can use this arm
+                arms.append(f"""
+                    SELECT '{name}' AS Ledger, {select}
+                    FROM {name}.ArchiveTotal AS Split
+                    {joins}
+                    WHERE Split.Year IN ({", ".join(str(int(year)) for year in total_years)}){where}
+                    {group_clause}
+                """)
+                arm_params += list(params)
+            for schema in schemas:
+                arms.append(f"""
+                    SELECT '{name}' AS Ledger, {select}
+                    FROM {schema}.Split AS Split
+                    JOIN {schema}.Transactions AS Transactions ON Split.Tran_id = Transactions.Id
+                    {joins}
+                    WHERE Transactions.Deleted = 0{where}{range_clause}
+                    {group_clause}
+                """)
+                arm_params += list(params) + range_params
+        return "UNION ALL".join(arms), arm_params
+
+    # ========== CONSOLIDATED VIEWS ==========
+
+    def _create_views(self):
+        """Create the temporary consolidated views over every attached ledger."""
+        ledger_view, _ = self._union("""
+            Split.Id AS SplitId,
+            Transactions.Id AS TransactionsId,
+            Transactions.UserDate AS UserDate,
+            Transactions.Description AS Description,
+            Fund.Id AS FundId,
+            Fund.Name AS FundName,
+            Fund.Type AS FundType,
+            Account.Id AS AccountId,
+            Account.Name AS AccountName,
+            Account.Type AS AccountType,
+            Split.Amount AS Amount
+        """, self.ledgers, archives=False)
+        self.conn.execute(f"""
+            CREATE TEMP VIEW LedgerView AS
+            SELECT * FROM ({ledger_view})
+            ORDER BY UserDate, Ledger, TransactionsId, SplitId
+        """)
+        for view, group_by, key in (("AccountSummaryView", 'account', "Account"),
+                                    ("FundSummaryView", 'fund', "Fund")):
+            select, group = summary_grouping(group_by)
+            partials, _ = self._union(f"{select}, SUM(Split.Amount) AS Amount", self.ledgers,
+                                      group=group, totals=True)
+            # Each file totals its own splits; only the per-file totals are combined
+            self.conn.execute(f"""
+                CREATE TEMP VIEW {view} AS
+                SELECT
+                    {key}Id,
+                    MAX({key}Name) AS {key}Name,
+                    MAX({key}Type) AS {key}Type,
+                    FORMAT("%.2f", SUM(Amount)) AS TotalAmount
+                FROM ({partials})
+                GROUP BY {key}Id
+            """)
+
+    # ========== STREAMING QUERIES ==========
+
+    def iter_ledger_rows(self, filter_id, filter_type='account', ledgers=None,
+                         date_from=None, date_to=None):
+        """
+        Stream one account or fund's rows from several ledgers with a running balance.
+
+        Rows are in date order, interleaved across ledgers, and the balance
+        runs across all of them, rounded to 2 decimal places as in
+        DatabaseManager.iter_ledger_rows. With date_from the balance starts
+        from the total of everything posted before that date. Rows in archived years
+        are read from the archive files, which count against MAX_LEDGERS.
+
+        Args:
+            filter_id: Account or fund id
+            filter_type: 'account' or 'fund'
+            ledgers: Names of the ledgers to include; None includes all
+            date_from: Optional first date to include
+            date_to: Optional last date to include
+
+        Returns:
+            tuple: (column names, cursor yielding one tuple per split)
+
+        Raises:
+            ValueError: If the archive files the dates reach cannot all be attached
+        """
+        names = self._ledger_names(ledgers)
+        filter_clause = " AND " + ledger_filter_clause(filter_type)
+        first_day, last_day = date_bounds(date_from, date_to)
+
+        opening_balance = 0
+        if first_day is not None:
+            before, params = self._union("Split.Amount", names, filter_clause, [filter_id],
+                                         days=(None, first_day - 1), totals=True)
+            opening_balance = self.conn.execute(
+                f"SELECT COALESCE(SUM(Amount), 0) FROM ({before})", params
+            ).fetchone()[0]
+
+        rows, params = self._union("""
+            Split.Id AS SplitId,
+            Transactions.Id AS TransactionsId,
+            Transactions.UserDate,
+            Transactions.Description,
+            Split.FundId,
+            Split.AccountId,
+            Split.Amount
+        """, names, filter_clause, [filter_id], days=(first_day, last_day))
+        cursor = self.conn.execute(f"""
+            SELECT *, ROUND(? + SUM(Amount) OVER (
+                ORDER BY UserDate, Ledger, TransactionsId, SplitId
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ), 2) AS Balance
+            FROM ({rows})
+            ORDER BY UserDate, Ledger, TransactionsId, SplitId
+        """, [opening_balance] + params)
+        return [col[0] for col in cursor.description], cursor
+
+    def iter_summary_rows(self, group_by='account', ledgers=None, by_ledger=False,
+                          date_from=None, date_to=None):
+        """
+        Stream live split totals across ledgers grouped by account, fund or account type.
+
+        Archived years wholly inside the dates are read from each ledger's
+        ArchiveTotal; a date range that cuts through an archived year reads
+        that year's archive file.
+
+        Args:
+            group_by: 'account', 'fund' or 'type'
+            ledgers: Names of the ledgers to include; None includes all
+            by_ledger: Give each ledger its own rows instead of combining them
+            date_from: Optional first date to include
+            date_to: Optional last date to include
+
+        Returns:
+            tuple: (column names, cursor yielding one tuple per group)
+
+        Raises:
+            ValueError: If the archive files the dates reach cannot all be attached
+        """
+        names = self._ledger_names(ledgers)
+        select, group = summary_grouping(group_by)
+        partials, params = self._union(f"{select}, SUM(Split.Amount) AS Amount", names, group=group,
+                                       days=date_bounds(date_from, date_to), totals=True)
+
+        # The per-file column names, e.g. AccountId, AccountName, AccountType
+        columns = [column.split(" AS ")[1] for column in select.split(", ")]
+        key = columns[0]
+        outer = ", ".join([key] + [f"MAX({column}) AS {column}" for column in columns[1:]])
+        if by_ledger:
+            outer = "Ledger, " + outer
+            key = f"{key}, Ledger"
+        cursor = self.conn.execute(f"""
+            SELECT {outer}, ROUND(SUM(Amount), 2) AS TotalAmount
+            FROM ({partials})
+            GROUP BY {key}
+            ORDER BY {key}
+        """, params)
+        return [col[0] for col in cursor.description], cursor
+
+    def close(self):
+        """Close the connection, detaching every ledger."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        """Context manager exit - ensures the connection is closed."""
+        self.close()